@@ -0,0 +1,303 @@
+from __future__ import annotations
+
+import importlib.util
+import json
+import multiprocessing as mp
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from .lazy_imports import LazyModule
+
+# PDF extraction tools: availability is checked without importing them; the import
+# itself (~0.1 s) happens on first extraction, in the worker processes.
+HAS_PYPDF = importlib.util.find_spec("PyPDF2") is not None
+HAS_PDFPLUMBER = importlib.util.find_spec("pdfplumber") is not None
+PyPDF2 = LazyModule("PyPDF2")
+pdfplumber = LazyModule("pdfplumber")
+
+
+# Identifies the text this module produces: the extractor chain (in fallback order, with
+# versions) plus a format revision to bump whenever page text handling changes here.
+EXTRACTION_FORMAT = 1
+
+
+@lru_cache(maxsize=1)
+def get_extractor_id() -> str:
+    """`EXTRACTOR_ID`, computed on first use since it needs the libraries' versions."""
+
+    extractors: List[str] = []
+    if HAS_PDFPLUMBER:
+        extractors.append(f"pdfplumber-{pdfplumber.__version__}")
+    if HAS_PYPDF:
+        extractors.append(f"pypdf2-{PyPDF2.__version__}")
+    return "+".join(extractors or ["none"]) + f"/v{EXTRACTION_FORMAT}"
+
+
+def __getattr__(name: str) -> Any:
+    if name == "EXTRACTOR_ID":
+        return get_extractor_id()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# Pages handed to one worker task; small enough to spread a long PDF over the pool,
+# large enough that re-opening the file per task stays cheap.
+PAGES_PER_TASK = 16
+
+# (page texts, worker seconds, whether every page was extracted)
+_PageRange = Tuple[List[str], float, bool]
+
+
+def _extract_workers() -> int:
+    value = os.getenv("KNOWLEDGE_EXTRACT_WORKERS", "").strip()
+    if value:
+        return max(1, int(value))
+    return os.cpu_count() or 1
+
+
+def _pdf_page_count(pdf_path: Path) -> Optional[int]:
+    # PyPDF2 reads the count from the page tree; pdfplumber would build every page first.
+    if HAS_PYPDF:
+        try:
+            with open(pdf_path, "rb") as f:
+                return len(PyPDF2.PdfReader(f).pages)
+        except Exception:
+            pass
+    if HAS_PDFPLUMBER:
+        try:
+            with pdfplumber.open(str(pdf_path)) as pdf:
+                return len(pdf.pages)
+        except Exception:
+            pass
+    return None
+
+
+def _extract_pdf_page_range(path: str, start: int, stop: Optional[int]) -> _PageRange:
+    """Text of pages [start, stop) of one PDF, one string per page (worker entry point).
+
+    pdfplumber is preferred; PyPDF2 is the fallback for ranges pdfplumber fails on.
+    If both fail, every page of the range comes back empty (so later pages keep their
+    numbers) and the range is reported as incomplete.
+    """
+    t0 = time.perf_counter()
+    name = Path(path).name
+
+    if HAS_PDFPLUMBER:
+        try:
+            pages: List[str] = []
+            # Only this range's pages are built (pdfplumber numbers pages from 1).
+            wanted = None if stop is None else list(range(start + 1, stop + 1))
+            with pdfplumber.open(path, pages=wanted) as pdf:
+                for page in pdf.pages if wanted is not None else pdf.pages[start:]:
+                    page_text = page.extract_text()
+                    pages.append(page_text + "\n" if page_text else "")
+            return pages, time.perf_counter() - t0, True
+        except Exception as e:
+            print(f"Warning: pdfplumber failed on {name} pages {start}-{stop}: {e}")
+
+    if HAS_PYPDF:
+        try:
+            with open(path, "rb") as f:
+                reader = PyPDF2.PdfReader(f)
+                pages = [(page.extract_text() or "") + "\n" for page in reader.pages[start:stop]]
+            return pages, time.perf_counter() - t0, True
+        except Exception as e:
+            print(f"Warning: PyPDF2 failed on {name} pages {start}-{stop}: {e}")
+
+    if not (HAS_PDFPLUMBER or HAS_PYPDF):
+        print(f"Warning: No PDF extraction library available for {name}")
+        return [f"[PDF file: {name} - content extraction not available]\n"], time.perf_counter() - t0, True
+    return ["" for _ in range(start, stop or start)], time.perf_counter() - t0, False
+
+
+def _page_ranges(pdf_path: Path) -> List[Tuple[int, Optional[int]]]:
+    n_pages = _pdf_page_count(pdf_path)
+    if not n_pages:
+        return [(0, None)]
+    return [(start, min(n_pages, start + PAGES_PER_TASK)) for start in range(0, n_pages, PAGES_PER_TASK)]
+
+
+def _extract_pool(workers: int) -> ProcessPoolExecutor:
+    # spawn: workers must not inherit the server's threads/locks, and it matches Windows.
+    return ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context("spawn"))
+
+
+def iter_knowledge_pages(
+    paths: Sequence[Path],
+    *,
+    max_workers: Optional[int] = None,
+) -> Iterator[Tuple[Path, "ExtractedPages"]]:
+    """Yield `(path, pages)` for each knowledge file, in the order given.
+
+    PDFs are split into page ranges that are extracted in a process pool across
+    all files at once; `pages` (an `ExtractedPages`) yields each page's text in page
+    order as soon as its range is done, so output is identical to a serial run. A
+    file's pages must be consumed before moving on to the next file. txt files are
+    one page. With several PDFs, their page counts are also taken in the pool.
+
+    Per-file timings are printed once a file's last page has been yielded.
+    """
+    workers = max_workers if max_workers is not None else _extract_workers()
+    tasks: List[List[Callable[[], _PageRange]]] = []
+
+    pdf_paths = [p for p in paths if p.suffix.lower() == ".pdf"]
+    pool: Optional[ProcessPoolExecutor] = None
+    try:
+        if workers > 1 and len(pdf_paths) > 1:
+            # Several PDFs will need the pool anyway: count their pages in it too.
+            pool = _extract_pool(workers)
+            pdf_ranges = dict(zip(pdf_paths, pool.map(_page_ranges, pdf_paths)))
+        else:
+            pdf_ranges = {p: _page_ranges(p) for p in pdf_paths}
+            n_tasks = sum(len(r) for r in pdf_ranges.values())
+            if workers > 1 and n_tasks > 1:
+                pool = _extract_pool(min(workers, n_tasks))
+
+        for path in paths:
+            if path in pdf_ranges:
+                if pool is not None:
+                    futures = [pool.submit(_extract_pdf_page_range, str(path), a, b) for a, b in pdf_ranges[path]]
+                    tasks.append([f.result for f in futures])
+                else:
+                    tasks.append([lambda p=path, a=a, b=b: _extract_pdf_page_range(str(p), a, b) for a, b in pdf_ranges[path]])
+            else:
+                tasks.append([])
+
+        for path, file_tasks in zip(paths, tasks):
+            yield path, ExtractedPages(path, file_tasks)
+    finally:
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+
+class ExtractedPages:
+    """Iterator over one knowledge file's page texts.
+
+    `complete` turns False once a page range failed to extract (its pages come
+    through empty); such text must not be cached as the file's content.
+    """
+
+    def __init__(self, path: Path, file_tasks: List[Callable[[], _PageRange]]):
+        self.path = path
+        self.complete = True
+        self._pages = self._iter_pages(file_tasks)
+
+    def __iter__(self) -> "ExtractedPages":
+        return self
+
+    def __next__(self) -> str:
+        return next(self._pages)
+
+    def _iter_pages(self, file_tasks: List[Callable[[], _PageRange]]) -> Iterator[str]:
+        path = self.path
+        suffix = path.suffix.lower()
+        if suffix == ".txt":
+            yield path.read_text(encoding="utf-8")
+            return
+        if suffix != ".pdf":
+            print(f"Warning: Unsupported file type: {path.suffix}")
+            return
+
+        t0 = time.perf_counter()
+        n_pages = 0
+        worker_seconds = 0.0
+        for get_range in file_tasks:
+            pages, seconds, complete = get_range()
+            worker_seconds += seconds
+            n_pages += len(pages)
+            self.complete = self.complete and complete
+            yield from pages
+        print(
+            f"Extracted {path.name}: {n_pages} pages in {len(file_tasks)} ranges, "
+            f"waited {time.perf_counter() - t0:.2f}s (worker time {worker_seconds:.2f}s)"
+        )
+
+
+class ExtractedTextCache:
+    """On-disk cache of extracted knowledge text, so unchanged files are never parsed twice.
+
+    Per (content sha256, `EXTRACTOR_ID`): a .txt file holding the normalized text
+    (`rag_module.chunking.iter_clean`) and a .json file with the offset where each
+    page starts in it. The text is written and read in pieces, so neither side holds
+    a whole document. A new pdfplumber/PyPDF2 version or `EXTRACTION_FORMAT` changes the key.
+    """
+
+    # Characters per piece when reading cached text back.
+    read_chars: int = 1 << 16
+
+    def __init__(self, cache_dir: str, *, extractor_id: Optional[str] = None):
+        self.cache_dir = cache_dir
+        self.extractor_id = extractor_id if extractor_id is not None else get_extractor_id()
+        self._suffix = re.sub(r"[^A-Za-z0-9.]+", "_", self.extractor_id)
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _path(self, sha256: str) -> str:
+        return os.path.join(self.cache_dir, f"{sha256}.{self._suffix}.json")
+
+    def _text_path(self, sha256: str) -> str:
+        return os.path.join(self.cache_dir, f"{sha256}.{self._suffix}.txt")
+
+    def has(self, sha256: str) -> bool:
+        return os.path.exists(self._path(sha256)) and os.path.exists(self._text_path(sha256))
+
+    def get(self, sha256: str) -> Optional[Dict[str, Any]]:
+        """`{"page_offsets": [...], ...}` or None; the text itself comes from `iter_text`."""
+
+        try:
+            with open(self._path(sha256), "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry.get("extractor") != self.extractor_id or not os.path.exists(self._text_path(sha256)):
+            return None
+        return entry
+
+    def iter_text(self, sha256: str) -> Iterator[str]:
+        with open(self._text_path(sha256), "r", encoding="utf-8", newline="") as f:
+            while True:
+                piece = f.read(self.read_chars)
+                if not piece:
+                    return
+                yield piece
+
+    def write_through(
+        self,
+        sha256: str,
+        pieces: Iterable[str],
+        *,
+        page_offsets: List[int],
+        source: str = "",
+        complete: Optional[Callable[[], bool]] = None,
+    ) -> Iterator[str]:
+        """Yield `pieces` unchanged while writing them to the cache.
+
+        The entry is committed once `pieces` is exhausted, with `page_offsets` as it
+        stands then (e.g. filled by `iter_clean` over the same pages), unless
+        `complete()` then returns False (e.g. `ExtractedPages.complete`). A consumer
+        that stops early or fails leaves no entry behind.
+        """
+
+        text_path = self._text_path(sha256)
+        tmp_path = text_path + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8", newline="") as f:
+                for piece in pieces:
+                    f.write(piece)
+                    yield piece
+            if complete is not None and not complete():
+                print(f"Warning: not caching incomplete text of {source or sha256}")
+                return
+            os.replace(tmp_path, text_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        entry = {"extractor": self.extractor_id, "source": source, "page_offsets": page_offsets}
+        path = self._path(sha256)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(path + ".tmp", path)
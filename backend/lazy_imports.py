@@ -0,0 +1,37 @@
+from __future__ import annotations
+
+import importlib
+from types import ModuleType
+from typing import Any, Optional
+
+
+class LazyModule:
+    """Stand-in for a heavy module that is imported on first attribute access.
+
+    `genai = LazyModule("google.generativeai")` keeps `import backend.main` cheap;
+    the first `genai.configure(...)` pays the import instead. Use
+    `scripts/bench_startup.py` to see what an entry point still imports eagerly.
+    """
+
+    __slots__ = ("_name", "_module")
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module: Optional[ModuleType] = None
+
+    def _load(self) -> ModuleType:
+        if self._module is None:
+            # importlib serializes concurrent first imports; a racing thread just gets the cached module.
+            self._module = importlib.import_module(self._name)
+        return self._module
+
+    @property
+    def loaded(self) -> bool:
+        return self._module is not None
+
+    def __getattr__(self, attr: str) -> Any:
+        return getattr(self._load(), attr)
+
+    def __repr__(self) -> str:
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<LazyModule {self._name!r} ({state})>"
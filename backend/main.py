@@ -1,33 +1,65 @@
 from __future__ import annotations
 
+import asyncio
 import os
 import json
-import google.generativeai as genai
-from google.generativeai.types import StopCandidateException
 import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from functools import lru_cache, partial
 from pathlib import Path
 from dataclasses import dataclass
-from typing import Any, Dict, Optional
+from typing import Any, Callable, Dict, Optional
 from urllib.parse import urlparse, urlunparse
 
 from dotenv import load_dotenv
 from fastapi import FastAPI, File, HTTPException, Query, UploadFile
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 
-from .onnx_infer import predict_image_bytes
-from .rag import ensure_ingested, get_store, retrieve_context_from_model_output
+from .lazy_imports import LazyModule
+from .microbatch import InferenceBatcher
+from .onnx_infer import CLASSES, model_variant, variant_path
+from .rag import BackgroundIngestion, build_retrieval_table, get_store, retrieve_context_from_model_output
+from rag_module.vectorstores import VectorStore
 
-import requests
 from fastapi.responses import Response
 from datetime import datetime
 
+# Heavy clients are imported on first use, not at worker start (see scripts/bench_startup.py).
+genai = LazyModule("google.generativeai")
+genai_types = LazyModule("google.generativeai.types")
+requests = LazyModule("requests")
+
 PROJECT_ROOT = Path(__file__).resolve().parents[1]
 FRONTEND_DIR = PROJECT_ROOT / "frontend"
 MODEL_PATH = str(PROJECT_ROOT / "models" / "last.onnx")
 FALLBACK_IMAGE_PATH = PROJECT_ROOT / "backend" / "image.png"
 
+# Concurrent auto-analyze requests share batched ONNX runs (MICROBATCH_* settings).
+inference_batcher = InferenceBatcher(MODEL_PATH)
+
+# auto-analyze's blocking stages run on bounded thread pools, one per kind of wait,
+# so a slow Gemini call can neither stall the event loop nor starve camera/AWS
+# fetches of threads. CPU inference has its own pool inside the micro-batcher.
+# Sizes: AUTO_ANALYZE_<STAGE>_WORKERS.
+_STAGE_WORKERS = {
+    "io": 16,  # AWS readings, ESP32-CAM capture, capture file writes
+    "retrieval": 4,  # knowledge base query (embedding + vector search)
+    "gemini": 4,  # report generation, up to 120 s per call
+}
+
+@lru_cache(maxsize=None)
+def _stage_executor(stage: str) -> ThreadPoolExecutor:
+    workers = int(os.getenv(f"AUTO_ANALYZE_{stage.upper()}_WORKERS") or _STAGE_WORKERS[stage])
+    return ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix=f"auto-analyze-{stage}")
+
+async def _run_stage(stage: str, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """Run blocking `fn(*args, **kwargs)` on the `stage` pool without blocking the event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_stage_executor(stage), partial(fn, *args, **kwargs))
+
 # ==================== GEMINI INTEGRATION ====================
 
 TRANSIENT_STATUS_CODES = {429, 500, 502, 503, 504}
@@ -278,7 +310,7 @@ def generate_recommendation(*, model_output: Dict[str, Any], rag_context: str, m
             response = client.generate_content(prompt, stream=False)
             return response.text
             
-        except StopCandidateException as e:
+        except genai_types.StopCandidateException as e:
             last_error = e
             print(f"⚠️  Gemini safety filter blocked response: {e}")
             continue
@@ -324,7 +356,13 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-store = get_store()
+retrieval_table = None
+# Opens the store and ingests the knowledge base in the background; see _startup and /api/ready.
+ingestion: BackgroundIngestion | None = None
+# How long a request waits for an in-progress knowledge file write before using a fallback.
+PARTIAL_INDEX_WAIT_SECONDS = 0.5
+# Last context retrieved per defect, served while the index is being (re)built.
+_CONTEXT_CACHE: dict[str, tuple[str, str]] = {}
 
 CAPTURE_DIR = PROJECT_ROOT / "captures"
 CAPTURE_DIR.mkdir(exist_ok=True)
@@ -414,9 +452,49 @@ def _get_esp32_image() -> bytes:
         detail=f"ESP32-CAM unavailable and fallback image not found at {FALLBACK_IMAGE_PATH}",
     )
 
+def _use_retrieval_table() -> bool:
+    return (os.getenv("RAG_RETRIEVAL_TABLE") or "1").strip() not in ("0", "false", "FALSE", "no", "NO")
+
+def _build_retrieval_table(store: VectorStore) -> None:
+    global retrieval_table
+    if _use_retrieval_table():
+        # Precompute per-defect retrieval once; it rebuilds itself if the store changes.
+        retrieval_table = build_retrieval_table(store, labels=CLASSES, k=3)
+
 @app.on_event("startup")
 def _startup() -> None:
-    ensure_ingested(store)
+    global ingestion
+    # Returns immediately; opening the store, parsing and embedding the knowledge base happen in a worker thread.
+    ingestion = BackgroundIngestion(get_store, on_ready=_build_retrieval_table)
+    ingestion.start()
+
+def _retrieve_knowledge(model_output: Dict[str, Any]) -> tuple[str, str, str]:
+    """(query, context, knowledge_status) where status is ready / partial / cached / unavailable.
+
+    Until ingestion finishes, the partially built index is searched if the
+    ingestion worker is not mid-write; otherwise the last context retrieved for
+    this defect is reused, or an explicit placeholder is returned.
+    """
+    fault = str(model_output.get("primary_defect"))
+    store = ingestion.store if ingestion is not None else None
+    if ingestion is not None and ingestion.ready:
+        query, context = retrieve_context_from_model_output(
+            store=store, model_output=model_output, k=3, table=retrieval_table
+        )
+        _CONTEXT_CACHE[fault] = (query, context)
+        return query, context, "ready"
+
+    reading = ingestion.reading(timeout=PARTIAL_INDEX_WAIT_SECONDS) if ingestion is not None else nullcontext(False)
+    with reading as can_read:
+        if can_read and store.count() > 0:
+            query, context = retrieve_context_from_model_output(store=store, model_output=model_output, k=3)
+            if context:
+                return query, context, "partial"
+
+    if fault in _CONTEXT_CACHE:
+        query, context = _CONTEXT_CACHE[fault]
+        return query, context, "cached"
+    return "", "Knowledge base is still being ingested; no retrieved knowledge is available yet.", "unavailable"
 
 if FRONTEND_DIR.exists():
     app.mount("/static", StaticFiles(directory=str(FRONTEND_DIR)), name="static")
@@ -557,7 +635,7 @@ async def auto_analyze(panel_id: str = Query("SP-001")):
         
         # Step 1: Get sensor readings
         print("📊 Step 1: Fetching sensor readings from AWS...")
-        readings = get_panel_readings(panel_id)
+        readings = await _run_stage("io", get_panel_readings, panel_id)
         v1_value = readings.get("voltage", {}).get("V1", 0)
         
         print(f"✅ V1 Voltage: {v1_value}V")
@@ -578,24 +656,24 @@ async def auto_analyze(panel_id: str = Query("SP-001")):
         
         # Step 3: Capture image
         print("\n📸 Step 2: Capturing image...")
-        image_bytes = _get_esp32_image()
+        image_bytes = await _run_stage("io", _get_esp32_image)
         
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         filename = f"panel_{panel_id}_{timestamp}.jpg"
         file_path = CAPTURE_DIR / filename
         
-        with open(file_path, "wb") as f:
-            f.write(image_bytes)
+        await _run_stage("io", file_path.write_bytes, image_bytes)
         
         print(f"✅ Image saved: {filename}")
         
         # Step 4: ONNX inference
         print("\n🤖 Step 3: Running ONNX model inference...")
-        if not Path(MODEL_PATH).exists():
-            raise HTTPException(status_code=500, detail=f"ONNX model not found at: {MODEL_PATH}")
+        variant_model_path = variant_path(MODEL_PATH, model_variant())
+        if not Path(variant_model_path).exists():
+            raise HTTPException(status_code=500, detail=f"ONNX model not found at: {variant_model_path}")
         
         try:
-            fault, confidence, top = predict_image_bytes(model_path=MODEL_PATH, image_bytes=image_bytes)
+            fault, confidence, top = await inference_batcher.predict(image_bytes)
             print(f"✅ Inference complete: {fault} (confidence: {confidence:.1%})")
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"ONNX inference failed: {e}")
@@ -609,12 +687,15 @@ async def auto_analyze(panel_id: str = Query("SP-001")):
         
         # Step 5: RAG retrieval
         print("\n📚 Step 4: Retrieving context from knowledge base...")
-        rag_query, rag_context = retrieve_context_from_model_output(store=store, model_output=model_output, k=3)
+        rag_query, rag_context, knowledge_status = await _run_stage("retrieval", _retrieve_knowledge, model_output)
         
         if not rag_context:
             raise HTTPException(status_code=500, detail="RAG retrieval returned empty context")
         
-        print(f"✅ Retrieved {len(rag_context)} characters of context")
+        if knowledge_status == "ready":
+            print(f"✅ Retrieved {len(rag_context)} characters of context")
+        else:
+            print(f"⚠️  Knowledge base still ingesting; using {knowledge_status} context ({len(rag_context)} characters)")
         
         # Step 6: Gemini AI recommendation
         print("\n🤖 Step 5: Generating AI health report via Gemini...")
@@ -628,7 +709,9 @@ async def auto_analyze(panel_id: str = Query("SP-001")):
             print(f"⏳ Gemini cooldown active ({remaining}s remaining). Reusing cached result.")
         else:
             try:
-                suggestion = generate_recommendation(model_output=model_output, rag_context=rag_context)
+                suggestion = await _run_stage(
+                    "gemini", generate_recommendation, model_output=model_output, rag_context=rag_context
+                )
                 print(f"✅ Health report generated successfully")
                 gemini_error: str | None = None
             except GeminiRateLimit as e:
@@ -640,11 +723,13 @@ async def auto_analyze(panel_id: str = Query("SP-001")):
                 gemini_error = f"Gemini call failed: {e}"
                 print(f"⚠️  {gemini_error}")
 
-            _GEMINI_CACHE[panel_id] = {
-                "ts": now,
-                "suggestion": suggestion,
-                "gemini_error": gemini_error,
-            }
+            # A report built on incomplete knowledge is not reused once ingestion finishes.
+            if knowledge_status == "ready":
+                _GEMINI_CACHE[panel_id] = {
+                    "ts": now,
+                    "suggestion": suggestion,
+                    "gemini_error": gemini_error,
+                }
         
         # Step 7: Return complete report
         print(f"\n{'='*60}")
@@ -681,6 +766,7 @@ async def auto_analyze(panel_id: str = Query("SP-001")):
             
             # Knowledge base context
             "knowledge_context": rag_context,
+            "knowledge_status": knowledge_status,
             
             # AI health report
             "health_report": suggestion,
@@ -698,13 +784,26 @@ async def auto_analyze(panel_id: str = Query("SP-001")):
         print(f"\n❌ ANALYSIS FAILED: {e}")
         raise HTTPException(status_code=500, detail=f"Analysis failed: {e}")
 
+@app.get("/api/ready")
+def ready():
+    """Readiness probe: 200 once the knowledge base is ingested, 503 (with progress) until then"""
+    status = ingestion.status() if ingestion is not None else {"state": "pending", "ready": False}
+    return JSONResponse(status_code=200 if status["ready"] else 503, content=status)
+
+@app.get("/api/inference/stats")
+def inference_stats():
+    """Micro-batcher counters and histograms (batch size, queue depth at dispatch, latency)"""
+    return inference_batcher.stats()
+
 @app.get("/api/workflow/status")
 def get_workflow_status():
     """Get current workflow status"""
     return {
         "backend": "online",
-        "ml_model": Path(MODEL_PATH).exists(),
-        "rag_store": store is not None,
+        "ml_model": Path(variant_path(MODEL_PATH, model_variant())).exists(),
+        "ml_model_variant": model_variant(),
+        "rag_store": ingestion is not None and ingestion.store is not None,
+        "rag_ready": ingestion is not None and ingestion.ready,
         "capture_dir": CAPTURE_DIR.exists(),
         "esp32_url": ESP32_CAM_URL,
         "aws_api": AWS_API_ENDPOINT,
@@ -715,10 +814,11 @@ def get_workflow_status():
 def diagnostic():
     """Diagnostic endpoint to check all components"""
     diagnostics = {
-        "model_path": MODEL_PATH,
-        "model_exists": Path(MODEL_PATH).exists(),
+        "model_path": variant_path(MODEL_PATH, model_variant()),
+        "model_variant": model_variant(),
+        "model_exists": Path(variant_path(MODEL_PATH, model_variant())).exists(),
         "capture_dir_exists": CAPTURE_DIR.exists(),
-        "rag_store_initialized": store is not None,
+        "rag_store_initialized": ingestion is not None and ingestion.store is not None,
         "gemini_api_key_set": bool(os.getenv("GEMINI_API_KEY")),
         "esp32_url": ESP32_CAM_URL,
         "aws_api": AWS_API_ENDPOINT,
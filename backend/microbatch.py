@@ -0,0 +1,226 @@
+from __future__ import annotations
+
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Callable, Dict, Generic, List, Optional, Sequence, Set, Tuple, TypeVar
+
+import numpy as np
+
+from .onnx_infer import ImageSource, Prediction, load_input_rgb, predict_rgb_arrays, preprocess_pool, session_settings
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class Histogram:
+    """Counts of observed values per bucket; bucket `b` holds values <= b not counted by a lower bucket."""
+
+    def __init__(self, bounds: Sequence[float]):
+        self.bounds = list(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        i = int(np.searchsorted(self.bounds, value, side="left"))
+        self.counts[i] += 1
+        self.count += 1
+        self.sum += value
+
+    def snapshot(self) -> Dict[str, Any]:
+        labels = [f"{b:g}" for b in self.bounds] + ["+Inf"]
+        return {
+            "buckets": dict(zip(labels, self.counts)),
+            "count": self.count,
+            "sum": self.sum,
+            "mean": self.sum / self.count if self.count else 0.0,
+        }
+
+
+@dataclass(frozen=True)
+class BatcherSettings:
+    max_batch_size: int
+    max_wait_ms: float
+    max_inflight: int
+
+
+def batcher_settings_from_env() -> BatcherSettings:
+    """MICROBATCH_MAX_SIZE / MICROBATCH_MAX_WAIT_MS / MICROBATCH_MAX_INFLIGHT.
+
+    At most MAX_INFLIGHT batches run at once (default: the ONNX session pool
+    size); while they do, new requests queue up and form the next batch.
+    """
+
+    return BatcherSettings(
+        max_batch_size=max(1, int(os.getenv("MICROBATCH_MAX_SIZE") or 16)),
+        max_wait_ms=max(0.0, float(os.getenv("MICROBATCH_MAX_WAIT_MS") or 5)),
+        max_inflight=max(1, int(os.getenv("MICROBATCH_MAX_INFLIGHT") or session_settings().pool_size)),
+    )
+
+
+@lru_cache(maxsize=1)
+def batcher_settings() -> BatcherSettings:
+    """`batcher_settings_from_env()`, read once per process on first use (after .env is loaded)."""
+
+    return batcher_settings_from_env()
+
+
+class MicroBatcher(Generic[T, R]):
+    """Collects concurrent `submit` calls into batches for one blocking `run_batch(items) -> results` call.
+
+    A worker task takes the first queued item and waits up to `max_wait_ms` for
+    more: until `max_batch_size` items, or until `_expecting_more()` says none
+    are coming. The batch runs on a dedicated thread pool, so the event loop
+    stays free. Each caller's future gets its own result; if the batch fails,
+    every caller in it gets the exception. `latency_ms` counts from enqueue to result.
+    """
+
+    def __init__(self, run_batch: Callable[[List[T]], List[R]], settings: Optional[BatcherSettings] = None):
+        self._run_batch = run_batch
+        self._settings = settings
+        self._queue: Optional[asyncio.Queue] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._inflight: Optional[asyncio.Semaphore] = None
+        self._tasks: Set[asyncio.Task] = set()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+        self.batches = 0
+        self.requests = 0
+        self.batch_size = Histogram([1, 2, 4, 8, 16, 32, 64])
+        self.queue_depth = Histogram([0, 1, 2, 4, 8, 16, 32, 64, 128])
+        self.latency_ms = Histogram([1, 2, 5, 10, 20, 50, 100, 200, 500, 1000])
+
+    @property
+    def settings(self) -> BatcherSettings:
+        if self._settings is None:
+            self._settings = batcher_settings()
+        return self._settings
+
+    def _start(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._worker is not None and not self._worker.done():
+            return
+        # First use, or a new event loop (e.g. a test client per test): queues are loop-bound.
+        self._loop = loop
+        self._queue = asyncio.Queue()
+        self._inflight = asyncio.Semaphore(self.settings.max_inflight)
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.settings.max_inflight, thread_name_prefix="microbatch"
+            )
+        self._worker = loop.create_task(self._collect())
+
+    async def submit(self, item: T) -> R:
+        self._start()
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.requests += 1
+        await self._queue.put((item, future, loop.time()))
+        return await future
+
+    async def _collect(self) -> None:
+        loop = asyncio.get_running_loop()
+        queue = self._queue
+        max_batch = self.settings.max_batch_size
+        max_wait = self.settings.max_wait_ms / 1000
+        while True:
+            # Hold a slot first: while every slot is busy, arrivals pile up into the next batch.
+            await self._inflight.acquire()
+            batch = [await queue.get()]
+            deadline = loop.time() + max_wait
+            while len(batch) < max_batch:
+                if not queue.empty():
+                    batch.append(queue.get_nowait())
+                    continue
+                timeout = deadline - loop.time()
+                if timeout <= 0 or not self._expecting_more():
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            self.queue_depth.observe(queue.qsize())
+            self.batch_size.observe(len(batch))
+            self.batches += 1
+            task = loop.create_task(self._dispatch(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    def _expecting_more(self) -> bool:
+        """Whether waiting for more items can pay off; subclasses that see requests coming can say no."""
+
+        return True
+
+    async def _dispatch(self, batch: List[Tuple[T, asyncio.Future, float]]) -> None:
+        loop = asyncio.get_running_loop()
+        try:
+            items = [item for item, _future, _t in batch]
+            try:
+                results = await loop.run_in_executor(self._executor, self._run_batch, items)
+            except Exception as e:
+                for _item, future, _t in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+            now = loop.time()
+            for (_item, future, enqueued), result in zip(batch, results):
+                self.latency_ms.observe((now - enqueued) * 1000)
+                if not future.done():
+                    future.set_result(result)
+        finally:
+            self._inflight.release()
+
+    def stats(self) -> Dict[str, Any]:
+        settings = self.settings
+        return {
+            "max_batch_size": settings.max_batch_size,
+            "max_wait_ms": settings.max_wait_ms,
+            "max_inflight": settings.max_inflight,
+            "queue_depth_now": self._queue.qsize() if self._queue is not None else 0,
+            "requests": self.requests,
+            "batches": self.batches,
+            "batch_size": self.batch_size.snapshot(),
+            "queue_depth": self.queue_depth.snapshot(),
+            "latency_ms": self.latency_ms.snapshot(),
+        }
+
+
+class InferenceBatcher(MicroBatcher[Tuple[np.ndarray, int], Prediction]):
+    """Micro-batched `predict_image_bytes` for concurrent requests in an async server.
+
+    Each request decodes its own image on the preprocessing pool (an invalid
+    image fails only that request, with ValueError); decoded images from
+    concurrent requests then share one `predict_rgb_arrays` call.
+    """
+
+    def __init__(self, model_path: str, settings: Optional[BatcherSettings] = None):
+        super().__init__(self._predict_batch, settings)
+        self.model_path = model_path
+        # Requests still decoding; with none, a lone request does not wait out max_wait_ms.
+        self._decoding = 0
+
+    def _predict_batch(self, items: List[Tuple[np.ndarray, int]]) -> List[Prediction]:
+        rgbs = [rgb for rgb, _k in items]
+        predictions = predict_rgb_arrays(
+            model_path=self.model_path,
+            rgbs=rgbs,
+            top_k=max(k for _rgb, k in items),
+            max_batch_size=self.settings.max_batch_size,
+        )
+        return [(fault, confidence, top[: max(1, k)]) for (fault, confidence, top), (_rgb, k) in zip(predictions, items)]
+
+    def _expecting_more(self) -> bool:
+        return self._decoding > 0
+
+    async def predict(self, image: ImageSource, *, top_k: int = 3) -> Prediction:
+        self._decoding += 1
+        try:
+            rgb = await asyncio.get_running_loop().run_in_executor(preprocess_pool(), load_input_rgb, image)
+        finally:
+            self._decoding -= 1
+        return await self.submit((rgb, top_k))
@@ -1,13 +1,23 @@
 from __future__ import annotations
 
+import hashlib
 import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
 from functools import lru_cache
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple, Union
 
 import numpy as np
-import onnxruntime as ort
-from PIL import Image
+
+from .lazy_imports import LazyModule
+
+# Imported on first inference: importing this module (e.g. for CLASSES) stays cheap.
+ort = LazyModule("onnxruntime")
+Image = LazyModule("PIL.Image")
 
 
 CLASSES: List[str] = [
@@ -34,66 +44,397 @@ def _parse_float_csv(value: str, expected_len: int) -> np.ndarray:
     return np.array([float(p) for p in parts], dtype="float32")
 
 
-def preprocess_image(img: Image.Image) -> np.ndarray:
-    img = img.convert("RGB")
-    img = img.resize((224, 224))
+# Side length the classifier expects; images are resized to INPUT_SIZE x INPUT_SIZE RGB.
+INPUT_SIZE = 224
+
+
+@dataclass(frozen=True)
+class PreprocessSettings:
+    """Normalization applied to RGB pixels: `(x / 255 - mean) / std`, folded into `x * scale + offset`."""
+
+    normalize: bool
+    mean: np.ndarray
+    std: np.ndarray
+
+    @property
+    def scale(self) -> np.ndarray:
+        if not self.normalize:
+            return np.full(3, 1.0 / 255.0, dtype="float32")
+        return (1.0 / (255.0 * self.std)).astype("float32")
+
+    @property
+    def offset(self) -> np.ndarray:
+        if not self.normalize:
+            return np.zeros(3, dtype="float32")
+        return (-self.mean / self.std).astype("float32")
 
-    arr = np.asarray(img).astype("float32") / 255.0
 
+def settings_from_env() -> PreprocessSettings:
     normalize = os.getenv("ONNX_NORMALIZE", "1").strip() not in ("0", "false", "FALSE", "no", "NO")
-    if normalize:
-        mean_env = os.getenv("ONNX_MEAN")
-        std_env = os.getenv("ONNX_STD")
-        mean = (
-            _parse_float_csv(mean_env, 3)
-            if mean_env
-            else np.array([0.485, 0.456, 0.406], dtype="float32")
-        )
-        std = (
-            _parse_float_csv(std_env, 3)
-            if std_env
-            else np.array([0.229, 0.224, 0.225], dtype="float32")
+    mean_env = os.getenv("ONNX_MEAN")
+    std_env = os.getenv("ONNX_STD")
+    mean = (
+        _parse_float_csv(mean_env, 3)
+        if mean_env
+        else np.array([0.485, 0.456, 0.406], dtype="float32")
+    )
+    std = (
+        _parse_float_csv(std_env, 3)
+        if std_env
+        else np.array([0.229, 0.224, 0.225], dtype="float32")
+    )
+    return PreprocessSettings(normalize=normalize, mean=mean, std=std)
+
+
+@lru_cache(maxsize=1)
+def preprocess_settings() -> PreprocessSettings:
+    """ONNX_NORMALIZE / ONNX_MEAN / ONNX_STD, read once per process on first use (after .env is loaded)."""
+
+    return settings_from_env()
+
+
+@lru_cache(maxsize=1)
+def _scale_offset() -> Tuple[np.ndarray, np.ndarray]:
+    settings = preprocess_settings()
+    # Shaped for a CHW destination.
+    return settings.scale.reshape(3, 1, 1), settings.offset.reshape(3, 1, 1)
+
+
+@lru_cache(maxsize=1)
+def _use_reduced_decode() -> bool:
+    """ONNX_REDUCED_DECODE (default off, it can shift predictions), read once per process."""
+
+    return _env_flag("ONNX_REDUCED_DECODE", "0")
+
+
+def _reduce_for_input(img: Image.Image) -> Image.Image:
+    """Shrink `img` cheaply to the smallest size that still covers INPUT_SIZE on both sides.
+
+    JPEGs are decoded at 1/2, 1/4 or 1/8 scale in the DCT domain (`draft`), so the
+    full-resolution pixels are never materialized; other formats are converted to
+    RGB (`reduce` rejects P, 1 and I;16) and box-reduced by an integer factor.
+    Must be called before the image is loaded.
+    """
+
+    if img.format == "JPEG":
+        img.draft("RGB", (INPUT_SIZE, INPUT_SIZE))
+        return img
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    factor = min(img.width // INPUT_SIZE, img.height // INPUT_SIZE)
+    return img.reduce(factor) if factor >= 2 else img
+
+
+def _resized_rgb(img: Image.Image, *, reduced: Optional[bool] = None) -> np.ndarray:
+    """HWC uint8 array of the image resized to the model input size."""
+
+    if _use_reduced_decode() if reduced is None else reduced:
+        img = _reduce_for_input(img)
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    # The one filtering resize (bicubic, antialiased) from whatever resolution was decoded.
+    return np.asarray(img.resize((INPUT_SIZE, INPUT_SIZE), Image.Resampling.BICUBIC))
+
+
+def _normalize_into(rgb: np.ndarray, out: np.ndarray) -> None:
+    """Write the normalized CHW float32 tensor for one HWC uint8 image into `out` (shape 3xHxW)."""
+
+    scale, offset = _scale_offset()
+    # One pass converts, scales and transposes; the add is in place. No full-size temporaries.
+    np.multiply(rgb.transpose(2, 0, 1), scale, out=out)
+    out += offset
+
+
+def preprocess_image(img: Image.Image) -> np.ndarray:
+    """1x3xHxW float32 input for models without the preprocessing nodes (see scripts/prepare_onnx_model.py)."""
+
+    x = np.empty((1, 3, INPUT_SIZE, INPUT_SIZE), dtype="float32")
+    _normalize_into(_resized_rgb(img), x[0])
+    return x
+
+
+def _env_flag(name: str, default: str = "1") -> bool:
+    return os.getenv(name, default).strip() not in ("0", "false", "FALSE", "no", "NO")
+
+
+@dataclass(frozen=True)
+class SessionSettings:
+    """How `SessionPool` builds its ONNX Runtime sessions."""
+
+    pool_size: int
+    intra_op_threads: int
+    inter_op_threads: int
+    parallel_execution: bool
+    optimized_cache: bool
+
+
+def session_settings_from_env() -> SessionSettings:
+    """ONNX_SESSION_POOL / ONNX_INTRA_OP_THREADS / ONNX_INTER_OP_THREADS / ONNX_EXECUTION_MODE / ONNX_OPTIMIZED_CACHE.
+
+    By default the cores are split evenly between the pooled sessions, so
+    concurrent requests run side by side instead of oversubscribing the CPU.
+    """
+
+    cpus = os.cpu_count() or 1
+    pool_size = max(1, int(os.getenv("ONNX_SESSION_POOL") or (2 if cpus >= 4 else 1)))
+    intra_op_threads = int(os.getenv("ONNX_INTRA_OP_THREADS") or 0) or max(1, cpus // pool_size)
+    inter_op_threads = int(os.getenv("ONNX_INTER_OP_THREADS") or 1)
+    mode = os.getenv("ONNX_EXECUTION_MODE", "sequential").strip().lower()
+    if mode not in ("sequential", "parallel"):
+        raise ValueError(f"ONNX_EXECUTION_MODE must be 'sequential' or 'parallel', got: {mode}")
+    return SessionSettings(
+        pool_size=pool_size,
+        intra_op_threads=intra_op_threads,
+        inter_op_threads=inter_op_threads,
+        parallel_execution=mode == "parallel",
+        optimized_cache=_env_flag("ONNX_OPTIMIZED_CACHE"),
+    )
+
+
+@lru_cache(maxsize=1)
+def session_settings() -> SessionSettings:
+    """`session_settings_from_env()`, read once per process on first inference."""
+
+    return session_settings_from_env()
+
+
+def optimized_model_path(model_path: str) -> Path:
+    """Where the graph-optimized copy of `model_path` is cached.
+
+    Keyed by the model's content hash and the onnxruntime version, in
+    ONNX_OPTIMIZED_DIR (default `.ort_cache/` next to the model).
+    """
+
+    h = hashlib.sha256()
+    with open(model_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    h.update(ort.__version__.encode())
+    cache_dir = Path(os.getenv("ONNX_OPTIMIZED_DIR") or Path(model_path).parent / ".ort_cache")
+    return cache_dir / f"{Path(model_path).stem}.{h.hexdigest()[:16]}.onnx"
+
+
+# Numpy dtypes for output tensors we can bind to preallocated buffers.
+_OUTPUT_DTYPES = {"tensor(float)": np.float32, "tensor(double)": np.float64, "tensor(float16)": np.float16}
+
+
+class PooledSession:
+    """One InferenceSession plus what every run needs, resolved once.
+
+    Input/output names, the input layout and the fixed batch size are read at
+    creation. Inputs are written into a reusable buffer (`input_buffer`) and bound,
+    together with a preallocated output buffer, through IO binding, so a run
+    allocates no tensors of its own. Not thread-safe: use via `SessionPool.acquire`.
+    """
+
+    def __init__(self, sess: ort.InferenceSession):
+        self.sess = sess
+        inp = sess.get_inputs()[0]
+        out = sess.get_outputs()[0]
+        self.input_name: str = inp.name
+        self.output_name: str = out.name
+        # Models prepared by scripts/prepare_onnx_model.py take raw NHWC uint8 pixels.
+        self.takes_uint8: bool = inp.type == "tensor(uint8)"
+        batch_dim = inp.shape[0] if inp.shape else None
+        self.fixed_batch: Optional[int] = batch_dim if isinstance(batch_dim, int) and batch_dim > 0 else None
+
+        # Output rows can be preallocated when the output is [batch, <static dims>].
+        out_shape = list(out.shape or [])
+        out_batch_dim = out_shape[0] if out_shape else None
+        static_rest = all(isinstance(d, int) and d > 0 for d in out_shape[1:])
+        self._output_row: Optional[Tuple[int, ...]] = None
+        if out_shape and static_rest and out.type in _OUTPUT_DTYPES and (
+            not isinstance(out_batch_dim, int) or out_batch_dim == self.fixed_batch
+        ):
+            self._output_row = tuple(out_shape[1:])
+        self._output_dtype = _OUTPUT_DTYPES.get(out.type)
+
+        self._binding = sess.io_binding()
+        self._input: Optional[np.ndarray] = None
+        self._output: Optional[np.ndarray] = None
+
+    def input_buffer(self, n: int) -> np.ndarray:
+        """A reusable n x <input> buffer (NCHW float32, or NHWC uint8 for prepared models)."""
+
+        if self._input is None or len(self._input) < n:
+            if self.takes_uint8:
+                self._input = np.empty((n, INPUT_SIZE, INPUT_SIZE, 3), dtype=np.uint8)
+            else:
+                self._input = np.empty((n, 3, INPUT_SIZE, INPUT_SIZE), dtype=np.float32)
+        return self._input[:n]
+
+    def run(self, batch: np.ndarray) -> np.ndarray:
+        """Model output for `batch`; valid until the next run on this session."""
+
+        n = len(batch)
+        binding = self._binding
+        binding.clear_binding_inputs()
+        binding.clear_binding_outputs()
+        binding.bind_cpu_input(self.input_name, batch)
+
+        if self._output_row is None:
+            binding.bind_output(self.output_name, "cpu")
+            self.sess.run_with_iobinding(binding)
+            return binding.copy_outputs_to_cpu()[0]
+
+        if self._output is None or len(self._output) < n:
+            self._output = np.empty((n, *self._output_row), dtype=self._output_dtype)
+        out = self._output[:n]
+        binding.bind_output(self.output_name, "cpu", 0, self._output_dtype, list(out.shape), out.ctypes.data)
+        self.sess.run_with_iobinding(binding)
+        return out
+
+
+class SessionPool:
+    """Up to `settings.pool_size` tuned sessions over one model, lent out one per request.
+
+    Sessions are created on demand. The first one saves the optimized graph (see
+    `optimized_model_path`) and later sessions, and later processes, load that copy.
+    The saved graph stops at ORT_ENABLE_EXTENDED: the remaining layout passes are
+    CPU-specific, so they are cheap to redo at load time but unsafe to cache.
+    """
+
+    def __init__(self, model_path: str, settings: Optional[SessionSettings] = None):
+        self.model_path = model_path
+        self.settings = settings or session_settings()
+        self._idle: "queue.Queue[PooledSession]" = queue.Queue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _options(self, level: ort.GraphOptimizationLevel) -> ort.SessionOptions:
+        opts = ort.SessionOptions()
+        opts.intra_op_num_threads = self.settings.intra_op_threads
+        opts.inter_op_num_threads = self.settings.inter_op_threads
+        opts.execution_mode = (
+            ort.ExecutionMode.ORT_PARALLEL if self.settings.parallel_execution else ort.ExecutionMode.ORT_SEQUENTIAL
         )
-        arr = (arr - mean) / std
+        opts.graph_optimization_level = level
+        return opts
+
+    def _create_session(self) -> ort.InferenceSession:
+        providers = ["CPUExecutionProvider"]
+        full = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if not self.settings.optimized_cache:
+            return ort.InferenceSession(self.model_path, self._options(full), providers=providers)
 
-    # HWC -> CHW
-    arr = np.transpose(arr, (2, 0, 1))
+        cached = optimized_model_path(self.model_path)
+        if not cached.exists():
+            opts = self._options(ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED)
+            tmp_path = cached.with_name(f"{cached.name}.{os.getpid()}.tmp")
+            try:
+                cached.parent.mkdir(parents=True, exist_ok=True)
+                opts.optimized_model_filepath = str(tmp_path)
+                ort.InferenceSession(self.model_path, opts, providers=providers)
+                os.replace(tmp_path, cached)
+            except Exception:
+                # Unwritable cache dir or a failed save: optimize in memory instead.
+                tmp_path.unlink(missing_ok=True)
+                return ort.InferenceSession(self.model_path, self._options(full), providers=providers)
+        return ort.InferenceSession(str(cached), self._options(full), providers=providers)
 
-    # Add batch dimension
-    arr = np.expand_dims(arr, axis=0)
+    @contextmanager
+    def acquire(self) -> Iterator[PooledSession]:
+        try:
+            session = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                create = self._created < self.settings.pool_size
+                if create:
+                    self._created += 1
+            if create:
+                try:
+                    session = PooledSession(self._create_session())
+                except BaseException:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+            else:
+                session = self._idle.get()
+        try:
+            yield session
+        finally:
+            self._idle.put(session)
 
-    return arr.astype("float32")
+
+# Model registry: ONNX_MODEL_VARIANT picks which file serves predictions. Variants
+# live next to the base model (models/last.onnx -> models/last.int8.onnx); the
+# INT8 one is produced by scripts/quantize_onnx_model.py.
+MODEL_VARIANTS: Dict[str, str] = {
+    "fp32": "",
+    "int8": ".int8",
+}
 
 
 @lru_cache(maxsize=1)
-def get_session(model_path: str) -> ort.InferenceSession:
-    providers = ["CPUExecutionProvider"]
-    sess = ort.InferenceSession(model_path, providers=providers)
-    return sess
+def model_variant() -> str:
+    """ONNX_MODEL_VARIANT (default fp32), read once per process."""
+
+    variant = os.getenv("ONNX_MODEL_VARIANT", "fp32").strip().lower()
+    if variant not in MODEL_VARIANTS:
+        raise ValueError(f"ONNX_MODEL_VARIANT must be one of {sorted(MODEL_VARIANTS)}, got: {variant}")
+    return variant
+
+
+def variant_path(model_path: Union[str, "os.PathLike[str]"], variant: str) -> str:
+    """Path of `variant` of the base model at `model_path`."""
+
+    if variant not in MODEL_VARIANTS:
+        raise ValueError(f"Unknown model variant {variant!r}; expected one of {sorted(MODEL_VARIANTS)}")
+    path = Path(model_path)
+    return str(path.with_name(f"{path.stem}{MODEL_VARIANTS[variant]}{path.suffix}"))
+
+
+def resolve_model_path(model_path: Union[str, "os.PathLike[str]"], variant: Optional[str] = None) -> str:
+    """The file that serves `model_path` under `variant` (default: ONNX_MODEL_VARIANT)."""
+
+    variant = variant or model_variant()
+    resolved = variant_path(model_path, variant)
+    if variant != "fp32" and not Path(resolved).exists():
+        raise FileNotFoundError(
+            f"ONNX model variant {variant!r} not found at {resolved}; "
+            f"create it with scripts/quantize_onnx_model.py or set ONNX_MODEL_VARIANT=fp32"
+        )
+    return resolved
+
+
+# One pool per resolved model file: alternating variants (e.g. quantize_onnx_model.py's
+# fp32/int8 comparison) must not evict each other and rebuild every session.
+@lru_cache(maxsize=len(MODEL_VARIANTS))
+def get_session_pool(model_path: str) -> SessionPool:
+    return SessionPool(model_path)
+
+
+Prediction = Tuple[str, float, List[Dict[str, float]]]
+
 
+# Raw encoded bytes, or a path to an image file (e.g. a capture under captures/).
+ImageSource = Union[bytes, str, "os.PathLike[str]"]
 
-def predict_image_bytes(*, model_path: str, image_bytes: bytes, top_k: int = 3) -> Tuple[str, float, List[Dict[str, float]]]:
-    sess = get_session(model_path)
 
-    input_name = sess.get_inputs()[0].name
-    output_name = sess.get_outputs()[0].name
+def _decode_image(source: ImageSource) -> Image.Image:
+    """Open (not yet decode) an image, so `_resized_rgb` can pick a reduced decode."""
 
     try:
-        from io import BytesIO
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            from io import BytesIO
 
-        img = Image.open(BytesIO(image_bytes))
+            return Image.open(BytesIO(source))
+        return Image.open(source)
     except Exception as e:
         raise ValueError(f"Invalid image: {e}")
 
-    x = preprocess_image(img)
 
-    outputs = sess.run([output_name], {input_name: x})
-    y = np.array(outputs[0])
+def load_input_rgb(source: ImageSource, *, reduced: Optional[bool] = None) -> np.ndarray:
+    """Decode `source` to the INPUT_SIZE x INPUT_SIZE x 3 uint8 array the model is fed.
 
-    # Common shapes: [1, C], [C], [1, 1, C], etc.
-    y = np.squeeze(y)
-    if y.ndim != 1:
-        raise RuntimeError(f"Unexpected model output shape: {y.shape}")
+    `reduced` overrides ONNX_REDUCED_DECODE (reduced-scale decode, see `_reduce_for_input`).
+    """
+
+    return _resized_rgb(_decode_image(source), reduced=reduced)
+
+
+def _postprocess(y: np.ndarray, top_k: int) -> Prediction:
+    """(label, confidence, top-k) from one image's model output."""
 
     # Some exports already output probabilities.
     # Heuristic: values within [0,1] and sum ~ 1 => treat as probs; else softmax logits.
@@ -111,3 +452,112 @@ def predict_image_bytes(*, model_path: str, image_bytes: bytes, top_k: int = 3)
     confidence = float(probs[best_idx])
 
     return fault, confidence, top
+
+
+@lru_cache(maxsize=1)
+def preprocess_pool() -> ThreadPoolExecutor:
+    """Shared threads for image decode/resize (batched predictions, `backend/microbatch.py`)."""
+
+    # PIL decode/resize and numpy release the GIL, so threads spread preprocessing over cores.
+    return ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1), thread_name_prefix="onnx-preprocess")
+
+
+def predict_rgb_arrays(
+    *,
+    model_path: str,
+    rgbs: Sequence[np.ndarray],
+    top_k: int = 3,
+    max_batch_size: Optional[int] = None,
+    variant: Optional[str] = None,
+) -> List[Prediction]:
+    """Predictions for already decoded INPUT_SIZE x INPUT_SIZE x 3 uint8 images (see `load_input_rgb`).
+
+    `model_path` is the base (fp32) model; `variant` picks the file actually run
+    (default ONNX_MODEL_VARIANT, see `MODEL_VARIANTS`).
+
+    Models with a dynamic batch dimension get all images (or `max_batch_size` at
+    a time) in a single call; models exported with a fixed batch size N are fed
+    chunks of N, the last one zero-padded.
+    """
+
+    if not rgbs:
+        return []
+
+    results: List[Prediction] = []
+    with get_session_pool(resolve_model_path(model_path, variant)).acquire() as session:
+        fixed = session.fixed_batch
+        step = fixed or max_batch_size or len(rgbs)
+        for start in range(0, len(rgbs), step):
+            chunk = rgbs[start : start + step]
+            n = len(chunk)
+            batch = session.input_buffer(fixed or n)
+            for i, rgb in enumerate(chunk):
+                if session.takes_uint8:
+                    # Prepared model: the graph scales, normalizes and transposes; feed pixels as they are.
+                    batch[i] = rgb
+                else:
+                    _normalize_into(rgb, batch[i])
+            if fixed is not None and n < fixed:
+                batch[n:] = 0
+
+            y = session.run(batch)
+
+            # Common shapes: [N, C], [N, 1, C], and [C] for single-image exports.
+            if y.size == 0 or y.size % len(batch):
+                raise RuntimeError(f"Unexpected model output shape: {y.shape}")
+            y = y.reshape(len(batch), -1)
+            results.extend(_postprocess(row, top_k) for row in y[:n])
+
+    return results
+
+
+def predict_images_bytes(
+    *,
+    model_path: str,
+    images: Sequence[ImageSource],
+    top_k: int = 3,
+    max_batch_size: Optional[int] = None,
+    variant: Optional[str] = None,
+) -> List[Prediction]:
+    """`predict_image_bytes` for several images with one `sess.run` per batch.
+
+    Images are decoded and resized in parallel and stacked into one NCHW float32
+    tensor (NHWC uint8 for models prepared by scripts/prepare_onnx_model.py), then
+    run through `predict_rgb_arrays`. Results are in input order. An undecodable
+    image raises ValueError naming its index. `images` may also hold file paths.
+    """
+
+    if not images:
+        return []
+
+    def decode(indexed: Tuple[int, ImageSource]) -> np.ndarray:
+        i, source = indexed
+        try:
+            return load_input_rgb(source)
+        except ValueError as e:
+            if len(images) == 1:
+                raise
+            raise ValueError(f"Image {i}: {e}") from e
+
+    if len(images) == 1:
+        rgbs = [decode((0, images[0]))]
+    else:
+        rgbs = list(preprocess_pool().map(decode, enumerate(images)))
+
+    return predict_rgb_arrays(
+        model_path=model_path, rgbs=rgbs, top_k=top_k, max_batch_size=max_batch_size, variant=variant
+    )
+
+
+def predict_image_bytes(
+    *, model_path: str, image_bytes: bytes, top_k: int = 3, variant: Optional[str] = None
+) -> Prediction:
+    return predict_images_bytes(model_path=model_path, images=[image_bytes], top_k=top_k, variant=variant)[0]
+
+
+def predict_image_file(
+    *, model_path: str, path: Union[str, "os.PathLike[str]"], top_k: int = 3, variant: Optional[str] = None
+) -> Prediction:
+    """`predict_image_bytes` for an image on disk; JPEGs are decoded straight from the file at reduced scale."""
+
+    return predict_images_bytes(model_path=model_path, images=[path], top_k=top_k, variant=variant)[0]
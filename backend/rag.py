@@ -1,75 +1,91 @@
 from __future__ import annotations
 
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager, nullcontext
 from pathlib import Path
-from typing import Any, Dict, List, Tuple
+from typing import Any, Callable, ContextManager, Dict, Iterator, List, Optional, Tuple
 
-from rag_module.ingest import ingest_knowledge
-from rag_module.query import build_query_from_ml_output, format_retrieved_context
+from rag_module.chunking import iter_clean
+from rag_module.defects import DefectTagger
+from rag_module.embedding_cache import CachedEmbeddingModel
+from rag_module.ingest import ingest_chunks, iter_document_chunks
+from rag_module.query import (
+    DefectRetrievalTable,
+    build_canonical_query,
+    build_query_from_ml_output,
+    format_retrieved_context,
+    search_scope,
+)
 from rag_module.types import RetrievedChunk
-from rag_module.vectorstores import ChromaVectorStore
+from rag_module.vectorstores import PartitionedVectorStore, VectorStore
 
-# Try to import PDF extraction tools
-try:
-    import PyPDF2
-    HAS_PYPDF = True
-except ImportError:
-    HAS_PYPDF = False
+from .knowledge_extract import ExtractedTextCache, iter_knowledge_pages
+from .onnx_infer import CLASSES
 
-try:
-    import pdfplumber
-    HAS_PDFPLUMBER = True
-except ImportError:
-    HAS_PDFPLUMBER = False
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+PERSIST_DIR = PROJECT_ROOT / "vector_db" / "chroma"
+FAISS_PERSIST_DIR = PROJECT_ROOT / "vector_db" / "faiss"
+EMBEDDING_CACHE_DIR = PROJECT_ROOT / "vector_db" / "embedding_cache"
+EXTRACTED_TEXT_CACHE_DIR = PROJECT_ROOT / "vector_db" / "extracted_text"
+PARTITIONED_PERSIST_DIR = PROJECT_ROOT / "vector_db" / "partitioned"
+KNOWLEDGE_DIR = Path(__file__).resolve().parent / "knowledge_base"
+COLLECTION_NAME = "solar_panel_knowledge"
+# Per-store record of which knowledge files are ingested (lives next to the store's data).
+MANIFEST_NAME = "knowledge_manifest.json"
 
 
-def _extract_text_from_pdf(pdf_path: Path) -> str:
-    """Extract text from PDF file using available libraries."""
-    if HAS_PDFPLUMBER:
-        try:
-            with pdfplumber.open(str(pdf_path)) as pdf:
-                text = ""
-                for page in pdf.pages:
-                    page_text = page.extract_text()
-                    if page_text:
-                        text += page_text + "\n"
-                return text
-        except Exception as e:
-            print(f"Warning: pdfplumber failed on {pdf_path.name}: {e}")
-    
-    if HAS_PYPDF:
-        try:
-            text = ""
-            with open(pdf_path, "rb") as f:
-                reader = PyPDF2.PdfReader(f)
-                for page in reader.pages:
-                    text += page.extract_text() + "\n"
-            return text
-        except Exception as e:
-            print(f"Warning: PyPDF2 failed on {pdf_path.name}: {e}")
-    
-    print(f"Warning: No PDF extraction library available for {pdf_path.name}")
-    return f"[PDF file: {pdf_path.name} - content extraction not available]\n"
+def _use_partitions() -> bool:
+    # Off by default: the partitioned layout lives in its own directory and needs a full ingest.
+    return (os.getenv("RAG_PARTITIONED") or "0").strip() not in ("0", "false", "FALSE", "no", "NO")
 
 
-def _extract_text_from_knowledge_file(file_path: Path) -> str:
-    """Extract text from knowledge file (txt or pdf)."""
-    if file_path.suffix.lower() == ".pdf":
-        return _extract_text_from_pdf(file_path)
-    elif file_path.suffix.lower() == ".txt":
-        return file_path.read_text(encoding="utf-8")
-    else:
-        print(f"Warning: Unsupported file type: {file_path.suffix}")
-        return ""
+def _partition_slug(name: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "_", name.lower()).strip("_")
 
 
-PROJECT_ROOT = Path(__file__).resolve().parents[1]
-PERSIST_DIR = PROJECT_ROOT / "vector_db" / "chroma"
-KNOWLEDGE_DIR = Path(__file__).resolve().parent / "knowledge_base"
-COLLECTION_NAME = "solar_panel_knowledge"
+def get_store() -> VectorStore:
+    # Imported here: chromadb / faiss dominate import time and are only needed once a store is opened.
+    from rag_module.vectorstores import ChromaVectorStore, FaissVectorStore
+
+    # Re-ingestion and repeated queries reuse embeddings from the on-disk cache.
+    embedding_model = CachedEmbeddingModel(cache_dir=str(EMBEDDING_CACHE_DIR))
+    backend = os.getenv("RAG_BACKEND", "chroma").strip().lower()
+    if backend not in ("chroma", "faiss"):
+        raise RuntimeError(f"Unsupported RAG_BACKEND: {backend} (expected 'chroma' or 'faiss')")
 
+    if _use_partitions():
+        # One sub-index per defect class (see PartitionedVectorStore); kept apart from
+        # the single-index stores so switching RAG_PARTITIONED never mixes layouts.
+        root = PARTITIONED_PERSIST_DIR / backend
 
-def get_store() -> ChromaVectorStore:
-    return ChromaVectorStore(persist_dir=str(PERSIST_DIR), collection_name=COLLECTION_NAME)
+        def make_partition(name: str) -> VectorStore:
+            if backend == "faiss":
+                return FaissVectorStore(persist_dir=str(root / _partition_slug(name)), embedding_model=embedding_model)
+            return ChromaVectorStore(
+                persist_dir=str(root),
+                collection_name=f"{COLLECTION_NAME}__{_partition_slug(name)}",
+                embedding_model=embedding_model,
+            )
+
+        return PartitionedVectorStore(
+            persist_dir=str(root),
+            make_partition=make_partition,
+            labels=CLASSES,
+            embedding_model=embedding_model,
+        )
+
+    if backend == "faiss":
+        return FaissVectorStore(persist_dir=str(FAISS_PERSIST_DIR), embedding_model=embedding_model)
+    return ChromaVectorStore(
+        persist_dir=str(PERSIST_DIR),
+        collection_name=COLLECTION_NAME,
+        embedding_model=embedding_model,
+    )
 
 
 def _format_retrieved_context(chunks: List[RetrievedChunk]) -> str:
@@ -89,12 +105,18 @@ def _format_retrieved_context(chunks: List[RetrievedChunk]) -> str:
 
 def retrieve_context_from_model_output(
     *,
-    store: ChromaVectorStore,
+    store: VectorStore,
     model_output: Dict[str, Any],
     k: int = 10,
+    table: Optional[DefectRetrievalTable] = None,
 ) -> Tuple[str, str]:
-    query = build_query_from_ml_output(model_output)
-    chunks = store.similarity_search(query, k=k)
+    chunks = table.lookup(model_output, k=k) if table is not None else None
+    if chunks is not None:
+        query = build_canonical_query(str(model_output.get("primary_defect")))
+    else:
+        query = build_query_from_ml_output(model_output)
+        # On a partitioned store only the predicted class's partition and `general` are searched.
+        chunks = store.similarity_search(query, k=k, **search_scope(store, model_output.get("primary_defect")))
 
     # Prefer the canonical formatter from rag_module to keep consistent output.
     try:
@@ -104,16 +126,73 @@ def retrieve_context_from_model_output(
     return query, context
 
 
-def ensure_ingested(store: ChromaVectorStore) -> None:
-    # Skip ingestion if the persistent collection already has documents.
+def build_retrieval_table(store: VectorStore, *, labels: List[str], k: int = 3) -> DefectRetrievalTable:
+    table = DefectRetrievalTable(store, labels=labels, k=k)
+    table.build()
+    return table
+
+
+def _file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _manifest_entry(path: Path, previous: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    st = path.stat()
+    entry = {"path": str(path), "size": st.st_size, "mtime": st.st_mtime}
+    # Unchanged size and mtime: trust the recorded hash instead of re-reading the file.
+    if previous and previous.get("size") == entry["size"] and previous.get("mtime") == entry["mtime"]:
+        entry["sha256"] = previous.get("sha256")
+    else:
+        entry["sha256"] = _file_sha256(path)
+    return entry
+
+
+def _manifest_path(store: VectorStore) -> Path:
+    return Path(getattr(store, "persist_dir", str(PERSIST_DIR))) / MANIFEST_NAME
+
+
+def _load_manifest(path: Path) -> Dict[str, Dict[str, Any]]:
+    if not path.exists():
+        return {}
     try:
-        count = int(store._collection.count())  # type: ignore[attr-defined]
-    except Exception:
-        count = 0
+        return dict(json.loads(path.read_text(encoding="utf-8")).get("files", {}))
+    except (OSError, ValueError, AttributeError):
+        print(f"Warning: ignoring unreadable ingestion manifest: {path}")
+        return {}
+
+
+def _save_manifest(path: Path, files: Dict[str, Dict[str, Any]]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    tmp_path.write_text(json.dumps({"files": files}, indent=2, sort_keys=True), encoding="utf-8")
+    os.replace(tmp_path, path)
 
-    if count > 0:
-        return
 
+def ensure_ingested(
+    store: VectorStore,
+    *,
+    write_lock: Optional[ContextManager[Any]] = None,
+    progress: Optional[Callable[[int, int, Optional[str]], None]] = None,
+) -> None:
+    """Bring the store in line with `KNOWLEDGE_DIR`, touching only what changed.
+
+    A manifest (path, size, mtime, sha256 per file) records what is ingested.
+    New or changed files are extracted and embedded; chunks of changed or deleted
+    files are first removed by their `source` metadata.
+
+    Each file's pages stream through cleaning, the extracted-text cache and chunking
+    into batched store writes, so no file is held in memory as a whole.
+
+    `write_lock` is held around each store write (a file's delete, then each batch of
+    its chunks), not during extraction, so readers sharing the lock can search the
+    partially built store in between.
+    `progress(files_done, files_total, current_file)` is called as files are processed.
+    """
+    write_lock = write_lock if write_lock is not None else nullcontext()
     if not KNOWLEDGE_DIR.exists():
         raise RuntimeError(f"Knowledge directory not found: {KNOWLEDGE_DIR}")
 
@@ -122,36 +201,197 @@ def ensure_ingested(store: ChromaVectorStore) -> None:
     if not knowledge_files:
         raise RuntimeError(f"No knowledge files found in: {KNOWLEDGE_DIR}")
 
-    texts: List[str] = []
-    sources: List[str] = []
-    for file_path in knowledge_files:
+    manifest_path = _manifest_path(store)
+    manifest = _load_manifest(manifest_path)
+    if store.count() == 0:
+        # The store was wiped or never filled; whatever the manifest says is not in it.
+        manifest = {}
+
+    current = {fp.name: _manifest_entry(fp, manifest.get(fp.name)) for fp in knowledge_files}
+    changed = [fp for fp in knowledge_files if manifest.get(fp.name, {}).get("sha256") != current[fp.name]["sha256"]]
+    removed = sorted(set(manifest) - set(current))
+
+    for name in removed:
+        with write_lock:
+            n = store.delete(where={"source": name})
+        print(f"Removed {n} chunks of deleted knowledge file: {name}")
+        del manifest[name]
+        _save_manifest(manifest_path, manifest)
+
+    # Text extracted earlier (any store, any run) is reused; the rest is extracted in a
+    # process pool and comes back in order, file by file.
+    text_cache = ExtractedTextCache(str(EXTRACTED_TEXT_CACHE_DIR))
+    # Chunks carry the defect classes they mention (what PartitionedVectorStore routes on).
+    tagger = DefectTagger(CLASSES)
+    to_extract = [fp for fp in changed if not text_cache.has(current[fp.name]["sha256"])]
+    extracted = iter_knowledge_pages(to_extract)
+
+    for done, file_path in enumerate(changed):
+        if progress is not None:
+            progress(done, len(changed), file_path.name)
         print(f"Processing knowledge file: {file_path.name}")
-        content = _extract_text_from_knowledge_file(file_path)
-        if content.strip():
-            texts.append(content)
-            sources.append(file_path.name)
+        sha256 = current[file_path.name]["sha256"]
+        entry = None if file_path in to_extract else text_cache.get(sha256)
+        if entry is not None:
+            print(f"Using cached text for {file_path.name}")
+            page_offsets = entry["page_offsets"]
+            pieces = text_cache.iter_text(sha256)
         else:
+            if file_path in to_extract:
+                pages = next(extracted)[1]
+            else:
+                # Cache entry turned out unreadable: extract just this file.
+                pages = next(iter_knowledge_pages([file_path], max_workers=1))[1]
+            # Pages are cleaned, cached and chunked in one pass; offsets fill in as they stream.
+            page_offsets = []
+            pieces = text_cache.write_through(
+                sha256,
+                iter_clean(pages, page_offsets=page_offsets),
+                page_offsets=page_offsets,
+                source=file_path.name,
+                complete=lambda pages=pages: pages.complete,
+            )
+
+        with write_lock:
+            # Drops the old version's chunks (also covers stores ingested before the manifest existed).
+            store.delete(where={"source": file_path.name})
+        chunks = iter_document_chunks(
+            pieces,
+            source=file_path.name,
+            page_offsets=page_offsets if file_path.suffix.lower() == ".pdf" else None,
+            tagger=tagger,
+        )
+        if not ingest_chunks(store, chunks, write_lock=write_lock):
             print(f"Warning: {file_path.name} extracted no content")
+        manifest[file_path.name] = current[file_path.name]
+        _save_manifest(manifest_path, manifest)
 
-    if texts:
-        ingest_knowledge(store, knowledge_texts=texts, sources=sources)
-    else:
-        raise RuntimeError(f"No content extracted from knowledge files in: {KNOWLEDGE_DIR}")
+    if progress is not None:
+        progress(len(changed), len(changed), None)
+    if manifest != current:
+        # Only size/mtime moved (e.g. a touched file); keep the fast path for next startup.
+        _save_manifest(manifest_path, current)
+    if not changed and not removed:
+        print(f"Knowledge base up to date ({len(current)} files, {store.count()} chunks)")
 
     # Must never be empty after startup.
-    try:
-        new_count = int(store._collection.count())  # type: ignore[attr-defined]
-    except Exception:
-        new_count = 0
-    if new_count <= 0:
+    if store.count() <= 0:
         raise RuntimeError("RAG retrieval is empty after ingestion; check knowledge base ingestion.")
 
 
-def retrieve_context(*, store: ChromaVectorStore, fault: str, confidence: float, k: int = 3) -> str:
+class BackgroundIngestion:
+    """Opens the store and runs `ensure_ingested` in a daemon thread so startup does not wait for it.
+
+    `store` is None until `open_store()` (e.g. `get_store`, which pays the chromadb /
+    faiss import) has returned in the worker. `status()` reports progress for a
+    readiness endpoint. Readers take `reading(timeout=...)` to search the store while
+    it is being filled: writes happen under the same lock, one knowledge file at a
+    time. `on_ready(store)` (e.g. building a retrieval table) runs in the worker once
+    ingestion succeeds.
+    """
+
+    def __init__(
+        self,
+        open_store: Callable[[], VectorStore],
+        *,
+        on_ready: Optional[Callable[[VectorStore], None]] = None,
+    ):
+        self.open_store = open_store
+        self.on_ready = on_ready
+        self.store: Optional[VectorStore] = None
+        self.write_lock = threading.Lock()
+
+        self._ready = threading.Event()
+        self._status_lock = threading.Lock()
+        self._status: Dict[str, Any] = {
+            "state": "pending",
+            "files_done": 0,
+            "files_total": None,
+            "current_file": None,
+            "error": None,
+            "started_at": None,
+            "finished_at": None,
+        }
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def ready(self) -> bool:
+        return self._ready.is_set()
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="knowledge-ingestion", daemon=True)
+        self._thread.start()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._ready.wait(timeout)
+
+    def _update(self, **fields: Any) -> None:
+        with self._status_lock:
+            self._status.update(fields)
+
+    def _progress(self, done: int, total: int, current: Optional[str]) -> None:
+        self._update(files_done=done, files_total=total, current_file=current)
+
+    def _run(self) -> None:
+        self._update(state="opening", started_at=time.time())
+        try:
+            store = self.open_store()
+            self.store = store
+            self._update(state="ingesting")
+            ensure_ingested(store, write_lock=self.write_lock, progress=self._progress)
+            if self.on_ready is not None:
+                self.on_ready(store)
+        except Exception as e:
+            print(f"❌ Knowledge ingestion failed: {e}")
+            self._update(state="failed", error=str(e), current_file=None, finished_at=time.time())
+            return
+        self._update(state="ready", current_file=None, finished_at=time.time())
+        self._ready.set()
+
+    def status(self) -> Dict[str, Any]:
+        with self._status_lock:
+            status = dict(self._status)
+        status["ready"] = status["state"] == "ready"
+        try:
+            status["chunks"] = self.store.count() if self.store is not None else 0
+        except Exception:
+            status["chunks"] = None
+        start, end = status["started_at"], status["finished_at"]
+        status["elapsed_seconds"] = round((end or time.time()) - start, 3) if start else None
+        return status
+
+    @contextmanager
+    def reading(self, *, timeout: float) -> Iterator[bool]:
+        """Yields True if `store` may be searched now (ready, or open and the write lock was free within `timeout`)."""
+
+        if self.ready:
+            yield True
+            return
+        if self.store is None:
+            yield False
+            return
+        acquired = self.write_lock.acquire(timeout=timeout)
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                self.write_lock.release()
+
+
+def retrieve_context(
+    *,
+    store: VectorStore,
+    fault: str,
+    confidence: float,
+    k: int = 3,
+    table: Optional[DefectRetrievalTable] = None,
+) -> str:
     model_output = {
         "primary_defect": fault,
         "confidence": confidence,
         "top_predictions": [{"label": fault, "score": confidence}],
     }
-    _query, context = retrieve_context_from_model_output(store=store, model_output=model_output, k=k)
+    _query, context = retrieve_context_from_model_output(store=store, model_output=model_output, k=k, table=table)
     return context
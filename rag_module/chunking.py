@@ -1,6 +1,40 @@
 from __future__ import annotations
 
-from typing import List
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+
+def clean_text(text: str) -> str:
+    """Normalization applied before chunking: trailing whitespace per line, outer whitespace."""
+
+    return "\n".join(line.rstrip() for line in text.splitlines()).strip()
+
+
+def clean_pages(pages: Iterable[str]) -> Tuple[str, List[int]]:
+    """`clean_text` of the concatenated pages, plus where each page starts in the result.
+
+    A line belongs to the page its first character came from; pages that contribute
+    no line start where the next page does. See `iter_clean` for the streaming form.
+    """
+
+    offsets: List[int] = []
+    cleaned = "".join(iter_clean(pages, page_offsets=offsets))
+    return cleaned, offsets
+
+
+def chunk_spans(cleaned: str, *, chunk_size: int = 600, chunk_overlap: int = 80) -> List[Tuple[int, int]]:
+    """(start, end) of every chunk `chunk_text` returns, as offsets into already cleaned text."""
+
+    spans: List[Tuple[int, int]] = []
+    start = 0
+    while start < len(cleaned):
+        end = min(len(cleaned), start + chunk_size)
+        if cleaned[start:end].strip():
+            spans.append((start, end))
+        if end == len(cleaned):
+            break
+        start = max(0, end - chunk_overlap)
+
+    return spans
 
 
 def chunk_text(text: str, *, chunk_size: int = 600, chunk_overlap: int = 80) -> List[str]:
@@ -13,19 +47,110 @@ def chunk_text(text: str, *, chunk_size: int = 600, chunk_overlap: int = 80) ->
     You can replace this with token-based chunking later if needed.
     """
 
-    cleaned = "\n".join(line.rstrip() for line in text.splitlines()).strip()
-    if not cleaned:
-        return []
+    cleaned = clean_text(text)
+    return [cleaned[start:end].strip() for start, end in chunk_spans(cleaned, chunk_size=chunk_size, chunk_overlap=chunk_overlap)]
 
-    chunks: List[str] = []
+
+def iter_clean(pieces: Iterable[str], *, page_offsets: Optional[List[int]] = None) -> Iterator[str]:
+    """Streaming `clean_text`: fragments whose concatenation is `clean_text("".join(pieces))`.
+
+    Only the current unfinished line is buffered, plus a count of blank lines that are
+    emitted once more content follows (trailing blank lines are dropped, as strip() does).
+
+    With `page_offsets` (an empty list), each piece is a page and the list is filled
+    with the offsets `clean_pages` returns. A page's entry is appended once a line
+    starting on it (or on a later page) is read, before any text from that line is
+    yielded, so offsets up to the text yielded so far are always final.
+    """
+
+    carry = ""
+    carry_page = 0
+    started = False
+    blank_lines = 0
+    emitted = 0  # length of the cleaned text yielded so far
+
+    def start_line(page: int) -> None:
+        # Where this line starts in the cleaned text; pages with no line of their own start here too.
+        offset = emitted + blank_lines + 1 if started else 0
+        while len(page_offsets) <= page:
+            page_offsets.append(offset)
+
+    def emit(line: str) -> Iterator[str]:
+        nonlocal started, blank_lines, emitted
+        content = line.rstrip()
+        if not started:
+            content = content.lstrip()
+            if content:
+                started = True
+                emitted += len(content)
+                yield content
+        elif content:
+            fragment = "\n" * (blank_lines + 1) + content
+            blank_lines = 0
+            emitted += len(fragment)
+            yield fragment
+        else:
+            blank_lines += 1
+
+    page = -1
+    for page, piece in enumerate(pieces):
+        first_page = carry_page if carry else page
+        lines = (carry + piece).splitlines(keepends=True)
+        carry = ""
+        # An unterminated last line, or a trailing "\r" that may be half of "\r\n", waits for more input.
+        if lines and (lines[-1].endswith("\r") or lines[-1].splitlines()[0] == lines[-1]):
+            carry = lines.pop()
+            carry_page = first_page if not lines else page
+        for i, line in enumerate(lines):
+            if page_offsets is not None:
+                start_line(first_page if i == 0 else page)
+            yield from emit(line)
+    if carry:
+        if page_offsets is not None:
+            start_line(carry_page)
+        yield from emit(carry)
+    if page_offsets is not None:
+        # Trailing blank lines are dropped: clamp to the end, as are pages with no line.
+        for i, offset in enumerate(page_offsets):
+            page_offsets[i] = min(offset, emitted)
+        page_offsets.extend([emitted] * (page + 1 - len(page_offsets)))
+
+
+def iter_chunks(
+    pieces: Iterable[str],
+    *,
+    chunk_size: int = 600,
+    chunk_overlap: int = 80,
+) -> Iterator[Tuple[int, int, str]]:
+    """Streaming `chunk_text` over text arriving in pieces (e.g. PDF pages).
+
+    Yields `(start, end, chunk)` with the same boundaries and chunks as `chunk_spans` /
+    `chunk_text` on the joined text; offsets refer to the cleaned text. Memory is
+    bounded by `chunk_size` plus the largest piece, not by the document.
+    """
+
+    buf = ""
+    base = 0  # cleaned-text offset of buf[0]
     start = 0
-    while start < len(cleaned):
-        end = min(len(cleaned), start + chunk_size)
-        chunk = cleaned[start:end].strip()
+    for fragment in iter_clean(pieces):
+        buf += fragment
+        # Only cut once text beyond the chunk is known to exist; the final chunk is decided at the end.
+        while base + len(buf) > start + chunk_size:
+            end = start + chunk_size
+            chunk = buf[start - base : end - base].strip()
+            if chunk:
+                yield start, end, chunk
+            start = max(0, end - chunk_overlap)
+            if start > base:
+                buf = buf[start - base :]
+                base = start
+
+    total = base + len(buf)
+    while start < total:
+        end = min(total, start + chunk_size)
+        chunk = buf[start - base : end - base].strip()
         if chunk:
-            chunks.append(chunk)
-        if end == len(cleaned):
+            yield start, end, chunk
+        if end == total:
             break
         start = max(0, end - chunk_overlap)
-
-    return chunks
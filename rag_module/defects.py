@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+import re
+from typing import Dict, List, Optional, Sequence
+
+# Phrases that mark a chunk as talking about a defect class, keyed by the classifier's
+# labels (backend/onnx_infer.py::CLASSES). Matched case-insensitively at word starts.
+DEFECT_PATTERNS: Dict[str, Sequence[str]] = {
+    "Bird-drop": (r"bird[\s-]*drop", r"droppings", r"guano"),
+    "Clean": (r"clean[\s-]+(?:panel|module)s?\b", r"no (?:visible )?(?:defects?|faults?)\b"),
+    "Dusty": (r"dust", r"soil(?:ing|ed)\b"),
+    "Electrical-damage": (
+        r"electrical[\s-]*(?:damage|fault)",
+        r"bypass diode",
+        r"junction box",
+        r"ground fault",
+        r"arc(?:ing)?\b",
+        r"wiring",
+    ),
+    "Physical-Damage": (r"physical[\s-]*damage", r"crack", r"broken glass", r"shattered", r"delamination"),
+    "Snow-Covered": (r"snow", r"ice\b", r"frost"),
+}
+
+# Metadata key holding a chunk's tags, comma-separated (Chroma metadata values must be scalars).
+DEFECTS_KEY = "defects"
+
+
+class DefectTagger:
+    """Tags text with the defect classes it mentions.
+
+    Labels without an entry in `DEFECT_PATTERNS` are matched by their own name
+    (hyphens and spaces interchangeable).
+    """
+
+    def __init__(self, labels: Sequence[str], *, patterns: Optional[Dict[str, Sequence[str]]] = None):
+        patterns = DEFECT_PATTERNS if patterns is None else patterns
+        self.labels = list(labels)
+        self._regexes = {}
+        for label in self.labels:
+            terms = patterns.get(label) or (r"[\s-]*".join(map(re.escape, re.split(r"[\s-]+", label))),)
+            self._regexes[label] = re.compile(r"\b(?:" + "|".join(terms) + ")", re.IGNORECASE)
+
+    def __call__(self, text: str) -> List[str]:
+        """Labels mentioned in `text`, in label order."""
+
+        return [label for label in self.labels if self._regexes[label].search(text)]
+
+
+def format_tags(tags: Sequence[str]) -> str:
+    return ",".join(tags)
+
+
+def parse_tags(value: object) -> List[str]:
+    if not value:
+        return []
+    return [tag for tag in str(value).split(",") if tag]
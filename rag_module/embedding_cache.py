@@ -0,0 +1,159 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from .embeddings import EmbeddingModel
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class CachedEmbeddingModel(EmbeddingModel):
+    """Content-addressed cache in front of any `EmbeddingModel`.
+
+    Lookup order per text:
+    - bounded in-memory LRU
+    - on-disk SQLite table keyed by (sha256(text), embedder version, dim)
+    - the wrapped model (results are written back to both layers)
+
+    Only `embed_texts` (chunk text being ingested) writes to disk. `embed_queries`
+    reads both layers but keeps its results in memory: query strings carry
+    per-request values (confidence, panel id) and would grow the table forever.
+
+    Vectors are stored exactly as the wrapped model returns them, so cached and
+    freshly computed embeddings are interchangeable. The wrapped model's `version`
+    must change whenever its vectors do.
+    """
+
+    def __init__(
+        self,
+        inner: Optional[EmbeddingModel] = None,
+        *,
+        cache_dir: Optional[str] = None,
+        max_memory_items: int = 50_000,
+    ):
+        self.inner = inner or EmbeddingModel()
+        super().__init__(dim=self.inner.dim)
+        self.version = str(self.inner.version)
+        self.max_memory_items = int(max_memory_items)
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self._lru: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+            self._db = sqlite3.connect(os.path.join(cache_dir, "embeddings.sqlite3"), check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                " text_hash TEXT NOT NULL, version TEXT NOT NULL, dim INTEGER NOT NULL, vector BLOB NOT NULL,"
+                " PRIMARY KEY (text_hash, version, dim))"
+            )
+            self._db.commit()
+
+    def close(self) -> None:
+        """Close the SQLite connection; later misses are still computed, just not persisted."""
+
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "memory_items": len(self._lru),
+        }
+
+    def _remember(self, key: str, vec: np.ndarray) -> None:
+        self._lru[key] = vec
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_memory_items:
+            self._lru.popitem(last=False)
+
+    def _load_from_disk(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        found: Dict[str, np.ndarray] = {}
+        if self._db is None or not keys:
+            return found
+        # Stay well below SQLite's bound-parameter limit.
+        for i in range(0, len(keys), 500):
+            batch = keys[i : i + 500]
+            placeholders = ",".join("?" for _ in batch)
+            rows = self._db.execute(
+                f"SELECT text_hash, vector FROM embeddings WHERE version = ? AND dim = ? AND text_hash IN ({placeholders})",
+                [self.version, self.dim, *batch],
+            ).fetchall()
+            for key, blob in rows:
+                vec = np.frombuffer(blob, dtype="float32")
+                if vec.shape[0] == self.dim:
+                    found[key] = vec
+        return found
+
+    def _store_on_disk(self, items: Dict[str, np.ndarray]) -> None:
+        if self._db is None or not items:
+            return
+        self._db.executemany(
+            "INSERT OR REPLACE INTO embeddings (text_hash, version, dim, vector) VALUES (?, ?, ?, ?)",
+            [(key, self.version, self.dim, vec.astype("float32").tobytes()) for key, vec in items.items()],
+        )
+        self._db.commit()
+
+    def embed_texts(self, texts: List[str]) -> np.ndarray:
+        return self._embed(texts, persist=True)
+
+    def embed_queries(self, queries: List[str]) -> np.ndarray:
+        return self._embed(queries, persist=False)
+
+    def _embed(self, texts: List[str], *, persist: bool) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, self.dim), dtype="float32")
+
+        keys = [text_hash(t) for t in texts]
+        resolved: Dict[str, np.ndarray] = {}
+
+        with self._lock:
+            pending: Dict[str, str] = {}
+            for key, text in zip(keys, texts):
+                if key in resolved or key in pending:
+                    continue
+                vec = self._lru.get(key)
+                if vec is not None:
+                    self._lru.move_to_end(key)
+                    resolved[key] = vec
+                    self.hits += 1
+                else:
+                    pending[key] = text
+
+            from_disk = self._load_from_disk(list(pending))
+            for key, vec in from_disk.items():
+                resolved[key] = vec
+                self._remember(key, vec)
+                del pending[key]
+            self.disk_hits += len(from_disk)
+            self.misses += len(pending)
+
+        if pending:
+            inner_embed = self.inner.embed_texts if persist else self.inner.embed_queries
+            computed = inner_embed(list(pending.values()))
+            fresh = {key: computed[i].copy() for i, key in enumerate(pending)}
+            resolved.update(fresh)
+            with self._lock:
+                for key, vec in fresh.items():
+                    self._remember(key, vec)
+                if persist:
+                    self._store_on_disk(fresh)
+
+        return np.stack([resolved[key] for key in keys]).astype("float32")
@@ -1,10 +1,55 @@
 from __future__ import annotations
 
 import re
-from typing import List
+import threading
+from typing import Dict, List
 
 import numpy as np
 
+_TOKEN_RE = re.compile(r"[a-z0-9_\-/]+")
+
+# The token regex only matches ASCII, so every token encodes to one byte per char
+# and hashing over the encoded bytes is identical to hashing over ord(ch).
+_HASH_MULT = np.uint64(131)
+_HASH_MASK = np.uint64(0xFFFFFFFF)
+
+# Identifies the vectors `EmbeddingModel` produces. Bump whenever the tokenizer, hash or
+# normalization changes: persistent caches (`embedding_cache.py`) are keyed on it.
+EMBEDDING_VERSION = "hashed-bow-v1"
+
+
+def _hash_token(tok: str) -> int:
+    """Reference scalar hash (kept for clarity and for parity checks)."""
+
+    h = 0
+    for ch in tok:
+        h = (h * 131 + ord(ch)) & 0xFFFFFFFF
+    return h
+
+
+def _hash_tokens(tokens: List[str]) -> np.ndarray:
+    """Vectorized version of `_hash_token` over a list of ASCII tokens.
+
+    Tokens are packed into a zero-padded (n_tokens, max_len) uint8 matrix and the
+    rolling hash is advanced one column at a time for all tokens at once.
+    """
+
+    if not tokens:
+        return np.zeros((0,), dtype=np.uint64)
+
+    lengths = np.fromiter((len(t) for t in tokens), dtype=np.int64, count=len(tokens))
+    max_len = int(lengths.max())
+    buf = np.zeros((len(tokens), max_len), dtype=np.uint8)
+    flat = np.frombuffer("".join(tokens).encode("ascii"), dtype=np.uint8)
+    cols = np.arange(max_len)
+    buf[cols[None, :] < lengths[:, None]] = flat
+
+    h = np.zeros(len(tokens), dtype=np.uint64)
+    for j in range(max_len):
+        active = lengths > j
+        h[active] = (h[active] * _HASH_MULT + buf[active, j].astype(np.uint64)) & _HASH_MASK
+    return h
+
 
 class EmbeddingModel:
     """Small wrapper around SentenceTransformers.
@@ -12,26 +57,61 @@ class EmbeddingModel:
     Notes:
     - We compute embeddings inside the app so both FAISS and Chroma backends behave the same.
     - Embeddings are L2-normalized so inner product ~= cosine similarity.
+    - Token -> bucket lookups are memoized; the vocabulary of a knowledge base is small
+      compared to its token count, so most tokens are never hashed twice.
     """
 
+    version: str = EMBEDDING_VERSION
+
+    # Upper bound on memoized tokens; the table is simply reset when it fills up.
+    max_memo_tokens: int = 1 << 20
+
     def __init__(self, dim: int = 384):
         self.dim = int(dim)
+        self._bucket_memo: Dict[str, int] = {}
+        self._memo_lock = threading.Lock()
+
+    def _buckets_for(self, tokens: List[str]) -> np.ndarray:
+        with self._memo_lock:
+            memo = self._bucket_memo
+            unique = set(tokens)
+            misses = [t for t in unique if t not in memo]
+            if misses and len(memo) + len(misses) > self.max_memo_tokens:
+                # Resetting drops this batch's earlier hits too, so rehash them all.
+                memo.clear()
+                misses = list(unique)
+            if misses:
+                hashed = _hash_tokens(misses) % np.uint64(self.dim)
+                memo.update(zip(misses, hashed.tolist()))
+            return np.fromiter((memo[t] for t in tokens), dtype=np.int64, count=len(tokens))
+
+    def embed_queries(self, queries: List[str]) -> np.ndarray:
+        """Embeddings of search queries: the same vectors as `embed_texts`.
+
+        Stores call this on the query path so caching wrappers can keep one-off
+        query strings out of persistent storage.
+        """
+
+        return self.embed_texts(queries)
 
     def embed_texts(self, texts: List[str]) -> np.ndarray:
         if not texts:
             return np.zeros((0, self.dim), dtype="float32")
 
-        mat = np.zeros((len(texts), self.dim), dtype="float32")
-        for i, t in enumerate(texts):
-            if not t:
-                continue
-            for tok in re.findall(r"[a-z0-9_\-/]+", t.lower()):
-                # Stable hashed bag-of-words embedding.
-                # This is a lightweight fallback to keep the project PyTorch-free.
-                h = 0
-                for ch in tok:
-                    h = (h * 131 + ord(ch)) & 0xFFFFFFFF
-                mat[i, h % self.dim] += 1.0
+        # Tokenize the whole batch, then count (row, bucket) pairs in one bincount.
+        # Stable hashed bag-of-words embedding.
+        # This is a lightweight fallback to keep the project PyTorch-free.
+        per_text = [_TOKEN_RE.findall(t.lower()) if t else [] for t in texts]
+        counts = np.fromiter((len(toks) for toks in per_text), dtype=np.int64, count=len(texts))
+        tokens = [tok for toks in per_text for tok in toks]
+
+        if tokens:
+            rows = np.repeat(np.arange(len(texts), dtype=np.int64), counts)
+            flat = rows * self.dim + self._buckets_for(tokens)
+            mat = np.bincount(flat, minlength=len(texts) * self.dim).astype("float32")
+            mat = mat.reshape(len(texts), self.dim)
+        else:
+            mat = np.zeros((len(texts), self.dim), dtype="float32")
 
         norms = np.linalg.norm(mat, axis=1, keepdims=True)
         norms[norms == 0.0] = 1.0
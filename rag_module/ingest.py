@@ -1,11 +1,82 @@
 from __future__ import annotations
 
-from typing import Any, Dict, Iterable, List, Optional
+import bisect
+import itertools
+from contextlib import nullcontext
+from typing import Any, Callable, ContextManager, Dict, Iterable, Iterator, List, Optional
 
-from .chunking import chunk_text
+from .chunking import iter_chunks
+from .defects import DEFECTS_KEY, format_tags
 from .types import DocumentChunk
 from .vectorstores.base import VectorStore
 
+# Chunks embedded and written per store.add_texts call; bounds peak ingestion memory.
+DEFAULT_BATCH_SIZE = 256
+
+
+def iter_document_chunks(
+    pieces: Iterable[str],
+    *,
+    source: str,
+    chunk_size: int = 1200,
+    chunk_overlap: int = 200,
+    page_offsets: Optional[List[int]] = None,
+    tagger: Optional[Callable[[str], List[str]]] = None,
+) -> Iterator[DocumentChunk]:
+    """Chunks of one document whose text arrives in pieces (pages, lines, or one string).
+
+    `page_offsets`, if given, holds where each page starts in the cleaned text
+    (see `chunking.clean_pages`); chunks then carry 1-based `page_start`/`page_end` metadata.
+    The list may still be filling in while pieces stream (`chunking.iter_clean` with
+    `page_offsets=`): it is read per chunk, after the chunk's text has arrived.
+    `tagger` (e.g. `defects.DefectTagger`) adds the defect classes a chunk mentions
+    as comma-separated `defects` metadata.
+    """
+
+    chunks = iter_chunks(pieces, chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    for i, (start, end, text) in enumerate(chunks):
+        metadata: Dict[str, Any] = {"source": source, "chunk_index": i}
+        if page_offsets:
+            metadata["page_start"] = bisect.bisect_right(page_offsets, start)
+            metadata["page_end"] = bisect.bisect_right(page_offsets, end - 1)
+        if tagger is not None:
+            metadata[DEFECTS_KEY] = format_tags(tagger(text))
+        yield DocumentChunk(text=text, metadata=metadata)
+
+
+def ingest_chunks(
+    store: VectorStore,
+    chunks: Iterable[DocumentChunk],
+    *,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    write_lock: Optional[ContextManager[Any]] = None,
+) -> int:
+    """Embeds and stores chunks `batch_size` at a time, so memory does not grow with the corpus.
+
+    `write_lock`, if given, is held around each batch's store write only, not while
+    `chunks` produces the next batch (which may mean extracting a PDF).
+
+    Returns number of chunks stored.
+    """
+
+    if batch_size <= 0:
+        raise ValueError("batch_size must be positive")
+
+    n_chunks = 0
+    it = iter(chunks)
+    while True:
+        batch = list(itertools.islice(it, batch_size))
+        if not batch:
+            break
+        with write_lock if write_lock is not None else nullcontext():
+            store.add_texts(
+                [c.text for c in batch],
+                metadatas=[c.metadata for c in batch],
+            )
+        n_chunks += len(batch)
+
+    return n_chunks
+
 
 def ingest_knowledge(
     store: VectorStore,
@@ -14,15 +85,21 @@ def ingest_knowledge(
     sources: Optional[List[str]] = None,
     chunk_size: int = 1200,
     chunk_overlap: int = 200,
+    page_offsets: Optional[List[Optional[List[int]]]] = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    tagger: Optional[Callable[[str], List[str]]] = None,
 ) -> int:
     """Ingests raw knowledge texts into the vector database.
 
     Flow:
-    - raw SOP/handbook text -> chunking -> store.add_texts(chunks)
+    - raw SOP/handbook text -> chunk iterator -> batches of `batch_size` -> store.add_texts(batch)
 
     RAG invariant:
     - we store *factual, company-specific knowledge* only.
 
+    `page_offsets[i]`, if given, holds where each page starts in `clean_text(knowledge_texts[i])`
+    (see `chunking.clean_pages`); chunks then carry 1-based `page_start`/`page_end` metadata.
+
     Returns number of chunks stored.
     """
 
@@ -30,18 +107,23 @@ def ingest_knowledge(
         sources = ["knowledge" for _ in knowledge_texts]
     if len(sources) != len(knowledge_texts):
         raise ValueError("sources length must match knowledge_texts length")
+    if page_offsets is None:
+        page_offsets = [None for _ in knowledge_texts]
+    if len(page_offsets) != len(knowledge_texts):
+        raise ValueError("page_offsets length must match knowledge_texts length")
 
-    chunks: List[DocumentChunk] = []
-    for text, source in zip(knowledge_texts, sources):
-        for i, c in enumerate(chunk_text(text, chunk_size=chunk_size, chunk_overlap=chunk_overlap)):
-            chunks.append(DocumentChunk(text=c, metadata={"source": source, "chunk_index": i}))
-
-    store.add_texts(
-        [c.text for c in chunks],
-        metadatas=[c.metadata for c in chunks],
+    chunks = itertools.chain.from_iterable(
+        iter_document_chunks(
+            [text],
+            source=source,
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap,
+            page_offsets=offsets,
+            tagger=tagger,
+        )
+        for text, source, offsets in zip(knowledge_texts, sources, page_offsets)
     )
-
-    return len(chunks)
+    return ingest_chunks(store, chunks, batch_size=batch_size)
 
 
 def ingest_knowledge_lines(
@@ -51,14 +133,12 @@ def ingest_knowledge_lines(
     source: str,
     chunk_size: int = 600,
     chunk_overlap: int = 80,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    tagger: Optional[Callable[[str], List[str]]] = None,
 ) -> int:
-    """Convenience ingestion for a single text file's lines."""
-
-    text = "".join(lines)
-    return ingest_knowledge(
-        store,
-        knowledge_texts=[text],
-        sources=[source],
-        chunk_size=chunk_size,
-        chunk_overlap=chunk_overlap,
+    """Convenience ingestion for a single text file's lines (streamed, never joined)."""
+
+    chunks = iter_document_chunks(
+        lines, source=source, chunk_size=chunk_size, chunk_overlap=chunk_overlap, tagger=tagger
     )
+    return ingest_chunks(store, chunks, batch_size=batch_size)
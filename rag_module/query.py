@@ -1,9 +1,11 @@
 from __future__ import annotations
 
-from typing import Any, Dict, List, Optional
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 
 from .types import RetrievedChunk
 from .vectorstores.base import VectorStore
+from .vectorstores.partitioned import PartitionedVectorStore
 
 
 def build_query_from_ml_output(model_output: Dict[str, Any]) -> str:
@@ -51,6 +53,196 @@ def build_query_from_ml_output(model_output: Dict[str, Any]) -> str:
     return "\n".join(str(p) for p in parts if p is not None)
 
 
+def search_scope(store: VectorStore, label: Any) -> Dict[str, Any]:
+    """Extra search kwargs that restrict a search for `label` to its partitions.
+
+    Empty unless `store` is a `PartitionedVectorStore`.
+    """
+
+    if not isinstance(store, PartitionedVectorStore):
+        return {}
+    return {"partitions": store.partitions_for_label(label)}
+
+
+def _confidence_bucket_label(index: int, edges: Sequence[float]) -> str:
+    if not edges:
+        return "any"
+    if index == 0:
+        return f"below {edges[0]:.2f}"
+    if index == len(edges):
+        return f"{edges[-1]:.2f} or above"
+    return f"{edges[index - 1]:.2f} to {edges[index]:.2f}"
+
+
+def build_canonical_query(primary_defect: str, *, confidence_bucket: Optional[str] = None) -> str:
+    """Query text that depends only on the defect class (and optionally a confidence bucket).
+
+    Same shape as `build_query_from_ml_output`, minus the per-request fields
+    (raw confidence float, panel_id), so it can be embedded and searched once per class.
+    """
+
+    parts: List[str] = [
+        "solar panel defect knowledge",
+        f"primary_defect: {primary_defect}",
+    ]
+    if confidence_bucket is not None:
+        parts.append(f"confidence: {confidence_bucket}")
+    parts.extend(
+        [
+            f"top_predictions: {primary_defect}",
+            "impact and risk",
+            "maintenance SOP",
+            "decision thresholds",
+            "cleaning isolation replacement criteria",
+        ]
+    )
+    return "\n".join(parts)
+
+
+class DefectRetrievalTable:
+    """Precomputed top-k retrieval per defect class (and optional confidence bucket).
+
+    The classifier only emits a handful of labels, so instead of embedding and
+    searching a unique query per request we search once per (label, bucket) and
+    answer later requests with a dictionary lookup.
+
+    The table remembers the store revision it was built from and rebuilds itself
+    on the next lookup after any write to the store.
+    """
+
+    def __init__(
+        self,
+        store: VectorStore,
+        *,
+        labels: Sequence[str],
+        k: int = 10,
+        confidence_buckets: Sequence[float] = (),
+    ):
+        self.store = store
+        self.labels = list(labels)
+        self.k = int(k)
+        self.confidence_buckets = sorted(float(b) for b in confidence_buckets)
+
+        self._entries: Dict[Tuple[str, int], List[RetrievedChunk]] = {}
+        self._built_revision: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def _bucket_index(self, confidence: Any) -> int:
+        if not self.confidence_buckets:
+            return 0
+        try:
+            value = float(confidence)
+        except (TypeError, ValueError):
+            return 0
+        return sum(1 for edge in self.confidence_buckets if value >= edge)
+
+    def build(self) -> None:
+        with self._lock:
+            self._build_locked()
+
+    def _build_locked(self) -> None:
+        keys: List[Tuple[str, int]] = [
+            (label, b) for label in self.labels for b in range(len(self.confidence_buckets) + 1)
+        ]
+        queries = [
+            build_canonical_query(
+                label,
+                confidence_bucket=(
+                    _confidence_bucket_label(b, self.confidence_buckets) if self.confidence_buckets else None
+                ),
+            )
+            for label, b in keys
+        ]
+
+        revision = self.store.revision
+        vectors = self.store.embedding_model.embed_queries(queries)  # type: ignore[attr-defined]
+        self._entries = {
+            key: self.store.search_by_vector(vec, k=self.k, **search_scope(self.store, key[0]))
+            for key, vec in zip(keys, vectors)
+        }
+        self._built_revision = revision
+
+    def lookup(self, model_output: Dict[str, Any], *, k: int) -> Optional[List[RetrievedChunk]]:
+        """Return precomputed chunks, or None when the request is not covered by the table."""
+
+        label = model_output.get("primary_defect")
+        if label not in self.labels or k > self.k:
+            return None
+        # Revision check and row read under the build lock, so a concurrent rebuild
+        # never pairs the old rows with the new revision.
+        with self._lock:
+            if self._built_revision != self.store.revision:
+                self._build_locked()
+            chunks = self._entries.get((label, self._bucket_index(model_output.get("confidence"))))
+        return None if chunks is None else chunks[:k]
+
+
+def _prediction_labels(model_output: Dict[str, Any]) -> List[Tuple[str, Any]]:
+    """(label, score) for the primary defect followed by the other top predictions, deduplicated."""
+
+    labels: List[Tuple[str, Any]] = []
+    seen = set()
+    primary = model_output.get("primary_defect")
+    if primary is not None:
+        labels.append((str(primary), model_output.get("confidence")))
+        seen.add(str(primary))
+    for p in model_output.get("top_predictions") or []:
+        if isinstance(p, dict) and p.get("label") is not None and str(p["label"]) not in seen:
+            labels.append((str(p["label"]), p.get("score")))
+            seen.add(str(p["label"]))
+    return labels
+
+
+def merge_retrieved(results: List[List[RetrievedChunk]], *, k: int) -> List[RetrievedChunk]:
+    """Merge several result lists: drop duplicate chunks (keeping the best score), best first."""
+
+    best: Dict[Tuple[Any, ...], RetrievedChunk] = {}
+    for chunks in results:
+        for ch in chunks:
+            key = (ch.text, ch.metadata.get("source"), ch.metadata.get("chunk_index"))
+            if key not in best or ch.score > best[key].score:
+                best[key] = ch
+    return sorted(best.values(), key=lambda ch: ch.score, reverse=True)[:k]
+
+
+def retrieve_per_prediction(
+    store: VectorStore,
+    *,
+    model_output: Dict[str, Any],
+    k: int,
+    table: Optional[DefectRetrievalTable] = None,
+    where: Optional[Dict[str, Any]] = None,
+) -> List[RetrievedChunk]:
+    """Retrieve for every label in top_predictions with one batched store call.
+
+    Labels covered by `table` are answered from it; the rest go through a single
+    `similarity_search_batch` call. Results are merged into one top-k list.
+    The table holds unfiltered results, so it is bypassed when `where` is given.
+    """
+
+    if where:
+        table = None
+    results: List[List[RetrievedChunk]] = []
+    missing: List[str] = []
+    for label, score in _prediction_labels(model_output):
+        chunks = table.lookup({"primary_defect": label, "confidence": score}, k=k) if table is not None else None
+        if chunks is None:
+            missing.append(label)
+        else:
+            results.append(chunks)
+
+    if missing and isinstance(store, PartitionedVectorStore):
+        # Each label searches its own partitions.
+        results.extend(
+            store.similarity_search(build_canonical_query(label), k=k, where=where, **search_scope(store, label))
+            for label in missing
+        )
+    elif missing:
+        queries = [build_canonical_query(label) for label in missing]
+        results.extend(store.similarity_search_batch(queries, k=k, where=where))
+    return merge_retrieved(results, k=k)
+
+
 def format_retrieved_context(chunks: List[RetrievedChunk]) -> str:
     """Return retrieved context as plain text (no JSON), ready to pass to Gemini.
 
@@ -76,6 +268,9 @@ def query_rag(
     *,
     model_output: Dict[str, Any],
     k: int = 10,
+    table: Optional[DefectRetrievalTable] = None,
+    per_prediction: bool = True,
+    where: Optional[Dict[str, Any]] = None,
 ) -> str:
     """Main entry point: ML output -> retrieval -> plain text context.
 
@@ -85,11 +280,34 @@ def query_rag(
     3) store.similarity_search(query, k)
     4) format_retrieved_context(...) => plain text for Gemini prompt assembly
 
+    If a `DefectRetrievalTable` is given, steps 2-3 become a lookup of the
+    precomputed chunks for the predicted class (falling back to a live search
+    for labels the table does not cover).
+
+    When top_predictions names labels besides the primary defect, context is
+    retrieved for every label with one batched store call (see
+    `retrieve_per_prediction`) and merged. A lone label keeps the single-query
+    path above. Pass `per_prediction=False` to search for the primary defect only.
+
+    `where` restricts retrieval to chunks whose metadata matches it (e.g.
+    `{"source": "sop.pdf"}`); the store applies it before ranking.
+
+    On a `PartitionedVectorStore`, only the partitions of the predicted class
+    (plus the shared `general` one) are searched.
+
     We intentionally return only context. Another layer (outside RAG) can:
     - combine this context with the raw ML output
     - call Gemini to reason and decide actions
     """
 
-    query = build_query_from_ml_output(model_output)
-    retrieved = store.similarity_search(query, k=k)
+    if per_prediction and len(_prediction_labels(model_output)) > 1:
+        return format_retrieved_context(
+            retrieve_per_prediction(store, model_output=model_output, k=k, table=table, where=where)
+        )
+
+    retrieved = table.lookup(model_output, k=k) if table is not None and not where else None
+    if retrieved is None:
+        query = build_query_from_ml_output(model_output)
+        scope = search_scope(store, model_output.get("primary_defect"))
+        retrieved = store.similarity_search(query, k=k, where=where, **scope)
     return format_retrieved_context(retrieved)
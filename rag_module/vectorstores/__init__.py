@@ -1,14 +1,50 @@
+import importlib
+from typing import Any
+
 from .base import VectorStore
-from .chroma_store import ChromaVectorStore
-
-try:
-    from .faiss_store import FaissVectorStore
-except Exception:  # pragma: no cover
-    class FaissVectorStore:  # type: ignore
-        def __init__(self, *args, **kwargs):
-            raise ImportError(
-                "FaissVectorStore requires the 'faiss' module, which is not installed. "
-                "On Windows, FAISS is commonly installed via conda; otherwise switch backend to 'chroma'."
-            )
-
-__all__ = ["VectorStore", "FaissVectorStore", "ChromaVectorStore"]
+from .numpy_store import NumpyVectorStore
+from .partitioned import PartitionedVectorStore
+from .sparse_store import SparseVectorStore
+
+# chromadb (~0.9 s) and faiss are only imported when their store class is first used.
+_OPTIONAL_STORES = {
+    "ChromaVectorStore": (
+        ".chroma_store",
+        "ChromaVectorStore requires the 'chromadb' module, which is not installed. "
+        "Use NumpyVectorStore or SparseVectorStore for a dependency-free backend.",
+    ),
+    "FaissVectorStore": (
+        ".faiss_store",
+        "FaissVectorStore requires the 'faiss' module, which is not installed. "
+        "On Windows, FAISS is commonly installed via conda; otherwise switch backend to 'chroma'.",
+    ),
+}
+
+
+def _unavailable(name: str, message: str) -> type:
+    def __init__(self, *args, **kwargs):
+        raise ImportError(message)
+
+    return type(name, (), {"__init__": __init__})
+
+
+def __getattr__(name: str) -> Any:
+    if name not in _OPTIONAL_STORES:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    module_name, message = _OPTIONAL_STORES[name]
+    try:
+        store_cls = getattr(importlib.import_module(module_name, __name__), name)
+    except Exception:  # pragma: no cover
+        store_cls = _unavailable(name, message)
+    globals()[name] = store_cls
+    return store_cls
+
+
+__all__ = [
+    "VectorStore",
+    "FaissVectorStore",
+    "ChromaVectorStore",
+    "SparseVectorStore",
+    "NumpyVectorStore",
+    "PartitionedVectorStore",
+]
@@ -3,6 +3,8 @@ from __future__ import annotations
 from abc import ABC, abstractmethod
 from typing import Any, Dict, List, Optional
 
+import numpy as np
+
 from ..types import RetrievedChunk
 
 
@@ -16,12 +18,55 @@ class VectorStore(ABC):
     Not allowed here:
     - making operational decisions (clean/isolate/replace)
     - calling Gemini / any LLM
+
+    Search methods take an optional metadata filter `where` (Chroma's syntax, see
+    `filters.py`); backends apply it before ranking, so results are the top-k
+    among matching chunks rather than a post-filtered top-k.
     """
 
+    # Bumped on every write so derived caches (e.g. precomputed retrieval tables)
+    # can tell that their results are stale.
+    revision: int = 0
+
+    def _bump_revision(self) -> None:
+        self.revision = self.revision + 1
+
     @abstractmethod
     def add_texts(self, texts: List[str], metadatas: Optional[List[Dict[str, Any]]] = None) -> None:
         raise NotImplementedError
 
     @abstractmethod
-    def similarity_search(self, query: str, *, k: int) -> List[RetrievedChunk]:
+    def similarity_search(
+        self, query: str, *, k: int, where: Optional[Dict[str, Any]] = None
+    ) -> List[RetrievedChunk]:
+        raise NotImplementedError
+
+    def similarity_search_batch(
+        self, queries: List[str], *, k: int, where: Optional[Dict[str, Any]] = None
+    ) -> List[List[RetrievedChunk]]:
+        """Top-k chunks for each query, in query order.
+
+        Backends override this with a single native multi-query call; the default
+        simply loops over `similarity_search`.
+        """
+        return [self.similarity_search(q, k=k, where=where) for q in queries]
+
+    @abstractmethod
+    def search_by_vector(
+        self, vector: np.ndarray, *, k: int, where: Optional[Dict[str, Any]] = None
+    ) -> List[RetrievedChunk]:
+        """Search with an already computed (normalized) query embedding."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def count(self) -> int:
+        """Number of stored chunks."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete(self, *, where: Dict[str, Any]) -> int:
+        """Remove every chunk whose metadata matches `where`.
+
+        Returns the number of chunks removed.
+        """
         raise NotImplementedError
@@ -1,14 +1,28 @@
 from __future__ import annotations
 
+import hashlib
+import json
 import os
-import uuid
-from typing import Any, Dict, List, Optional
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Set
 
 import chromadb
+import numpy as np
 
 from ..embeddings import EmbeddingModel
 from ..types import RetrievedChunk
 from .base import VectorStore
+from .filters import to_chroma_where
+
+_CHUNK_ID_RE = re.compile(r"[0-9a-f]{64}")
+
+
+def chunk_id(text: str, metadata: Dict[str, Any]) -> str:
+    """Deterministic id: sha256 of the text and its (key-sorted) metadata."""
+
+    payload = json.dumps({"text": text, "metadata": metadata}, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
 
 
 class ChromaVectorStore(VectorStore):
@@ -17,6 +31,14 @@ class ChromaVectorStore(VectorStore):
     Notes:
     - We pass our own embeddings to keep behavior consistent with FAISS.
     - Requires a persistent directory and a collection name.
+    - Ids are content hashes and writes are upserts, so re-ingesting the same chunks
+      replaces them instead of duplicating the corpus. Collections written before that
+      hold random (uuid4) ids; the first write for a `source` deletes that source's
+      rows with such ids, so re-ingesting after the upgrade does not store every chunk
+      twice. Rows without a `source` are left alone.
+    - Writes are split into batches of at most the client's max batch size (or
+      `max_batch_size`, if smaller); with `writer_threads > 1` batches are embedded
+      and upserted concurrently.
     """
 
     def __init__(
@@ -25,15 +47,42 @@ class ChromaVectorStore(VectorStore):
         persist_dir: str,
         collection_name: str = "solar_panel_knowledge",
         embedding_model: Optional[EmbeddingModel] = None,
+        max_batch_size: Optional[int] = None,
+        writer_threads: int = 0,
     ):
         self.persist_dir = persist_dir
         self.collection_name = collection_name
         self.embedding_model = embedding_model or EmbeddingModel()
+        self.writer_threads = int(writer_threads)
 
         os.makedirs(self.persist_dir, exist_ok=True)
         self._client = chromadb.PersistentClient(path=self.persist_dir)
         self._collection = self._client.get_or_create_collection(name=self.collection_name)
 
+        client_max = self._client_max_batch_size()
+        self.max_batch_size = min(int(max_batch_size), client_max) if max_batch_size else client_max
+        # Sources whose legacy-id rows have already been removed by this instance.
+        self._migrated_sources: Set[Any] = set()
+
+    def _client_max_batch_size(self) -> int:
+        get_max = getattr(self._client, "get_max_batch_size", None)
+        if callable(get_max):
+            return int(get_max())
+        # Older clients expose it as an attribute; fall back to Chroma's long-standing SQLite default.
+        return int(getattr(self._client, "max_batch_size", 5461))
+
+    def _drop_legacy_rows(self, metadatas: List[Dict[str, Any]]) -> None:
+        """Delete rows with non-content-hash ids for every source not yet seen by this instance."""
+
+        for source in {m.get("source") for m in metadatas} - self._migrated_sources:
+            if source is None:
+                continue
+            ids = self._collection.get(where={"source": source}, include=[])["ids"]
+            legacy = [i for i in ids if not _CHUNK_ID_RE.fullmatch(i)]
+            if legacy:
+                self._collection.delete(ids=legacy)
+            self._migrated_sources.add(source)
+
     def add_texts(self, texts: List[str], metadatas: Optional[List[Dict[str, Any]]] = None) -> None:
         if not texts:
             return
@@ -42,31 +91,90 @@ class ChromaVectorStore(VectorStore):
         if len(metadatas) != len(texts):
             raise ValueError("metadatas length must match texts length")
 
-        embeddings = self.embedding_model.embed_texts(texts).tolist()
-        ids = [str(uuid.uuid4()) for _ in texts]
+        # Chroma rejects duplicate ids within one call; the last occurrence wins, as an upsert would.
+        by_id: Dict[str, int] = {}
+        for i, (t, m) in enumerate(zip(texts, metadatas)):
+            by_id[chunk_id(t, m)] = i
+        ids = list(by_id)
+        rows = list(by_id.values())
+        self._drop_legacy_rows(metadatas)
 
-        self._collection.add(
-            ids=ids,
-            documents=texts,
-            metadatas=metadatas,
-            embeddings=embeddings,
-        )
+        batches = [
+            (ids[start : start + self.max_batch_size], rows[start : start + self.max_batch_size])
+            for start in range(0, len(ids), self.max_batch_size)
+        ]
 
-    def similarity_search(self, query: str, *, k: int) -> List[RetrievedChunk]:
-        q_emb = self.embedding_model.embed_texts([query]).tolist()[0]
+        def upsert(batch_ids: List[str], batch_rows: List[int]) -> None:
+            batch_texts = [texts[i] for i in batch_rows]
+            self._collection.upsert(
+                ids=batch_ids,
+                documents=batch_texts,
+                metadatas=[metadatas[i] for i in batch_rows],
+                embeddings=self.embedding_model.embed_texts(batch_texts).tolist(),
+            )
+
+        if self.writer_threads > 1 and len(batches) > 1:
+            with ThreadPoolExecutor(max_workers=min(self.writer_threads, len(batches))) as pool:
+                for future in [pool.submit(upsert, *batch) for batch in batches]:
+                    future.result()
+        else:
+            for batch in batches:
+                upsert(*batch)
+        self._bump_revision()
+
+    def similarity_search(
+        self, query: str, *, k: int, where: Optional[Dict[str, Any]] = None
+    ) -> List[RetrievedChunk]:
+        q_emb = self.embedding_model.embed_queries([query])[0]
+        return self.search_by_vector(q_emb, k=k, where=where)
+
+    def search_by_vector(
+        self, vector: np.ndarray, *, k: int, where: Optional[Dict[str, Any]] = None
+    ) -> List[RetrievedChunk]:
+        return self._query_embeddings(np.asarray(vector, dtype="float32").reshape(1, -1), k=k, where=where)[0]
+
+    def similarity_search_batch(
+        self, queries: List[str], *, k: int, where: Optional[Dict[str, Any]] = None
+    ) -> List[List[RetrievedChunk]]:
+        if not queries:
+            return []
+        # One collection.query call with every query embedding.
+        return self._query_embeddings(self.embedding_model.embed_queries(queries), k=k, where=where)
+
+    def count(self) -> int:
+        return int(self._collection.count())
+
+    def delete(self, *, where: Dict[str, Any]) -> int:
+        if not where:
+            raise ValueError("where must name at least one metadata key")
+        ids = self._collection.get(where=to_chroma_where(where), include=[])["ids"]
+        if ids:
+            self._collection.delete(ids=ids)
+            self._bump_revision()
+        return len(ids)
+
+    def _query_embeddings(
+        self, vectors: np.ndarray, *, k: int, where: Optional[Dict[str, Any]] = None
+    ) -> List[List[RetrievedChunk]]:
+        # The filter is evaluated inside Chroma, before the nearest-neighbour ranking.
         res = self._collection.query(
-            query_embeddings=[q_emb],
+            query_embeddings=np.asarray(vectors, dtype="float32").tolist(),
             n_results=k,
+            where=to_chroma_where(where) if where else None,
             include=["documents", "metadatas", "distances"],
         )
 
         # Chroma returns distances (smaller = closer). We convert to a score-like value.
-        docs = res.get("documents", [[]])[0]
-        metas = res.get("metadatas", [[]])[0]
-        dists = res.get("distances", [[]])[0]
-
-        out: List[RetrievedChunk] = []
-        for doc, meta, dist in zip(docs, metas, dists):
-            score = float(1.0 / (1.0 + float(dist)))
-            out.append(RetrievedChunk(text=doc, score=score, metadata=meta or {}))
-        return out
+        n = len(vectors)
+        all_docs = res.get("documents") or [[] for _ in range(n)]
+        all_metas = res.get("metadatas") or [[] for _ in range(n)]
+        all_dists = res.get("distances") or [[] for _ in range(n)]
+
+        results: List[List[RetrievedChunk]] = []
+        for docs, metas, dists in zip(all_docs, all_metas, all_dists):
+            out: List[RetrievedChunk] = []
+            for doc, meta, dist in zip(docs, metas, dists):
+                score = float(1.0 / (1.0 + float(dist)))
+                out.append(RetrievedChunk(text=doc, score=score, metadata=meta or {}))
+            results.append(out)
+        return results
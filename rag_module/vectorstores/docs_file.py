@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import json
+import os
+from typing import Any, Dict, List, Tuple
+
+# docs.jsonl helpers shared by the file-backed stores (one JSON object per line, appended).
+#
+# On-disk protocol of the file-backed stores (faiss, sparse, numpy):
+# - Appends write and fsync a chunk's vector data (log record or matrix rows) before
+#   its docs.jsonl line. docs.jsonl is authoritative: on load, vector rows without a
+#   doc are dropped, and so are docs without vectors.
+# - A crash mid-append leaves a torn tail: a last line without a newline or with bad
+#   JSON, or a log record that is short or fails its crc32. Load stops reading there
+#   and `truncate_torn_tail` cuts it off, so the next append starts on a clean boundary.
+# - A rewrite that replaces one file writes a temp file, fsyncs it and os.replace()s it.
+#   A rewrite that replaces several files writes all of them as fsynced temp files,
+#   then creates an fsynced `rewrite.pending` marker, then renames them into place. A
+#   load that finds the marker finishes the renames. Without the marker it deletes the
+#   temp files. Either way, the files never come from different writes.
+# - A memory-mapped file is unmapped before it is replaced, because Windows cannot
+#   replace a mapped file.
+
+
+def fsync_file(f) -> None:
+    """Flush `f` and fsync it, so a later rename or marker never lands before its data."""
+
+    f.flush()
+    os.fsync(f.fileno())
+
+
+def create_empty(path: str) -> None:
+    """Create (or truncate) `path` as an empty file and fsync it."""
+
+    with open(path, "wb") as f:
+        fsync_file(f)
+
+
+def read_docs(path: str) -> Tuple[List[Dict[str, Any]], int]:
+    """Parse docs.jsonl, returning the docs and the byte length of the valid prefix.
+
+    Reading stops at the first line without a trailing newline or with invalid
+    JSON: the torn tail an interrupted append leaves behind.
+    """
+
+    docs: List[Dict[str, Any]] = []
+    valid_len = 0
+    if not os.path.exists(path):
+        return docs, valid_len
+    with open(path, "rb") as f:
+        for raw in f:
+            if not raw.endswith(b"\n"):
+                break
+            line = raw.strip()
+            if line:
+                try:
+                    docs.append(json.loads(line.decode("utf-8")))
+                except ValueError:
+                    break
+            valid_len += len(raw)
+    return docs, valid_len
+
+
+def truncate_torn_tail(path: str, valid_len: int) -> None:
+    """Cut `path` back to `valid_len` bytes so later appends start on a clean line or record."""
+
+    if os.path.exists(path) and os.path.getsize(path) > valid_len:
+        with open(path, "r+b") as f:
+            f.truncate(valid_len)
+
+
+def write_docs(path: str, docs: List[Dict[str, Any]]) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        for doc in docs:
+            f.write(json.dumps(doc, ensure_ascii=False) + "\n")
+        fsync_file(f)
@@ -1,9 +1,13 @@
 from __future__ import annotations
 
+import itertools
 import json
+import mmap
 import os
-from dataclasses import asdict
-from typing import Any, Dict, List, Optional
+import struct
+import zlib
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 
 import faiss
 import numpy as np
@@ -11,52 +15,600 @@ import numpy as np
 from ..embeddings import EmbeddingModel
 from ..types import RetrievedChunk
 from .base import VectorStore
+from .docs_file import fsync_file, read_docs, truncate_torn_tail
+from .filters import MISSING, compare, matches_where, split_condition
+
+# index.log record header: magic, row count, dim, crc32(payload); the payload is the
+# row ids (int64) followed by the vectors (float32).
+_LOG_MAGIC = b"FIDS"
+_LOG_HEADER = struct.Struct("<4sIII")
+
+
+def _encode_doc(doc: Dict[str, Any]) -> bytes:
+    return (json.dumps(doc, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+class _LazyDocs:
+    """Sequence view over docs.jsonl that decodes a line only when it is accessed.
+
+    `starts` holds the byte offset of every persisted line (from docs.idx) and `end`
+    the end of the last one; docs added after loading are kept in memory.
+
+    Lines are read through a read-only memory map. The file descriptor is closed as
+    soon as the map exists, so replaced or reopened stores hold no open files, and
+    concurrent reads need no seek or lock. The map is released by `close()` (before
+    docs.jsonl is replaced) or when the view is garbage-collected.
+    """
+
+    def __init__(self, path: str, starts: np.ndarray, end: int):
+        self._path = path
+        self._bounds = np.append(starts.astype(np.int64), np.int64(end))
+        self._extra: List[Dict[str, Any]] = []
+        self._map: Optional[mmap.mmap] = None
+        if len(starts):
+            with open(path, "rb") as f:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def close(self) -> None:
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+    def __len__(self) -> int:
+        return len(self._bounds) - 1 + len(self._extra)
+
+    def __getitem__(self, i: int) -> Dict[str, Any]:
+        n_disk = len(self._bounds) - 1
+        if i < 0:
+            i += len(self)
+        if i >= n_disk:
+            return self._extra[i - n_disk]
+        start, stop = int(self._bounds[i]), int(self._bounds[i + 1])
+        return json.loads(self._map[start:stop].decode("utf-8"))
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def extend(self, docs: Iterable[Dict[str, Any]]) -> None:
+        self._extra.extend(docs)
 
 
 class FaissVectorStore(VectorStore):
     """FAISS store using cosine similarity (via inner product on normalized vectors).
 
     Persistence layout:
-    - <persist_dir>/index.faiss
-    - <persist_dir>/docs.jsonl   (one JSON per chunk: {"text": ..., "metadata": ...})
+    - <persist_dir>/index.faiss (snapshot of the index, replaced atomically on compaction)
+    - <persist_dir>/index.log   (append-only vector records added since the snapshot)
+    - <persist_dir>/docs.jsonl  (append-only, one JSON per chunk: {"id": ..., "text": ..., "metadata": ...})
+    - <persist_dir>/docs.idx    (append-only little-endian uint64 byte offset of each docs.jsonl line)
+    - <persist_dir>/docs.ids    (append-only little-endian int64 id of each docs.jsonl line)
+    - <persist_dir>/layout.json (index type and its parameters, so reloads use the same index)
+
+    Every chunk has a stable int64 id, assigned in increasing order. The index is an
+    IndexIDMap2, so search results carry ids rather than positions, and chunks can be
+    deleted (`delete(where=...)`) without renumbering the rest.
+
+    Writes are append-only: each flush appends the new vectors to index.log and the new
+    docs to docs.jsonl, so an ingestion batch costs O(batch) I/O instead of O(corpus).
+    Once the log holds `compact_every` rows it is folded into a fresh snapshot.
+    Deletes rewrite docs.jsonl and compact.
+
+    Metadata filters (`where=`) are resolved to ids through an in-memory index of
+    metadata key -> value -> ids (built on first use) and applied as a FAISS
+    IDSelector, i.e. before ranking. Small candidate sets are scored exactly.
+
+    Crash safety follows the protocol in docs_file.py. Vectors are matched to docs by
+    id, so vectors whose id has no doc are dropped from the index, and docs whose id has
+    no vector are dropped from docs.jsonl.
+
+    With `lazy=True` the snapshot is opened with FAISS mmap (falling back to a normal read
+    if the index type does not support it) and docs are decoded on demand through the
+    docs.idx offset table, so startup cost and resident memory no longer scale with the
+    number of chunks. docs.idx is validated against docs.jsonl and rebuilt when stale.
+
+    Index types (`index_type`):
+    - "flat":     exact IndexFlatIP
+    - "ivf_flat": IndexIVFFlat, searched with `nprobe` lists
+    - "ivf_pq":   IndexIVFPQ (compressed codes), searched with `nprobe` lists
+    - "hnsw":     IndexHNSWFlat, searched with `ef_search`
+    - "auto":     flat for small corpora, then ivf_flat / ivf_pq as the corpus grows
+
+    IVF indexes need training; until enough vectors exist the store stays on a flat
+    index and trains on the full set once it gets there (typically the first large batch).
     """
 
-    def __init__(self, *, persist_dir: str, embedding_model: Optional[EmbeddingModel] = None):
+    INDEX_TYPES = ("auto", "flat", "ivf_flat", "ivf_pq", "hnsw")
+
+    # Corpus sizes at which "auto" moves to the next index type.
+    AUTO_IVF_FLAT_MIN_ROWS = 20_000
+    AUTO_IVF_PQ_MIN_ROWS = 500_000
+
+    # Filtered searches matching at most this many chunks skip the ANN index and score them exactly.
+    EXACT_FILTER_MAX_IDS = 4096
+
+    def __init__(
+        self,
+        *,
+        persist_dir: str,
+        embedding_model: Optional[EmbeddingModel] = None,
+        compact_every: int = 10_000,
+        lazy: bool = False,
+        index_type: str = "auto",
+        nlist: Optional[int] = None,
+        pq_m: int = 48,
+        hnsw_m: int = 32,
+        nprobe: int = 16,
+        ef_search: int = 64,
+    ):
+        if index_type not in self.INDEX_TYPES:
+            raise ValueError(f"index_type must be one of {self.INDEX_TYPES}, got: {index_type}")
+
         self.persist_dir = persist_dir
         self.embedding_model = embedding_model or EmbeddingModel()
+        self.compact_every = int(compact_every)
+        self.lazy = bool(lazy)
+        self.index_type = index_type
+        self.nlist = nlist
+        self.pq_m = int(pq_m)
+        self.hnsw_m = int(hnsw_m)
+        self.nprobe = int(nprobe)
+        self.ef_search = int(ef_search)
 
         os.makedirs(self.persist_dir, exist_ok=True)
 
         self._index_path = os.path.join(self.persist_dir, "index.faiss")
+        self._log_path = os.path.join(self.persist_dir, "index.log")
         self._docs_path = os.path.join(self.persist_dir, "docs.jsonl")
+        self._offsets_path = os.path.join(self.persist_dir, "docs.idx")
+        self._ids_path = os.path.join(self.persist_dir, "docs.ids")
+        self._layout_path = os.path.join(self.persist_dir, "layout.json")
 
-        self._docs: List[Dict[str, Any]] = []
+        self._docs: Any = []
+        # Id of each doc, by position; increasing, so id -> position is a binary search.
+        self._ids = np.zeros(0, dtype=np.int64)
+        self._next_id = 0
         self._index: Optional[faiss.Index] = None
+        # True while self._index is backed by a FAISS mmap of index.faiss.
+        self._index_mmapped = False
+
+        # Rows added in memory but not yet written to disk.
+        self._pending_vectors: List[np.ndarray] = []
+        self._pending_ids: List[np.ndarray] = []
+        self._pending_docs: List[Dict[str, Any]] = []
+        self._log_rows = 0
+        self._batch_depth = 0
+        # metadata key -> value -> ids; built lazily by the first filtered search.
+        self._metadata_index: Optional[Dict[str, Dict[Any, List[int]]]] = None
+        # metadata key -> (id, value) for values that cannot be dict keys (lists, dicts).
+        self._unhashable_metadata: Dict[str, List[Tuple[int, Any]]] = {}
 
         self._load_if_exists()
 
+    # ---- loading ----
+
+    def _scan_line_starts(self) -> Tuple[np.ndarray, int]:
+        """Offsets of every complete non-empty line in docs.jsonl (no JSON decoding)."""
+
+        starts: List[np.ndarray] = []
+        line_start = 0
+        pos = 0
+        with open(self._docs_path, "rb") as f:
+            while True:
+                block = f.read(1 << 24)
+                if not block:
+                    break
+                ends = np.flatnonzero(np.frombuffer(block, dtype=np.uint8) == 0x0A) + pos
+                if len(ends):
+                    line_starts = np.concatenate([[line_start], ends[:-1] + 1])
+                    starts.append(line_starts[ends > line_starts])
+                    line_start = int(ends[-1]) + 1
+                pos += len(block)
+        all_starts = np.concatenate(starts) if starts else np.zeros(0, dtype=np.int64)
+        return all_starts.astype(np.int64), line_start
+
+    def _lazy_docs(self) -> Tuple[_LazyDocs, np.ndarray, int]:
+        size = os.path.getsize(self._docs_path) if os.path.exists(self._docs_path) else 0
+        starts: Optional[np.ndarray] = None
+        if os.path.exists(self._offsets_path):
+            starts = np.fromfile(self._offsets_path, dtype="<u8").astype(np.int64)
+            valid = (len(starts) == 0 and size == 0) or (
+                len(starts) > 0 and starts[0] == 0 and bool(np.all(np.diff(starts) > 0)) and starts[-1] < size
+            )
+            if valid and len(starts):
+                with open(self._docs_path, "rb") as f:
+                    f.seek(int(starts[-1]))
+                    tail = f.read(size - int(starts[-1]))
+                valid = tail.endswith(b"\n") and tail.count(b"\n") == 1
+            if not valid:
+                starts = None
+        ids: Optional[np.ndarray] = None
+        if starts is not None and os.path.exists(self._ids_path):
+            ids = np.fromfile(self._ids_path, dtype="<i8").astype(np.int64)
+            if len(ids) != len(starts) or not bool(np.all(np.diff(ids) > 0)):
+                ids = None
+        if starts is None or ids is None:
+            starts, end = self._scan_line_starts()
+            scan = _LazyDocs(self._docs_path, starts, end)
+            try:
+                ids = self._doc_ids(scan)
+            finally:
+                scan.close()
+            self._write_offsets(starts, ids)
+
+        end = size
+        if len(starts):
+            with open(self._docs_path, "rb") as f:
+                f.seek(int(starts[-1]))
+                end = int(starts[-1]) + len(f.readline())
+        return _LazyDocs(self._docs_path, starts, end), ids, (end if len(starts) else 0)
+
+    @staticmethod
+    def _doc_ids(docs: Iterable[Dict[str, Any]]) -> np.ndarray:
+        # Docs written before ids existed are numbered by position, which is what
+        # their (positional) vectors used.
+        return np.asarray([int(doc.get("id", i)) for i, doc in enumerate(docs)], dtype=np.int64)
+
+    def _write_offsets(self, starts: np.ndarray, ids: np.ndarray) -> None:
+        for path, arr, dtype in ((self._offsets_path, starts, "<u8"), (self._ids_path, ids, "<i8")):
+            tmp_path = path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(np.asarray(arr, dtype=dtype).tobytes())
+                fsync_file(f)
+            os.replace(tmp_path, path)
+
+    def _load_snapshot(self, *, mmap: bool) -> bool:
+        """Read index.faiss; returns True if it predates ids and had to be converted."""
+
+        index: Optional[faiss.Index] = None
+        self._index_mmapped = False
+        if mmap:
+            try:
+                index = faiss.read_index(self._index_path, faiss.IO_FLAG_MMAP)
+                self._index_mmapped = True
+            except RuntimeError:
+                pass
+        if index is None:
+            index = faiss.read_index(self._index_path)
+        if isinstance(index, faiss.IndexIDMap2):
+            self._index = index
+            return False
+
+        # Snapshots written before ids existed hold positional rows; give them ids 0..n-1.
+        n = int(index.ntotal)
+        ivf = faiss.try_extract_index_ivf(index)
+        if ivf is not None:
+            ivf.make_direct_map()
+        self._index = index
+        kind = self.active_index_type
+        if n:
+            self._rebuild_index(kind, index.reconstruct_n(0, n), np.arange(n, dtype=np.int64))
+        else:
+            self._index = faiss.IndexIDMap2(self._new_index(kind, index.d, 0))
+        return True
+
+    def _read_log_record(self, f) -> Optional[Tuple[np.ndarray, np.ndarray, int]]:
+        """Next (ids, vectors, byte length) from index.log, or None at a torn/invalid tail."""
+
+        header = f.read(_LOG_HEADER.size)
+        if len(header) < _LOG_HEADER.size:
+            return None
+        magic, n, dim, crc = _LOG_HEADER.unpack(header)
+        if magic != _LOG_MAGIC:
+            return None
+
+        id_bytes = n * 8
+        payload = f.read(id_bytes + n * dim * 4)
+        if dim != self._index.d or len(payload) != id_bytes + n * dim * 4 or zlib.crc32(payload) != crc:
+            return None
+        ids = np.frombuffer(payload[:id_bytes], dtype="<i8").astype(np.int64)
+        vectors = np.frombuffer(payload[id_bytes:], dtype="float32").reshape(n, dim)
+        return ids, vectors, len(header) + len(payload)
+
+    def _replay_log(self) -> int:
+        """Apply index.log records on top of the snapshot; returns the valid byte length."""
+
+        valid_len = 0
+        if self._index is None or not os.path.exists(self._log_path):
+            return valid_len
+        present: Optional[np.ndarray] = None
+        with open(self._log_path, "rb") as f:
+            while True:
+                record = self._read_log_record(f)
+                if record is None:
+                    break
+                ids, vectors, length = record
+                if present is None:
+                    present = self._index_ids()
+                # Records already folded into the snapshot (crash during compaction) are skipped.
+                new = ~np.isin(ids, present)
+                if new.any():
+                    self._index.add_with_ids(np.ascontiguousarray(vectors[new]), ids[new])
+                    present = np.concatenate([present, ids[new]])
+                self._log_rows += len(ids)
+                valid_len += length
+        return valid_len
+
+    def _load_layout(self) -> None:
+        if not os.path.exists(self._layout_path):
+            return
+        with open(self._layout_path, "r", encoding="utf-8") as f:
+            layout = json.load(f)
+        self.index_type = layout.get("index_type", self.index_type)
+        self.nlist = layout.get("nlist", self.nlist)
+        self.pq_m = int(layout.get("pq_m", self.pq_m))
+        self.hnsw_m = int(layout.get("hnsw_m", self.hnsw_m))
+
+    def _write_layout(self) -> None:
+        layout = {
+            "index_type": self.index_type,
+            "active_index_type": self.active_index_type,
+            "nlist": self.nlist,
+            "pq_m": self.pq_m,
+            "hnsw_m": self.hnsw_m,
+        }
+        tmp_path = self._layout_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(layout, f, indent=2)
+            fsync_file(f)
+        os.replace(tmp_path, self._layout_path)
+
     def _load_if_exists(self) -> None:
-        if os.path.exists(self._index_path) and os.path.exists(self._docs_path):
-            self._index = faiss.read_index(self._index_path)
-            self._docs = []
-            with open(self._docs_path, "r", encoding="utf-8") as f:
-                for line in f:
-                    line = line.strip()
-                    if line:
-                        self._docs.append(json.loads(line))
-
-    def _ensure_index(self, dim: int) -> None:
+        self._load_layout()
+        if not os.path.exists(self._index_path):
+            return
+
+        converted = self._load_snapshot(mmap=self.lazy)
+        try:
+            log_len = self._replay_log()
+        except RuntimeError:
+            # Some mmapped index types are read-only; replay onto an in-memory copy instead.
+            self._log_rows = 0
+            converted = self._load_snapshot(mmap=False)
+            log_len = self._replay_log()
+        if self.lazy:
+            self._docs, self._ids, docs_len = self._lazy_docs()
+        else:
+            self._docs, docs_len = read_docs(self._docs_path)
+            self._ids = self._doc_ids(self._docs)
+
+        # Drop torn tails so later appends start on a clean boundary.
+        truncate_torn_tail(self._log_path, log_len)
+        truncate_torn_tail(self._docs_path, docs_len)
+
+        # docs.jsonl decides what exists: drop vectors without a doc and docs without a vector.
+        index_ids = self._index_ids()
+        stray = np.setdiff1d(index_ids, self._ids)
+        if len(stray):
+            self._remove_ids(stray)
+        has_vector = np.isin(self._ids, index_ids)
+        if not has_vector.all():
+            self._set_docs(list(itertools.compress(self._docs, has_vector.tolist())))
+            self._ids = self._ids[has_vector]
+            self._rewrite_docs()
+
+        self._next_id = int(max(index_ids.max(initial=-1), self._ids.max(initial=-1))) + 1
+        if converted or len(stray) or self._log_rows >= self.compact_every:
+            self.compact()
+
+    # ---- writing ----
+
+    def _inner_index(self) -> faiss.Index:
+        if isinstance(self._index, faiss.IndexIDMap):
+            return faiss.downcast_index(self._index.index)
+        return self._index
+
+    def _index_ids(self) -> np.ndarray:
+        return faiss.vector_to_array(self._index.id_map).astype(np.int64)
+
+    @property
+    def active_index_type(self) -> str:
+        if self._index is None:
+            return "flat"
+        inner = self._inner_index()
+        if isinstance(inner, faiss.IndexHNSW):
+            return "hnsw"
+        ivf = faiss.try_extract_index_ivf(inner)
+        if ivf is None:
+            return "flat"
+        return "ivf_pq" if isinstance(faiss.downcast_index(ivf), faiss.IndexIVFPQ) else "ivf_flat"
+
+    def _nlist_for(self, n: int) -> int:
+        if self.nlist:
+            return int(self.nlist)
+        # ~sqrt(n) lists keeps the 39-points-per-centroid training rule satisfiable early on.
+        return int(min(65536, max(16, int(np.sqrt(max(n, 1))))))
+
+    def _pq_m_for(self, dim: int) -> int:
+        # PQ needs dim divisible by the number of sub-quantizers.
+        return max(m for m in range(1, min(self.pq_m, dim) + 1) if dim % m == 0)
+
+    def _min_train_rows(self, kind: str, n: int) -> int:
+        if kind == "ivf_flat":
+            return 39 * self._nlist_for(n)
+        if kind == "ivf_pq":
+            return 39 * max(self._nlist_for(n), 256)
+        return 0
+
+    def _desired_index_type(self, n: int) -> str:
+        kind = self.index_type
+        if kind == "auto":
+            if n >= self.AUTO_IVF_PQ_MIN_ROWS:
+                kind = "ivf_pq"
+            elif n >= self.AUTO_IVF_FLAT_MIN_ROWS:
+                kind = "ivf_flat"
+            else:
+                kind = "flat"
+        # Not enough vectors to train yet: stay exact until there are.
+        if n < self._min_train_rows(kind, n):
+            return "flat"
+        return kind
+
+    def _new_index(self, kind: str, dim: int, n: int) -> faiss.Index:
+        # Inner product everywhere; with normalized embeddings, this equals cosine similarity.
+        if kind == "hnsw":
+            return faiss.IndexHNSWFlat(dim, self.hnsw_m, faiss.METRIC_INNER_PRODUCT)
+        if kind in ("ivf_flat", "ivf_pq"):
+            nlist = self._nlist_for(n)
+            quantizer = faiss.IndexFlatIP(dim)
+            if kind == "ivf_pq":
+                return faiss.IndexIVFPQ(quantizer, dim, nlist, self._pq_m_for(dim), 8, faiss.METRIC_INNER_PRODUCT)
+            return faiss.IndexIVFFlat(quantizer, dim, nlist, faiss.METRIC_INNER_PRODUCT)
+        return faiss.IndexFlatIP(dim)
+
+    def _all_vectors(self) -> Tuple[np.ndarray, np.ndarray]:
+        """(ids, vectors) of everything in the index, in internal order."""
+
+        inner = self._inner_index()
+        ivf = faiss.try_extract_index_ivf(inner)
+        if ivf is not None:
+            ivf.make_direct_map()
+        return self._index_ids(), inner.reconstruct_n(0, int(inner.ntotal))
+
+    def _rebuild_index(self, kind: str, vectors: np.ndarray, ids: np.ndarray) -> None:
+        inner = self._new_index(kind, vectors.shape[1], len(vectors))
+        if not inner.is_trained:
+            inner.train(vectors)
+        index = faiss.IndexIDMap2(inner)
+        index.add_with_ids(vectors, ids)
+        self._index = index
+        self._index_mmapped = False
+
+    def _remove_ids(self, ids: np.ndarray) -> None:
+        if self.active_index_type == "flat":
+            self._index.remove_ids(faiss.IDSelectorBatch(np.asarray(ids, dtype=np.int64)))
+            return
+        # HNSW cannot remove vectors, and IVF does not renumber on removal, which breaks
+        # IndexIDMap2. Re-add the survivors to an emptied copy (keeps any trained quantizer).
+        all_ids, vectors = self._all_vectors()
+        keep = ~np.isin(all_ids, ids)
+        inner = faiss.clone_index(self._inner_index())
+        inner.reset()
+        index = faiss.IndexIDMap2(inner)
+        index.add_with_ids(np.ascontiguousarray(vectors[keep]), all_ids[keep])
+        self._index = index
+        self._index_mmapped = False
+
+    def _maybe_migrate(self) -> None:
+        """Switch index type once the corpus is large enough (trains on all vectors)."""
+
+        n = int(self._index.ntotal)
+        desired = self._desired_index_type(n)
+        current = self.active_index_type
+        # Never downgrade automatically, and never migrate away from the compressed tier.
+        if desired == current or current == "ivf_pq" or (current != "flat" and desired == "flat"):
+            return
+        ids, vectors = self._all_vectors()
+        self._rebuild_index(desired, vectors, ids)
+        # The log replays onto whatever snapshot exists, so write one of the new type now.
+        self.compact()
+
+    def _ensure_index(self, dim: int, n: int) -> None:
         if self._index is None:
-            # IndexFlatIP uses inner product; with normalized embeddings, this equals cosine similarity.
-            self._index = faiss.IndexFlatIP(dim)
+            self._index = faiss.IndexIDMap2(self._new_index("hnsw" if self.index_type == "hnsw" else "flat", dim, n))
+
+    def _set_docs(self, docs: Any) -> None:
+        """Swap the doc sequence, closing the memory map of a lazy one."""
+
+        if isinstance(self._docs, _LazyDocs) and self._docs is not docs:
+            self._docs.close()
+        self._docs = docs
+
+    def _rewrite_docs(self) -> None:
+        tmp_path = self._docs_path + ".tmp"
+        starts: List[int] = []
+        docs: List[Dict[str, Any]] = []
+        with open(tmp_path, "wb") as f:
+            for doc, doc_id in zip(self._docs, self._ids.tolist()):
+                doc = {**doc, "id": doc_id}
+                starts.append(f.tell())
+                f.write(_encode_doc(doc))
+                docs.append(doc)
+            fsync_file(f)
+            end = f.tell()
+        # Unmap the old file before replacing it (see docs_file.py).
+        self._set_docs(docs)
+        os.replace(tmp_path, self._docs_path)
+        offsets = np.asarray(starts, dtype=np.int64)
+        self._write_offsets(offsets, self._ids)
+        if self.lazy:
+            self._set_docs(_LazyDocs(self._docs_path, offsets, end))
+
+    def _append_docs(self, docs: List[Dict[str, Any]]) -> None:
+        starts: List[int] = []
+        with open(self._docs_path, "ab") as f:
+            f.seek(0, os.SEEK_END)
+            for doc in docs:
+                starts.append(f.tell())
+                f.write(_encode_doc(doc))
+            fsync_file(f)
+        # The offset and id tables are only caches; lazy loaders validate them and rebuild if they lag.
+        ids = [doc["id"] for doc in docs]
+        for path, values, dtype in ((self._offsets_path, starts, "<u8"), (self._ids_path, ids, "<i8")):
+            with open(path, "ab") as f:
+                f.write(np.asarray(values, dtype=dtype).tobytes())
+                fsync_file(f)
+
+    def compact(self) -> None:
+        """Fold index.log into a fresh index.faiss snapshot (atomic replace)."""
 
-    def _persist(self) -> None:
         if self._index is None:
             return
-        faiss.write_index(self._index, self._index_path)
-        with open(self._docs_path, "w", encoding="utf-8") as f:
-            for doc in self._docs:
-                f.write(json.dumps(doc, ensure_ascii=False) + "\n")
+        if self._index_mmapped:
+            # Move off the mapped snapshot before replacing it.
+            self._index = faiss.clone_index(self._index)
+            self._index_mmapped = False
+        tmp_path = self._index_path + ".tmp"
+        faiss.write_index(self._index, tmp_path)
+        with open(tmp_path, "rb") as f:
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._index_path)
+        self._write_layout()
+        # The snapshot now covers every logged row; replay skips them even if this truncate is lost.
+        with open(self._log_path, "wb") as f:
+            fsync_file(f)
+        self._log_rows = 0
+
+    def flush(self) -> None:
+        """Durably write everything added since the last flush."""
+
+        if not self._pending_docs or self._index is None:
+            return
+
+        vectors = np.concatenate(self._pending_vectors).astype("float32")
+        ids = np.concatenate(self._pending_ids).astype("<i8")
+        docs = self._pending_docs
+
+        if os.path.exists(self._index_path):
+            payload = ids.tobytes() + vectors.tobytes()
+            with open(self._log_path, "ab") as f:
+                f.write(_LOG_HEADER.pack(_LOG_MAGIC, len(docs), vectors.shape[1], zlib.crc32(payload)))
+                f.write(payload)
+                fsync_file(f)
+            self._log_rows += len(docs)
+        else:
+            self.compact()
+
+        self._append_docs(docs)
+
+        self._pending_vectors = []
+        self._pending_ids = []
+        self._pending_docs = []
+
+        if self._log_rows >= self.compact_every:
+            self.compact()
+
+    @contextmanager
+    def batch(self) -> Iterator["FaissVectorStore"]:
+        """Group many add_texts calls into a single durable write on exit."""
+
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+            if self._batch_depth == 0:
+                self.flush()
 
     def add_texts(self, texts: List[str], metadatas: Optional[List[Dict[str, Any]]] = None) -> None:
         if not texts:
@@ -67,25 +619,212 @@ class FaissVectorStore(VectorStore):
             raise ValueError("metadatas length must match texts length")
 
         vectors = self.embedding_model.embed_texts(texts)
-        self._ensure_index(vectors.shape[1])
+        self._ensure_index(vectors.shape[1], len(vectors))
+
+        ids = np.arange(self._next_id, self._next_id + len(texts), dtype=np.int64)
+        self._next_id += len(texts)
+        self._index.add_with_ids(vectors, ids)
+        self._maybe_migrate()
+        new_docs = [{"id": int(i), "text": t, "metadata": m} for i, t, m in zip(ids.tolist(), texts, metadatas)]
+        self._docs.extend(new_docs)
+        self._ids = np.concatenate([self._ids, ids])
+        if self._metadata_index is not None:
+            for doc in new_docs:
+                self._index_metadata(doc["id"], doc["metadata"])
+        self._pending_vectors.append(vectors)
+        self._pending_ids.append(ids)
+        self._pending_docs.extend(new_docs)
+
+        if self._batch_depth == 0:
+            self.flush()
+        self._bump_revision()
+
+    def count(self) -> int:
+        return len(self._docs)
+
+    def delete(self, *, where: Dict[str, Any]) -> int:
+        if not where:
+            raise ValueError("where must name at least one metadata key")
+        keep = np.array([not matches_where(doc.get("metadata") or {}, where) for doc in self._docs], dtype=bool)
+        removed = int(len(keep) - keep.sum())
+        if removed == 0:
+            return 0
+
+        # Anything still pending must reach disk before docs.jsonl is rewritten.
+        self.flush()
+        dropped = self._ids[~keep]
+        self._set_docs(list(itertools.compress(self._docs, keep.tolist())))
+        self._ids = self._ids[keep]
+        self._metadata_index = None
+        self._unhashable_metadata = {}
+        # Docs first: if we crash before compacting, the loader drops the orphaned vectors.
+        self._rewrite_docs()
+        self._remove_ids(dropped)
+        self.compact()
+        self._bump_revision()
+        return removed
+
+    # ---- search ----
+
+    def _index_metadata(self, doc_id: int, metadata: Dict[str, Any]) -> None:
+        for key, value in (metadata or {}).items():
+            try:
+                self._metadata_index.setdefault(key, {}).setdefault(value, []).append(doc_id)
+            except TypeError:
+                # Unhashable values (lists, dicts) are kept aside and compared one by one.
+                self._unhashable_metadata.setdefault(key, []).append((doc_id, value))
+
+    def _ids_matching(self, where: Dict[str, Any]) -> np.ndarray:
+        """Sorted ids of the chunks whose metadata matches `where` (see filters.py)."""
 
-        self._index.add(vectors)
-        for t, m in zip(texts, metadatas):
-            self._docs.append({"text": t, "metadata": m})
+        if self._metadata_index is None:
+            self._metadata_index = {}
+            self._unhashable_metadata = {}
+            for doc, doc_id in zip(self._docs, self._ids.tolist()):
+                self._index_metadata(doc_id, doc.get("metadata"))
 
-        self._persist()
+        result = self._ids
+        for key, condition in where.items():
+            if key == "$and":
+                ids = self._ids
+                for sub in condition:
+                    ids = np.intersect1d(ids, self._ids_matching(sub), assume_unique=True)
+            elif key == "$or":
+                parts = [self._ids_matching(sub) for sub in condition]
+                ids = np.unique(np.concatenate(parts)) if parts else self._ids[:0]
+            else:
+                ops = split_condition(condition).items()
+                by_value = self._metadata_index.get(key, {})
+                # Evaluate each distinct value once rather than each chunk.
+                hits = [ids for value, ids in by_value.items() if all(compare(op, value, exp) for op, exp in ops)]
+                unhashable = self._unhashable_metadata.get(key, [])
+                hits.append([doc_id for doc_id, value in unhashable if all(compare(op, value, exp) for op, exp in ops)])
+                ids = np.unique(np.fromiter(itertools.chain.from_iterable(hits), dtype=np.int64))
+                if all(compare(op, MISSING, exp) for op, exp in ops):
+                    with_key = np.fromiter(
+                        itertools.chain(
+                            itertools.chain.from_iterable(by_value.values()), (doc_id for doc_id, _ in unhashable)
+                        ),
+                        dtype=np.int64,
+                    )
+                    ids = np.union1d(ids, np.setdiff1d(self._ids, with_key))
+            result = np.intersect1d(result, ids, assume_unique=True)
+        return result
 
-    def similarity_search(self, query: str, *, k: int) -> List[RetrievedChunk]:
+    def _search_params(
+        self,
+        nprobe: Optional[int],
+        ef_search: Optional[int],
+        sel: Optional[faiss.IDSelector] = None,
+    ) -> Optional[faiss.SearchParameters]:
+        kind = self.active_index_type
+        if kind in ("ivf_flat", "ivf_pq"):
+            params = faiss.SearchParametersIVF(nprobe=int(nprobe or self.nprobe))
+        elif kind == "hnsw":
+            params = faiss.SearchParametersHNSW(efSearch=int(ef_search or self.ef_search))
+        elif sel is not None:
+            params = faiss.SearchParameters()
+        else:
+            return None
+        if sel is not None:
+            params.sel = sel
+        return params
+
+    def similarity_search(
+        self,
+        query: str,
+        *,
+        k: int,
+        where: Optional[Dict[str, Any]] = None,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+    ) -> List[RetrievedChunk]:
         if self._index is None or not self._docs:
             return []
 
-        q = self.embedding_model.embed_texts([query])
-        scores, indices = self._index.search(q, k)
+        q = self.embedding_model.embed_queries([query])
+        return self.search_by_vector(q[0], k=k, where=where, nprobe=nprobe, ef_search=ef_search)
+
+    def search_by_vector(
+        self,
+        vector: np.ndarray,
+        *,
+        k: int,
+        where: Optional[Dict[str, Any]] = None,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+    ) -> List[RetrievedChunk]:
+        """`nprobe` (IVF) and `ef_search` (HNSW) trade recall for speed; ignored for flat."""
+
+        return self._search_matrix(
+            np.asarray(vector).reshape(1, -1), k=k, where=where, nprobe=nprobe, ef_search=ef_search
+        )[0]
+
+    def similarity_search_batch(
+        self,
+        queries: List[str],
+        *,
+        k: int,
+        where: Optional[Dict[str, Any]] = None,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+    ) -> List[List[RetrievedChunk]]:
+        if not queries:
+            return []
+        if self._index is None or not self._docs:
+            return [[] for _ in queries]
+
+        # One embedding call and one index.search over the whole query matrix.
+        q = self.embedding_model.embed_queries(queries)
+        return self._search_matrix(q, k=k, where=where, nprobe=nprobe, ef_search=ef_search)
+
+    def _search_matrix(
+        self,
+        vectors: np.ndarray,
+        *,
+        k: int,
+        where: Optional[Dict[str, Any]] = None,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+    ) -> List[List[RetrievedChunk]]:
+        if self._index is None or not self._docs:
+            return [[] for _ in range(len(vectors))]
+
+        q = np.ascontiguousarray(vectors, dtype="float32")
+        sel = None
+        if where:
+            candidates = self._ids_matching(where)
+            if len(candidates) == 0:
+                return [[] for _ in range(len(q))]
+            if len(candidates) <= self.EXACT_FILTER_MAX_IDS:
+                scores, indices = self._search_exact(q, k, candidates)
+                return self._to_results(scores, indices)
+            sel = faiss.IDSelectorBatch(candidates)
+
+        scores, indices = self._index.search(q, k, params=self._search_params(nprobe, ef_search, sel))
+        return self._to_results(scores, indices)
+
+    def _search_exact(self, q: np.ndarray, k: int, candidates: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Brute-force inner products against just `candidates` (ids), shaped like index.search."""
+
+        ivf = faiss.try_extract_index_ivf(self._inner_index())
+        if ivf is not None and ivf.direct_map.type == faiss.DirectMap.NoMap:
+            ivf.make_direct_map()
+        scores = q @ self._index.reconstruct_batch(candidates).T
+        k = min(k, len(candidates))
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind="stable")
+        return np.take_along_axis(top_scores, order, axis=1), candidates[np.take_along_axis(top, order, axis=1)]
 
-        out: List[RetrievedChunk] = []
-        for score, idx in zip(scores[0].tolist(), indices[0].tolist()):
-            if idx == -1:
-                continue
-            doc = self._docs[idx]
-            out.append(RetrievedChunk(text=doc["text"], score=float(score), metadata=doc.get("metadata", {})))
-        return out
+    def _to_results(self, scores: np.ndarray, indices: np.ndarray) -> List[List[RetrievedChunk]]:
+        results: List[List[RetrievedChunk]] = []
+        for row_scores, row_indices in zip(scores.tolist(), indices.tolist()):
+            out: List[RetrievedChunk] = []
+            for score, doc_id in zip(row_scores, row_indices):
+                if doc_id == -1:
+                    continue
+                doc = self._docs[int(np.searchsorted(self._ids, doc_id))]
+                out.append(RetrievedChunk(text=doc["text"], score=float(score), metadata=doc.get("metadata", {})))
+            results.append(out)
+        return results
@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+from typing import Any, Callable, Dict, Mapping
+
+# Metadata filters use Chroma's `where` syntax, so the same dict works on every backend:
+#   {"source": "sop.pdf"}                                  equality
+#   {"page_start": {"$gte": 3}}                            $eq $ne $gt $gte $lt $lte $in $nin
+#   {"$and": [{...}, {...}]}, {"$or": [{...}, {...}]}      combinators
+# A dict with several keys means all of them must match.
+
+_COMPARISONS: Dict[str, Callable[[Any, Any], bool]] = {
+    "$eq": lambda a, b: a == b,
+    "$ne": lambda a, b: a != b,
+    "$gt": lambda a, b: a > b,
+    "$gte": lambda a, b: a >= b,
+    "$lt": lambda a, b: a < b,
+    "$lte": lambda a, b: a <= b,
+    "$in": lambda a, b: a in b,
+    "$nin": lambda a, b: a not in b,
+}
+
+# Stand-in for a key the metadata does not have.
+MISSING = object()
+
+
+def split_condition(condition: Any) -> Dict[str, Any]:
+    """`value` or `{"$op": value}` -> `{"$op": value}`."""
+
+    if isinstance(condition, dict):
+        unknown = [op for op in condition if op not in _COMPARISONS]
+        if unknown:
+            raise ValueError(f"Unsupported filter operator(s): {unknown}")
+        return condition
+    return {"$eq": condition}
+
+
+def compare(op: str, actual: Any, expected: Any) -> bool:
+    """Apply one comparison operator; missing keys only satisfy $ne / $nin."""
+
+    if actual is MISSING:
+        return op in ("$ne", "$nin")
+    try:
+        return _COMPARISONS[op](actual, expected)
+    except TypeError:
+        # Ordering across types (e.g. str vs int) never matches.
+        return False
+
+
+def matches_where(metadata: Mapping[str, Any], where: Dict[str, Any]) -> bool:
+    """True if `metadata` satisfies the `where` filter."""
+
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(matches_where(metadata, sub) for sub in condition):
+                return False
+        elif key == "$or":
+            if not any(matches_where(metadata, sub) for sub in condition):
+                return False
+        else:
+            actual = metadata.get(key, MISSING)
+            if not all(compare(op, actual, expected) for op, expected in split_condition(condition).items()):
+                return False
+    return True
+
+
+def to_chroma_where(where: Dict[str, Any]) -> Dict[str, Any]:
+    """Chroma accepts exactly one key per filter dict; fold several into an explicit $and."""
+
+    clauses = []
+    for key, condition in where.items():
+        if key in ("$and", "$or"):
+            clauses.append({key: [to_chroma_where(sub) for sub in condition]})
+        elif isinstance(condition, dict) and len(condition) > 1:
+            clauses.extend({key: {op: value}} for op, value in condition.items())
+        else:
+            clauses.append({key: condition})
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
@@ -0,0 +1,294 @@
+from __future__ import annotations
+
+import json
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from ..embeddings import EmbeddingModel
+from ..types import RetrievedChunk
+from .base import VectorStore
+from .docs_file import create_empty, fsync_file, read_docs, truncate_torn_tail, write_docs
+from .filters import matches_where
+
+
+class NumpyVectorStore(VectorStore):
+    """Dependency-free store: a quantized embedding matrix scanned with one mat-vec.
+
+    Meant for small corpora on edge boxes where neither faiss nor chromadb is available.
+
+    Persistence layout:
+    - <persist_dir>/embeddings.npy  (float16, or int8 codes with per-row symmetric scaling)
+    - <persist_dir>/inv_norms.npy   (float32, 1 / ||stored row||)
+    - <persist_dir>/docs.jsonl      (one JSON per chunk: {"text": ..., "metadata": ...})
+
+    Matrices are opened with `np.load(mmap_mode="r")`, so several workers share the
+    page cache instead of each holding a copy. Scores are the cosine between the query
+    and the stored (dequantized) row, which lines up with FaissVectorStore's inner
+    products on normalized vectors up to quantization error.
+
+    int8 is the default: converting int8 blocks to float32 for the product is several
+    times cheaper than converting float16, at a score error of ~1e-3.
+
+    The hashed bag-of-words queries touch only a few dimensions, so when a batch of
+    queries is non-zero in at most `sparse_query_fraction` of them, only those columns
+    are read and converted. Scores are unchanged (the skipped terms are zero) and no
+    float32 copy of the matrix is kept.
+
+    The matrix files are allocated with spare rows and doubled when full, so an append
+    writes only its own rows in place and ingesting N chunks in batches costs O(N)
+    overall. Rows past the docs.jsonl count are unused.
+
+    Crash safety follows the protocol in docs_file.py. Load keeps the rows that both
+    the matrices and docs.jsonl cover. Growing replaces the two matrices, and a delete
+    rewrites all three files under the `rewrite.pending` marker.
+    """
+
+    DTYPES = ("float16", "int8")
+
+    # Rows scored per block, bounding the float32 temporary created during search.
+    block_rows: int = 65536
+
+    # Score only the query's non-zero columns when they are at most this share of the dims.
+    sparse_query_fraction: float = 0.25
+
+    def __init__(
+        self,
+        *,
+        persist_dir: str,
+        embedding_model: Optional[EmbeddingModel] = None,
+        dtype: str = "int8",
+    ):
+        if dtype not in self.DTYPES:
+            raise ValueError(f"dtype must be one of {self.DTYPES}, got: {dtype}")
+
+        self.persist_dir = persist_dir
+        self.embedding_model = embedding_model or EmbeddingModel()
+        self.dtype = dtype
+
+        os.makedirs(self.persist_dir, exist_ok=True)
+
+        self._matrix_path = os.path.join(self.persist_dir, "embeddings.npy")
+        self._norms_path = os.path.join(self.persist_dir, "inv_norms.npy")
+        self._docs_path = os.path.join(self.persist_dir, "docs.jsonl")
+        self._rewrite_marker = os.path.join(self.persist_dir, "rewrite.pending")
+
+        self._docs: List[Dict[str, Any]] = []
+        self._matrix: Optional[np.ndarray] = None
+        self._inv_norms: Optional[np.ndarray] = None
+
+        self._load_if_exists()
+
+    def _tmp_paths(self) -> List[Tuple[str, str]]:
+        return [(path + ".tmp.npy", path) for path in (self._matrix_path, self._norms_path)] + [
+            (self._docs_path + ".tmp", self._docs_path)
+        ]
+
+    def _finish_rewrite(self) -> None:
+        """Complete (or discard) a file rewrite that a crash interrupted."""
+
+        if os.path.exists(self._rewrite_marker):
+            # Every new file was complete before the marker was created; roll forward.
+            for tmp_path, path in self._tmp_paths():
+                if os.path.exists(tmp_path):
+                    os.replace(tmp_path, path)
+            os.remove(self._rewrite_marker)
+        else:
+            for tmp_path, _path in self._tmp_paths():
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+
+    def _load_if_exists(self) -> None:
+        self._finish_rewrite()
+        if os.path.exists(self._matrix_path) and os.path.exists(self._norms_path) and os.path.exists(self._docs_path):
+            self._open_matrices()
+            self.dtype = str(self._matrix.dtype)
+            docs, docs_len = read_docs(self._docs_path)
+            truncate_torn_tail(self._docs_path, docs_len)
+            # Rows past the docs count are spare capacity, or an append cut short by a crash.
+            self._docs = docs[: min(len(docs), len(self._matrix), len(self._inv_norms))]
+
+    def _open_matrices(self) -> None:
+        # Plain ndarray views over the maps: same shared pages, without np.memmap's
+        # per-slice Python overhead on the query path.
+        self._matrix = np.load(self._matrix_path, mmap_mode="r").view(np.ndarray)
+        self._inv_norms = np.load(self._norms_path, mmap_mode="r").view(np.ndarray)
+
+    def _close_matrices(self) -> None:
+        # Drop the maps before the files are replaced (see docs_file.py).
+        self._matrix = None
+        self._inv_norms = None
+
+    def _quantize(self, vectors: np.ndarray) -> np.ndarray:
+        if self.dtype == "int8":
+            peak = np.abs(vectors).max(axis=1, keepdims=True)
+            peak[peak == 0.0] = 1.0
+            return np.round(vectors / peak * 127.0).astype(np.int8)
+        return vectors.astype(np.float16)
+
+    @staticmethod
+    def _write_rows(
+        path: str, rows: np.ndarray, *, at: int, capacity: Optional[int] = None, keep: Optional[np.ndarray] = None
+    ) -> None:
+        """Write `rows` at row `at` of the .npy at `path`.
+
+        With `capacity`, a new file of that many rows is written instead, starting
+        with `keep`, to `path + ".tmp.npy"`; the caller renames it into place.
+        """
+
+        if capacity is None:
+            out = np.lib.format.open_memmap(path, mode="r+")
+        else:
+            shape = (capacity,) + rows.shape[1:]
+            out = np.lib.format.open_memmap(path + ".tmp.npy", mode="w+", dtype=rows.dtype, shape=shape)
+            if at:
+                out[:at] = keep[:at]
+        out[at : at + len(rows)] = rows
+        out.flush()
+        del out
+
+    def add_texts(self, texts: List[str], metadatas: Optional[List[Dict[str, Any]]] = None) -> None:
+        if not texts:
+            return
+        if metadatas is None:
+            metadatas = [{} for _ in texts]
+        if len(metadatas) != len(texts):
+            raise ValueError("metadatas length must match texts length")
+
+        codes = self._quantize(self.embedding_model.embed_texts(texts))
+        norms = np.linalg.norm(codes.astype(np.float32), axis=1)
+        inv_norms = np.where(norms > 0.0, 1.0 / np.maximum(norms, 1e-12), 0.0).astype(np.float32)
+
+        n = len(self._docs)
+        capacity = min(len(self._matrix), len(self._inv_norms)) if self._matrix is not None else 0
+        if n + len(texts) <= capacity:
+            # Spare rows past the docs count: fill them in place.
+            self._write_rows(self._matrix_path, codes, at=n)
+            self._write_rows(self._norms_path, inv_norms, at=n)
+        else:
+            capacity = max(n + len(texts), 2 * capacity)
+            self._write_rows(self._matrix_path, codes, at=n, capacity=capacity, keep=self._matrix)
+            self._write_rows(self._norms_path, inv_norms, at=n, capacity=capacity, keep=self._inv_norms)
+            self._close_matrices()
+            os.replace(self._matrix_path + ".tmp.npy", self._matrix_path)
+            os.replace(self._norms_path + ".tmp.npy", self._norms_path)
+            self._open_matrices()
+
+        new_docs = [{"text": t, "metadata": m} for t, m in zip(texts, metadatas)]
+        with open(self._docs_path, "a", encoding="utf-8") as f:
+            for doc in new_docs:
+                f.write(json.dumps(doc, ensure_ascii=False) + "\n")
+            fsync_file(f)
+
+        self._docs.extend(new_docs)
+        self._bump_revision()
+
+    def count(self) -> int:
+        return len(self._docs)
+
+    def delete(self, *, where: Dict[str, Any]) -> int:
+        if not where:
+            raise ValueError("where must name at least one metadata key")
+        keep = np.array([not matches_where(doc.get("metadata") or {}, where) for doc in self._docs], dtype=bool)
+        removed = int(len(keep) - keep.sum())
+        if removed == 0:
+            return 0
+
+        n = len(self._docs)
+        matrix = np.asarray(self._matrix[:n])[keep]
+        inv_norms = np.asarray(self._inv_norms[:n])[keep]
+        docs = [doc for doc, kept in zip(self._docs, keep.tolist()) if kept]
+
+        for path, array in ((self._matrix_path, matrix), (self._norms_path, inv_norms)):
+            with open(path + ".tmp.npy", "wb") as f:
+                np.save(f, array)
+                fsync_file(f)
+        write_docs(self._docs_path + ".tmp", docs)
+        create_empty(self._rewrite_marker)
+        self._close_matrices()
+        self._finish_rewrite()
+
+        self._docs = docs
+        self._open_matrices()
+        self._bump_revision()
+        return removed
+
+    def _scores(self, queries: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """(n_queries, n_rows) cosine scores, computed block by block.
+
+        `rows` restricts scoring to those docs (a filtered search); default is every doc.
+        """
+
+        n = len(self._docs) if rows is None else len(rows)
+        q = np.asarray(queries, dtype=np.float32)
+        cols: Optional[np.ndarray] = np.flatnonzero(q.any(axis=0))
+        if len(cols) <= q.shape[1] * self.sparse_query_fraction:
+            q = q[:, cols]
+        else:
+            cols = None
+
+        out = np.empty((len(q), n), dtype=np.float32)
+        for start in range(0, n, self.block_rows):
+            stop = min(n, start + self.block_rows)
+            if rows is None:
+                block = self._matrix[start:stop] if cols is None else self._matrix[start:stop, cols]
+                inv_norms = self._inv_norms[start:stop]
+            else:
+                picked = rows[start:stop]
+                block = self._matrix[picked] if cols is None else self._matrix[picked[:, None], cols]
+                inv_norms = self._inv_norms[picked]
+            np.multiply(q @ block.astype(np.float32).T, inv_norms, out=out[:, start:stop])
+        return out
+
+    def _matching_rows(self, where: Optional[Dict[str, Any]]) -> Optional[np.ndarray]:
+        if not where:
+            return None
+        return np.flatnonzero([matches_where(doc.get("metadata") or {}, where) for doc in self._docs])
+
+    def _top_k(self, scores: np.ndarray, k: int, rows: Optional[np.ndarray] = None) -> List[RetrievedChunk]:
+        """Best `k` of `scores`; with `rows`, scores[i] belongs to doc rows[i]."""
+
+        k = min(k, len(scores))
+        if k <= 0:
+            return []
+        top = np.argpartition(scores, len(scores) - k)[len(scores) - k :]
+        doc_rows = top if rows is None else rows[top]
+        top_scores = scores[top]
+        order = np.lexsort((doc_rows, -top_scores))
+
+        docs = self._docs
+        return [
+            RetrievedChunk(text=docs[row]["text"], score=score, metadata=docs[row].get("metadata", {}))
+            for score, row in zip(top_scores[order].tolist(), doc_rows[order].tolist())
+        ]
+
+    def similarity_search(
+        self, query: str, *, k: int, where: Optional[Dict[str, Any]] = None
+    ) -> List[RetrievedChunk]:
+        if not self._docs:
+            return []
+
+        q = self.embedding_model.embed_queries([query])
+        return self.search_by_vector(q[0], k=k, where=where)
+
+    def search_by_vector(
+        self, vector: np.ndarray, *, k: int, where: Optional[Dict[str, Any]] = None
+    ) -> List[RetrievedChunk]:
+        if not self._docs:
+            return []
+        rows = self._matching_rows(where)
+        return self._top_k(self._scores(np.asarray(vector).reshape(1, -1), rows)[0], k, rows)
+
+    def similarity_search_batch(
+        self, queries: List[str], *, k: int, where: Optional[Dict[str, Any]] = None
+    ) -> List[List[RetrievedChunk]]:
+        if not queries:
+            return []
+        if not self._docs:
+            return [[] for _ in queries]
+
+        # One mat-mat product for all queries (over the matching rows only, when filtered).
+        rows = self._matching_rows(where)
+        scores = self._scores(self.embedding_model.embed_queries(queries), rows)
+        return [self._top_k(row, k, rows) for row in scores]
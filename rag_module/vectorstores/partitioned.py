@@ -0,0 +1,164 @@
+from __future__ import annotations
+
+import os
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from ..defects import DEFECTS_KEY, DefectTagger, format_tags, parse_tags
+from ..embeddings import EmbeddingModel
+from ..types import RetrievedChunk
+from .base import VectorStore
+
+GENERAL = "general"
+UNTAGGED = "untagged"
+
+
+class PartitionedVectorStore(VectorStore):
+    """One sub-store per defect class, plus a shared `general` and an `untagged` partition.
+
+    A chunk goes to the partition of every class it mentions (its `defects` metadata,
+    see `ingest.iter_document_chunks`; chunks without it are tagged here). Chunks that
+    mention `general_min_labels` or more classes are cross-cutting (overviews, threshold
+    tables) and go to `general` only; chunks that mention none go to `untagged`.
+
+    Searching with `partitions=partitions_for_label(label)` scans that class and
+    `general`, so its cost does not grow with chunks about other classes. `untagged`
+    (procedures and documentation rules that apply to every defect, but also unrelated
+    manuals) is only searched when those return fewer than k chunks; pass
+    `untagged_search="always"` to include it in every scoped search. Without
+    `partitions`, every partition is searched.
+
+    A chunk tagged with two classes is stored in both partitions; searches drop the
+    duplicate, but `count()` and `delete()` report stored rows, so it counts once per
+    partition.
+    """
+
+    def __init__(
+        self,
+        *,
+        persist_dir: str,
+        make_partition: Callable[[str], VectorStore],
+        labels: Sequence[str],
+        embedding_model: Optional[EmbeddingModel] = None,
+        tagger: Optional[Callable[[str], List[str]]] = None,
+        general_min_labels: int = 3,
+        untagged_search: str = "fallback",
+    ):
+        if untagged_search not in ("fallback", "always"):
+            raise ValueError(f"untagged_search must be 'fallback' or 'always', got {untagged_search!r}")
+        self.persist_dir = persist_dir
+        self.labels = list(labels)
+        self.embedding_model = embedding_model or EmbeddingModel()
+        self.tagger = tagger or DefectTagger(self.labels)
+        self.general_min_labels = int(general_min_labels)
+        self.untagged_search = untagged_search
+
+        os.makedirs(self.persist_dir, exist_ok=True)
+        self._partitions: Dict[str, VectorStore] = {
+            name: make_partition(name) for name in [*self.labels, GENERAL, UNTAGGED]
+        }
+
+    @property
+    def partitions(self) -> Dict[str, VectorStore]:
+        return dict(self._partitions)
+
+    @property
+    def revision(self) -> int:  # type: ignore[override]
+        return sum(store.revision for store in self._partitions.values())
+
+    def partitions_for_label(self, label: Any) -> Optional[List[str]]:
+        """Partitions to search for a predicted class; None (everything) for unknown labels."""
+
+        if label not in self.labels:
+            return None
+        if self.untagged_search == "always":
+            return [str(label), GENERAL, UNTAGGED]
+        return [str(label), GENERAL]
+
+    def _route(self, tags: List[str]) -> List[str]:
+        tags = [t for t in tags if t in self.labels]
+        if not tags:
+            return [UNTAGGED]
+        if len(tags) >= self.general_min_labels:
+            return [GENERAL]
+        return tags
+
+    def add_texts(self, texts: List[str], metadatas: Optional[List[Dict[str, Any]]] = None) -> None:
+        if not texts:
+            return
+        if metadatas is None:
+            metadatas = [{} for _ in texts]
+        if len(metadatas) != len(texts):
+            raise ValueError("metadatas length must match texts length")
+
+        routed: Dict[str, Tuple[List[str], List[Dict[str, Any]]]] = {}
+        for text, metadata in zip(texts, metadatas):
+            if DEFECTS_KEY not in metadata:
+                metadata = {**metadata, DEFECTS_KEY: format_tags(self.tagger(text))}
+            for name in self._route(parse_tags(metadata[DEFECTS_KEY])):
+                batch = routed.setdefault(name, ([], []))
+                batch[0].append(text)
+                batch[1].append(metadata)
+
+        for name, (part_texts, part_metadatas) in routed.items():
+            self._partitions[name].add_texts(part_texts, metadatas=part_metadatas)
+
+    def _selected(self, partitions: Optional[Sequence[str]]) -> List[VectorStore]:
+        if partitions is None:
+            return list(self._partitions.values())
+        unknown = [name for name in partitions if name not in self._partitions]
+        if unknown:
+            raise ValueError(f"Unknown partition(s): {unknown}")
+        return [self._partitions[name] for name in partitions]
+
+    def similarity_search(
+        self,
+        query: str,
+        *,
+        k: int,
+        where: Optional[Dict[str, Any]] = None,
+        partitions: Optional[Sequence[str]] = None,
+    ) -> List[RetrievedChunk]:
+        q = self.embedding_model.embed_queries([query])
+        return self.search_by_vector(q[0], k=k, where=where, partitions=partitions)
+
+    def search_by_vector(
+        self,
+        vector: np.ndarray,
+        *,
+        k: int,
+        where: Optional[Dict[str, Any]] = None,
+        partitions: Optional[Sequence[str]] = None,
+    ) -> List[RetrievedChunk]:
+        # Imported here: rag_module.query imports this module.
+        from ..query import merge_retrieved
+
+        # Each partition's own top-k; a chunk stored twice can take two slots, so merge then cut.
+        results = [store.search_by_vector(vector, k=k, where=where) for store in self._selected(partitions)]
+        merged = merge_retrieved(results, k=k)
+        if partitions is not None and UNTAGGED not in partitions and len(merged) < k:
+            results.append(self._partitions[UNTAGGED].search_by_vector(vector, k=k, where=where))
+            merged = merge_retrieved(results, k=k)
+        return merged
+
+    def similarity_search_batch(
+        self,
+        queries: List[str],
+        *,
+        k: int,
+        where: Optional[Dict[str, Any]] = None,
+        partitions: Optional[Sequence[str]] = None,
+    ) -> List[List[RetrievedChunk]]:
+        if not queries:
+            return []
+        vectors = self.embedding_model.embed_queries(queries)
+        return [self.search_by_vector(vec, k=k, where=where, partitions=partitions) for vec in vectors]
+
+    def count(self) -> int:
+        """Stored rows across partitions; a chunk in two class partitions counts twice."""
+
+        return sum(store.count() for store in self._partitions.values())
+
+    def delete(self, *, where: Dict[str, Any]) -> int:
+        return sum(store.delete(where=where) for store in self._partitions.values())
@@ -0,0 +1,338 @@
+from __future__ import annotations
+
+import json
+import os
+import struct
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from ..embeddings import EmbeddingModel
+from ..types import RetrievedChunk
+from .base import VectorStore
+from .docs_file import create_empty, fsync_file, read_docs, truncate_torn_tail, write_docs
+from .filters import matches_where
+
+# sparse.log record header: magic, first row, row count, entry count, crc32(payload); the
+# payload is the per-row entry counts (int64), then buckets (int32), then values (float32).
+_LOG_MAGIC = b"SPRS"
+_LOG_HEADER = struct.Struct("<4sQIII")
+
+
+class SparseVectorStore(VectorStore):
+    """Inverted-index store for the sparse hashed bag-of-words embeddings.
+
+    Only non-zero buckets are kept. Queries touch just the posting lists of the
+    query's non-zero buckets, so cost scales with the postings hit rather than
+    corpus_size * dim. Scores are inner products of L2-normalized vectors, i.e.
+    the same cosine scores FaissVectorStore (IndexFlatIP) returns.
+
+    Persistence layout:
+    - <persist_dir>/sparse.npz   (doc-major CSR snapshot: row_ptr, buckets, values)
+    - <persist_dir>/sparse.log   (append-only CSR rows added since the snapshot)
+    - <persist_dir>/docs.jsonl   (one JSON per chunk: {"text": ..., "metadata": ...})
+
+    Appends only write their own rows to sparse.log, so ingesting N chunks in batches
+    costs O(N) I/O. Once the log holds `compact_every` rows it is folded into a fresh
+    snapshot. The bucket-major inverted index (post_ptr, post_docs, post_values) is
+    derived from the doc-major arrays on the first search after a write.
+
+    Crash safety follows the protocol in docs_file.py. When the rows and docs.jsonl
+    disagree after a crash, load rewrites the files to the rows both cover. Log records
+    carry their first row, so records already folded into the snapshot are skipped.
+    Deletes rewrite all three files under the `rewrite.pending` marker.
+    """
+
+    def __init__(
+        self,
+        *,
+        persist_dir: str,
+        embedding_model: Optional[EmbeddingModel] = None,
+        compact_every: int = 10_000,
+    ):
+        self.persist_dir = persist_dir
+        self.embedding_model = embedding_model or EmbeddingModel()
+        self.dim = int(self.embedding_model.dim)
+        self.compact_every = int(compact_every)
+
+        os.makedirs(self.persist_dir, exist_ok=True)
+
+        self._matrix_path = os.path.join(self.persist_dir, "sparse.npz")
+        self._log_path = os.path.join(self.persist_dir, "sparse.log")
+        self._docs_path = os.path.join(self.persist_dir, "docs.jsonl")
+        self._matrix_tmp_path = self._matrix_path + ".tmp.npz"
+        self._log_tmp_path = self._log_path + ".tmp"
+        self._docs_tmp_path = self._docs_path + ".tmp"
+        self._rewrite_marker = os.path.join(self.persist_dir, "rewrite.pending")
+
+        self._docs: List[Dict[str, Any]] = []
+        self._row_ptr = np.zeros(1, dtype=np.int64)
+        self._buckets = np.zeros(0, dtype=np.int32)
+        self._values = np.zeros(0, dtype=np.float32)
+
+        self._post_ptr = np.zeros(self.dim + 1, dtype=np.int64)
+        self._post_docs = np.zeros(0, dtype=np.int32)
+        self._post_values = np.zeros(0, dtype=np.float32)
+        self._postings_stale = False
+        self._log_rows = 0
+        # True once sparse.npz matches what this instance holds (loaded or written by it).
+        self._has_snapshot = False
+
+        self._load_if_exists()
+
+    def _tmp_paths(self) -> List[Tuple[str, str]]:
+        return [
+            (self._docs_tmp_path, self._docs_path),
+            (self._matrix_tmp_path, self._matrix_path),
+            (self._log_tmp_path, self._log_path),
+        ]
+
+    def _finish_rewrite(self) -> None:
+        """Complete (or discard) a delete's file rewrite that a crash interrupted."""
+
+        if os.path.exists(self._rewrite_marker):
+            # Every new file was complete before the marker was created; roll forward.
+            for tmp_path, path in self._tmp_paths():
+                if os.path.exists(tmp_path):
+                    os.replace(tmp_path, path)
+            os.remove(self._rewrite_marker)
+        else:
+            for tmp_path, _path in self._tmp_paths():
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+
+    def _load_if_exists(self) -> None:
+        self._finish_rewrite()
+        if os.path.exists(self._matrix_path) and os.path.exists(self._docs_path):
+            with np.load(self._matrix_path) as data:
+                self._row_ptr = data["row_ptr"].astype(np.int64)
+                self._buckets = data["buckets"].astype(np.int32)
+                self._values = data["values"].astype(np.float32)
+            truncate_torn_tail(self._log_path, self._replay_log())
+            self._docs, docs_len = read_docs(self._docs_path)
+            truncate_torn_tail(self._docs_path, docs_len)
+            # A crash between an append's two writes leaves extra rows; keep the common prefix.
+            n = min(len(self._docs), len(self._row_ptr) - 1)
+            misaligned = len(self._docs) != len(self._row_ptr) - 1
+            self._docs = self._docs[:n]
+            self._row_ptr = self._row_ptr[: n + 1]
+            self._buckets = self._buckets[: self._row_ptr[-1]]
+            self._values = self._values[: self._row_ptr[-1]]
+            self._postings_stale = True
+            self._has_snapshot = True
+            # Extra rows or docs must leave the files too, or the next append would not line up.
+            if misaligned:
+                self._persist_rewrite()
+            elif self._log_rows >= self.compact_every:
+                self.compact()
+
+    def _replay_log(self) -> int:
+        """Append sparse.log records to the loaded snapshot; returns the valid byte length."""
+
+        valid_len = 0
+        if not os.path.exists(self._log_path):
+            return valid_len
+        n_rows = len(self._row_ptr) - 1
+        counts: List[np.ndarray] = []
+        buckets: List[np.ndarray] = []
+        values: List[np.ndarray] = []
+        with open(self._log_path, "rb") as f:
+            while True:
+                header = f.read(_LOG_HEADER.size)
+                if len(header) < _LOG_HEADER.size:
+                    break
+                magic, first_row, rows, entries, crc = _LOG_HEADER.unpack(header)
+                if magic != _LOG_MAGIC:
+                    break
+                payload = f.read(rows * 8 + entries * 8)
+                if len(payload) != rows * 8 + entries * 8 or zlib.crc32(payload) != crc:
+                    break
+                if first_row + rows > n_rows:
+                    # Records already folded into the snapshot (crash during compaction) are skipped.
+                    if first_row != n_rows:
+                        break
+                    counts.append(np.frombuffer(payload[: rows * 8], dtype="<i8"))
+                    buckets.append(np.frombuffer(payload[rows * 8 : rows * 8 + entries * 4], dtype="<i4"))
+                    values.append(np.frombuffer(payload[rows * 8 + entries * 4 :], dtype="<f4"))
+                    n_rows += rows
+                self._log_rows += rows
+                valid_len += len(header) + len(payload)
+        if counts:
+            all_counts = np.concatenate(counts).astype(np.int64)
+            self._row_ptr = np.concatenate([self._row_ptr, self._row_ptr[-1] + np.cumsum(all_counts)])
+            self._buckets = np.concatenate([self._buckets, *buckets]).astype(np.int32)
+            self._values = np.concatenate([self._values, *values]).astype(np.float32)
+        return valid_len
+
+    def _ensure_postings(self) -> None:
+        if self._postings_stale:
+            self._rebuild_postings()
+            self._postings_stale = False
+
+    def _rebuild_postings(self) -> None:
+        n_rows = len(self._row_ptr) - 1
+        doc_of_entry = np.repeat(np.arange(n_rows, dtype=np.int32), np.diff(self._row_ptr))
+        order = np.argsort(self._buckets, kind="stable")
+        self._post_docs = doc_of_entry[order]
+        self._post_values = self._values[order]
+        self._post_ptr = np.zeros(self.dim + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self._buckets, minlength=self.dim), out=self._post_ptr[1:])
+
+    def _save_matrix(self, path: str) -> None:
+        with open(path, "wb") as f:
+            np.savez(f, row_ptr=self._row_ptr, buckets=self._buckets, values=self._values)
+            fsync_file(f)
+
+    def compact(self) -> None:
+        """Fold sparse.log into a fresh sparse.npz snapshot (atomic replace)."""
+
+        self._save_matrix(self._matrix_tmp_path)
+        os.replace(self._matrix_tmp_path, self._matrix_path)
+        # The snapshot now covers every logged row; replay skips them even if this truncate is lost.
+        create_empty(self._log_path)
+        self._log_rows = 0
+        self._has_snapshot = True
+
+    def _persist_append(
+        self, new_docs: List[Dict[str, Any]], first_row: int, counts: np.ndarray, buckets: np.ndarray, values: np.ndarray
+    ) -> None:
+        if self._has_snapshot:
+            payload = counts.astype("<i8").tobytes() + buckets.astype("<i4").tobytes() + values.astype("<f4").tobytes()
+            with open(self._log_path, "ab") as f:
+                f.write(_LOG_HEADER.pack(_LOG_MAGIC, first_row, len(counts), len(buckets), zlib.crc32(payload)))
+                f.write(payload)
+                fsync_file(f)
+            self._log_rows += len(counts)
+        else:
+            self.compact()
+        with open(self._docs_path, "a", encoding="utf-8") as f:
+            for doc in new_docs:
+                f.write(json.dumps(doc, ensure_ascii=False) + "\n")
+            fsync_file(f)
+        if self._log_rows >= self.compact_every:
+            self.compact()
+
+    def _persist_rewrite(self) -> None:
+        write_docs(self._docs_tmp_path, self._docs)
+        self._save_matrix(self._matrix_tmp_path)
+        # The snapshot holds every row, renumbered; the log must go with it.
+        create_empty(self._log_tmp_path)
+        create_empty(self._rewrite_marker)
+        self._finish_rewrite()
+        self._log_rows = 0
+
+    def add_texts(self, texts: List[str], metadatas: Optional[List[Dict[str, Any]]] = None) -> None:
+        if not texts:
+            return
+        if metadatas is None:
+            metadatas = [{} for _ in texts]
+        if len(metadatas) != len(texts):
+            raise ValueError("metadatas length must match texts length")
+
+        vectors = self.embedding_model.embed_texts(texts)
+        rows, cols = np.nonzero(vectors)
+        counts = np.bincount(rows, minlength=len(texts))
+        buckets = cols.astype(np.int32)
+        values = vectors[rows, cols].astype(np.float32)
+
+        first_row = len(self._row_ptr) - 1
+        self._row_ptr = np.concatenate([self._row_ptr, self._row_ptr[-1] + np.cumsum(counts)])
+        self._buckets = np.concatenate([self._buckets, buckets])
+        self._values = np.concatenate([self._values, values])
+        self._postings_stale = True
+
+        new_docs = [{"text": t, "metadata": m} for t, m in zip(texts, metadatas)]
+        self._docs.extend(new_docs)
+
+        self._persist_append(new_docs, first_row, counts, buckets, values)
+        self._bump_revision()
+
+    def count(self) -> int:
+        return len(self._docs)
+
+    def delete(self, *, where: Dict[str, Any]) -> int:
+        if not where:
+            raise ValueError("where must name at least one metadata key")
+        keep = np.array([not matches_where(doc.get("metadata") or {}, where) for doc in self._docs], dtype=bool)
+        removed = int(len(keep) - keep.sum())
+        if removed == 0:
+            return 0
+
+        counts = np.diff(self._row_ptr)
+        entry_keep = np.repeat(keep, counts)
+        self._row_ptr = np.concatenate([[0], np.cumsum(counts[keep])]).astype(np.int64)
+        self._buckets = self._buckets[entry_keep]
+        self._values = self._values[entry_keep]
+        self._postings_stale = True
+
+        self._docs = [doc for doc, kept in zip(self._docs, keep.tolist()) if kept]
+        self._persist_rewrite()
+        self._bump_revision()
+        return removed
+
+    def similarity_search(
+        self, query: str, *, k: int, where: Optional[Dict[str, Any]] = None
+    ) -> List[RetrievedChunk]:
+        if not self._docs:
+            return []
+
+        q = self.embedding_model.embed_queries([query])
+        return self.search_by_vector(q[0], k=k, where=where)
+
+    def similarity_search_batch(
+        self, queries: List[str], *, k: int, where: Optional[Dict[str, Any]] = None
+    ) -> List[List[RetrievedChunk]]:
+        if not queries:
+            return []
+        if not self._docs:
+            return [[] for _ in queries]
+
+        q = self.embedding_model.embed_queries(queries)
+        rows = self._matching_rows(where)
+        return [self._top_k(self._scores(vec), k, rows) for vec in q]
+
+    def _matching_rows(self, where: Optional[Dict[str, Any]]) -> Optional[np.ndarray]:
+        if not where:
+            return None
+        return np.flatnonzero([matches_where(doc.get("metadata") or {}, where) for doc in self._docs])
+
+    def _scores(self, vector: np.ndarray) -> np.ndarray:
+        self._ensure_postings()
+        q = np.asarray(vector, dtype=np.float32).reshape(-1)
+        q_buckets = np.flatnonzero(q)
+        starts = self._post_ptr[q_buckets]
+        lengths = self._post_ptr[q_buckets + 1] - starts
+        if int(lengths.sum()) == 0:
+            return np.zeros(len(self._docs), dtype=np.float32)
+
+        # Gather every posting of every query bucket in one go.
+        offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(int(lengths.sum()))
+        weights = self._post_values[offsets] * np.repeat(q[q_buckets], lengths)
+        scores = np.bincount(self._post_docs[offsets], weights=weights, minlength=len(self._docs))
+        return scores.astype(np.float32)
+
+    def search_by_vector(
+        self, vector: np.ndarray, *, k: int, where: Optional[Dict[str, Any]] = None
+    ) -> List[RetrievedChunk]:
+        if not self._docs:
+            return []
+        return self._top_k(self._scores(vector), k, self._matching_rows(where))
+
+    def _top_k(self, scores: np.ndarray, k: int, rows: Optional[np.ndarray] = None) -> List[RetrievedChunk]:
+        """Best `k` docs by score, restricted to `rows` when a filter is active."""
+
+        candidates = np.arange(len(scores)) if rows is None else rows
+        k = min(k, len(candidates))
+        if k <= 0:
+            return []
+        cand_scores = scores[candidates]
+        top = np.argpartition(-cand_scores, k - 1)[:k]
+        top = candidates[top]
+        top = top[np.lexsort((top, -scores[top]))]
+
+        out: List[RetrievedChunk] = []
+        for idx in top.tolist():
+            doc = self._docs[idx]
+            out.append(RetrievedChunk(text=doc["text"], score=float(scores[idx]), metadata=doc.get("metadata", {})))
+        return out
@@ -0,0 +1,115 @@
+import asyncio
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import List
+
+import numpy as np
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+import httpx
+
+from backend import main as server
+
+# Concurrency load test for POST /api/panel/auto-analyze, in process (httpx ASGI transport).
+# The external services are replaced by sleeps of realistic length (BENCH_*_S), the ONNX
+# model runs for real (MODEL_PATH). Reports wall time, per-request latency, and event-loop
+# lag measured by a probe task: if a stage blocks the loop, the probe wakes up late.
+
+
+def _simulate_services(images: List[bytes]) -> None:
+    readings_s = float(os.getenv("BENCH_READINGS_S", "0.2"))
+    camera_s = float(os.getenv("BENCH_CAMERA_S", "0.5"))
+    retrieval_s = float(os.getenv("BENCH_RETRIEVAL_S", "0.05"))
+    gemini_s = float(os.getenv("BENCH_GEMINI_S", "2"))
+    counter = iter(range(1 << 30))
+
+    def get_panel_readings(panel_id: str = "SP-001"):
+        time.sleep(readings_s)
+        return {"panel_id": panel_id, "voltage": {"V1": 5.0, "V2": 0, "V3": 0}}
+
+    def get_esp32_image() -> bytes:
+        time.sleep(camera_s)
+        return images[next(counter) % len(images)]
+
+    def retrieve_knowledge(model_output):
+        time.sleep(retrieval_s)
+        return "query", "Simulated knowledge context.", "ready"
+
+    def generate_recommendation(*, model_output, rag_context, max_output_tokens: int = 2500) -> str:
+        time.sleep(gemini_s)
+        return "Simulated health report."
+
+    server.get_panel_readings = get_panel_readings
+    server._get_esp32_image = get_esp32_image
+    server._retrieve_knowledge = retrieve_knowledge
+    server.generate_recommendation = generate_recommendation
+    server._get_gemini_cooldown_seconds = lambda: 0
+
+
+async def _loop_lag_probe(stop: asyncio.Event, lags: List[float], interval: float = 0.01) -> None:
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        t0 = loop.time()
+        await asyncio.sleep(interval)
+        lags.append((loop.time() - t0 - interval) * 1000)
+
+
+async def _run(concurrency: int) -> None:
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=600) as client:
+
+        async def one(i: int) -> float:
+            t0 = time.perf_counter()
+            r = await client.post("/api/panel/auto-analyze", params={"panel_id": f"BENCH-{i}"})
+            if r.status_code != 200:
+                raise RuntimeError(f"auto-analyze returned {r.status_code}: {r.text[:300]}")
+            return time.perf_counter() - t0
+
+        stop, lags = asyncio.Event(), []
+        probe = asyncio.create_task(_loop_lag_probe(stop, lags))
+        t0 = time.perf_counter()
+        # The endpoint narrates each step with print(); keep the table readable.
+        with contextlib.redirect_stdout(io.StringIO()):
+            latencies = await asyncio.gather(*(one(i) for i in range(concurrency)))
+        wall = time.perf_counter() - t0
+        stop.set()
+        await probe
+
+    print(
+        f"{concurrency:>8}{wall:>9.2f}{concurrency / wall:>9.2f}{np.percentile(latencies, 50):>9.2f}"
+        f"{np.percentile(latencies, 95):>9.2f}{max(lags, default=0):>12.1f}"
+    )
+
+
+def main() -> None:
+    model_path = os.getenv("MODEL_PATH") or server.MODEL_PATH
+    if not Path(model_path).exists():
+        sys.exit(f"Model not found at {model_path}; set MODEL_PATH")
+    images = []
+    for path in sorted((PROJECT_ROOT / "captures").glob("*.jpg"))[:32]:
+        data = path.read_bytes()
+        if data[:2] == b"\xff\xd8":
+            images.append(data)
+
+    server.MODEL_PATH = model_path
+    server.inference_batcher.model_path = model_path
+    # Keep simulated captures out of captures/.
+    server.CAPTURE_DIR = Path(tempfile.mkdtemp(prefix="bench_auto_analyze_"))
+    _simulate_services(images)
+
+    levels = [int(c) for c in (os.getenv("BENCH_CONCURRENCY") or "1,8,32").split(",")]
+    print(f"{'clients':>8}{'wall s':>9}{'req/s':>9}{'p50 s':>9}{'p95 s':>9}{'loop lag ms':>12}")
+    for concurrency in levels:
+        asyncio.run(_run(concurrency))
+
+
+if __name__ == "__main__":
+    main()
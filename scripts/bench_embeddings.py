@@ -0,0 +1,81 @@
+import os
+import re
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from rag_module.chunking import chunk_text
+from rag_module.embeddings import EmbeddingModel
+
+
+def legacy_embed_texts(texts: list[str], dim: int = 384) -> np.ndarray:
+    """The original per-character implementation, kept here as the parity baseline."""
+
+    if not texts:
+        return np.zeros((0, dim), dtype="float32")
+
+    mat = np.zeros((len(texts), dim), dtype="float32")
+    for i, t in enumerate(texts):
+        if not t:
+            continue
+        for tok in re.findall(r"[a-z0-9_\-/]+", t.lower()):
+            h = 0
+            for ch in tok:
+                h = (h * 131 + ord(ch)) & 0xFFFFFFFF
+            mat[i, h % dim] += 1.0
+
+    norms = np.linalg.norm(mat, axis=1, keepdims=True)
+    norms[norms == 0.0] = 1.0
+    mat = mat / norms
+    return mat.astype("float32")
+
+
+def load_corpus() -> list[str]:
+    texts: list[str] = []
+    for folder in (PROJECT_ROOT / "knowledge", PROJECT_ROOT / "backend" / "knowledge_base"):
+        for path in sorted(folder.glob("*.txt")):
+            texts.extend(chunk_text(path.read_text(encoding="utf-8"), chunk_size=1200, chunk_overlap=200))
+    return texts
+
+
+def bench(fn, texts: list[str], repeats: int) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        fn(texts)
+        best = min(best, time.perf_counter() - t0)
+    return len(texts) / best
+
+
+def main() -> None:
+    repeats = int(os.getenv("BENCH_REPEATS", "5"))
+    scale = int(os.getenv("BENCH_SCALE", "50"))
+
+    texts = load_corpus() * scale
+    if not texts:
+        raise RuntimeError("No knowledge texts found to benchmark.")
+
+    model = EmbeddingModel()
+    new = model.embed_texts(texts)
+    old = legacy_embed_texts(texts, dim=model.dim)
+    if not np.array_equal(new.view(np.uint32), old.view(np.uint32)):
+        raise RuntimeError("Batched embeddings are not bit-identical to the legacy implementation.")
+
+    legacy_tps = bench(lambda t: legacy_embed_texts(t, dim=model.dim), texts, repeats)
+    batched_tps = bench(model.embed_texts, texts, repeats)
+    cold_tps = bench(lambda t: EmbeddingModel(dim=model.dim).embed_texts(t), texts, repeats)
+
+    print(f"texts: {len(texts)} (bit-identical: yes)")
+    print(f"legacy:          {legacy_tps:10.1f} texts/sec")
+    print(f"batched (cold):  {cold_tps:10.1f} texts/sec  ({cold_tps / legacy_tps:.1f}x)")
+    print(f"batched (warm):  {batched_tps:10.1f} texts/sec  ({batched_tps / legacy_tps:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+import asyncio
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from backend.microbatch import InferenceBatcher, batcher_settings
+from backend.onnx_infer import predict_image_bytes
+
+# Closed-loop load test: BENCH_CONCURRENCY clients each send BENCH_REQUESTS capture
+# images, either one predict_image_bytes per request on a thread pool (what the
+# endpoints did before) or through the micro-batcher.
+
+
+def _load_images(limit: int) -> List[bytes]:
+    images = []
+    for path in sorted((PROJECT_ROOT / "captures").glob("*.jpg")):
+        data = path.read_bytes()
+        # Skip error pages saved under a .jpg name.
+        if data[:2] == b"\xff\xd8":
+            images.append(data)
+        if len(images) == limit:
+            break
+    return images
+
+
+async def _run(mode: str, model_path: str, images: List[bytes], concurrency: int, requests: int) -> Dict[str, float]:
+    loop = asyncio.get_running_loop()
+    settings = batcher_settings()
+    batcher = InferenceBatcher(model_path, settings)
+    # Same number of inference threads either way: the batcher runs up to max_inflight batches at once.
+    pool = ThreadPoolExecutor(max_workers=settings.max_inflight)
+    latencies: List[float] = []
+
+    async def client(c: int) -> None:
+        for i in range(requests):
+            image = images[(c * requests + i) % len(images)]
+            t0 = time.perf_counter()
+            if mode == "batched":
+                await batcher.predict(image)
+            else:
+                await loop.run_in_executor(pool, lambda: predict_image_bytes(model_path=model_path, image_bytes=image))
+            latencies.append((time.perf_counter() - t0) * 1000)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(client(c) for c in range(concurrency)))
+    elapsed = time.perf_counter() - t0
+    pool.shutdown()
+    stats = batcher.stats()
+    return {
+        "images_per_s": len(latencies) / elapsed,
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+        "mean_batch": stats["batch_size"]["mean"] if mode == "batched" else 1.0,
+    }
+
+
+def main() -> None:
+    model_path = os.getenv("MODEL_PATH") or str(PROJECT_ROOT / "models" / "last.onnx")
+    levels = [int(c) for c in (os.getenv("BENCH_CONCURRENCY") or "1,4,16,32").split(",")]
+    requests = int(os.getenv("BENCH_REQUESTS", "20"))
+    if not Path(model_path).exists():
+        sys.exit(f"Model not found at {model_path}; set MODEL_PATH")
+    images = _load_images(int(os.getenv("BENCH_IMAGES", "64")))
+    if not images:
+        sys.exit("No JPEG captures found in captures/")
+
+    settings = batcher_settings()
+    print(
+        f"max_batch_size={settings.max_batch_size} max_wait_ms={settings.max_wait_ms:g} "
+        f"max_inflight={settings.max_inflight}, {requests} requests per client"
+    )
+    asyncio.run(_run("direct", model_path, images, 1, 3))  # warm up the session pool and decoders
+    print(f"{'clients':>8}{'mode':>9}{'img/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'batch':>8}")
+    for concurrency in levels:
+        for mode in ("direct", "batched"):
+            r = asyncio.run(_run(mode, model_path, images, concurrency, requests))
+            print(
+                f"{concurrency:>8}{mode:>9}{r['images_per_s']:>10.1f}{r['p50_ms']:>10.2f}"
+                f"{r['p95_ms']:>10.2f}{r['mean_batch']:>8.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
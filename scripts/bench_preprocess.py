@@ -0,0 +1,87 @@
+import io
+import os
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from backend.onnx_infer import INPUT_SIZE, preprocess_image
+
+
+def _legacy_preprocess(img: Image.Image) -> np.ndarray:
+    """The per-call path before settings were cached and normalization was fused (reference only)."""
+
+    img = img.convert("RGB")
+    img = img.resize((INPUT_SIZE, INPUT_SIZE))
+    arr = np.asarray(img).astype("float32") / 255.0
+    normalize = os.getenv("ONNX_NORMALIZE", "1").strip() not in ("0", "false", "FALSE", "no", "NO")
+    if normalize:
+        mean_env = os.getenv("ONNX_MEAN")
+        std_env = os.getenv("ONNX_STD")
+        mean = np.array([float(p) for p in mean_env.split(",")] if mean_env else [0.485, 0.456, 0.406], dtype="float32")
+        std = np.array([float(p) for p in std_env.split(",")] if std_env else [0.229, 0.224, 0.225], dtype="float32")
+        arr = (arr - mean) / std
+    arr = np.transpose(arr, (2, 0, 1))
+    arr = np.expand_dims(arr, axis=0)
+    return arr.astype("float32")
+
+
+def _uint8_input(img: Image.Image) -> np.ndarray:
+    """What a model prepared by scripts/prepare_onnx_model.py is fed."""
+
+    return np.asarray(img.convert("RGB").resize((INPUT_SIZE, INPUT_SIZE)))[None]
+
+
+METHODS = {
+    "legacy float": _legacy_preprocess,
+    "fused float": preprocess_image,
+    "uint8 (graph)": _uint8_input,
+}
+
+
+def _measure(fn, img: Image.Image, repeats: int):
+    fn(img)  # warm caches (settings, lazy imports)
+    times = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        fn(img)
+        times.append((time.perf_counter() - t0) * 1000)
+    times.sort()
+
+    tracemalloc.start()
+    fn(img)
+    _current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return times[len(times) // 2], peak / 1024
+
+
+def main() -> None:
+    repeats = int(os.getenv("BENCH_REPEATS", "200"))
+    width, height = (int(v) for v in os.getenv("BENCH_IMAGE_SIZE", "640x480").split("x"))
+
+    rng = np.random.default_rng(0)
+    buf = io.BytesIO()
+    Image.fromarray(rng.integers(0, 256, size=(height, width, 3), dtype=np.uint8)).save(buf, "JPEG")
+    img = Image.open(io.BytesIO(buf.getvalue()))
+    img.load()  # decode once; the benchmark covers convert/resize/normalize/transpose only
+
+    reference = _legacy_preprocess(img)
+    fused_diff = float(np.max(np.abs(preprocess_image(img) - reference)))
+
+    print(f"{width}x{height} JPEG -> {INPUT_SIZE}x{INPUT_SIZE}, median of {repeats}")
+    print(f"{'method':<16}{'p50 ms':>10}{'peak KiB':>12}")
+    for name, fn in METHODS.items():
+        p50, peak_kib = _measure(fn, img, repeats)
+        print(f"{name:<16}{p50:>10.3f}{peak_kib:>12.1f}")
+    print(f"fused vs legacy max abs diff: {fused_diff:.2e}")
+
+
+if __name__ == "__main__":
+    main()
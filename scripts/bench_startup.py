@@ -0,0 +1,86 @@
+import os
+import re
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+
+# Modules a worker must not import just by starting; they are loaded on first use
+# (see backend/lazy_imports.py and rag_module/vectorstores/__init__.py).
+DEFERRED = (
+    "google.generativeai",
+    "chromadb",
+    "faiss",
+    "onnxruntime",
+    "PIL",
+    "pdfplumber",
+    "PyPDF2",
+    "requests",
+)
+
+_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|( *)(\S+)\s*$")
+
+
+def _importtime(entry: str) -> List[Tuple[int, int, int, str]]:
+    """(self_us, cumulative_us, depth, module) for every import done by `import entry` in a fresh interpreter."""
+
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {entry}"],
+        cwd=str(PROJECT_ROOT),
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {entry} failed:\n{proc.stderr[-2000:]}")
+    rows = []
+    for line in proc.stderr.splitlines():
+        m = _LINE.match(line)
+        if m:
+            rows.append((int(m.group(1)), int(m.group(2)), len(m.group(3)) // 2, m.group(4)))
+    return rows
+
+
+def _report(entry: str, repeats: int) -> Tuple[float, Dict[str, int], List[str]]:
+    """Best-of-`repeats` total ms, cumulative us of `entry`'s direct imports, deferred modules that got imported."""
+
+    best_total = float("inf")
+    best_rows: List[Tuple[int, int, int, str]] = []
+    for _ in range(repeats):
+        rows = _importtime(entry)
+        # The entry's own line (depth 0, printed last) holds its cumulative time.
+        total = next(cum for _self, cum, depth, name in reversed(rows) if depth == 0 and name == entry) / 1000
+        if total < best_total:
+            best_total, best_rows = total, rows
+
+    children = {name: cum for _self, cum, depth, name in best_rows if depth == 1}
+    imported = {name for *_rest, name in best_rows}
+    leaked = sorted(d for d in DEFERRED if any(n == d or n.startswith(d + ".") for n in imported))
+    return best_total, children, leaked
+
+
+def main() -> None:
+    entries = (os.getenv("BENCH_ENTRIES") or "backend.main").split(",")
+    repeats = int(os.getenv("BENCH_REPEATS", "5"))
+    # Budget for `import <entry>` in a fresh interpreter, best of BENCH_REPEATS runs.
+    budget_ms = float(os.getenv("STARTUP_BUDGET_MS", "800"))
+    top = int(os.getenv("BENCH_TOP", "8"))
+
+    failed = False
+    for entry in entries:
+        total_ms, children, leaked = _report(entry, repeats)
+        within = total_ms <= budget_ms and not leaked
+        failed = failed or not within
+        status = "OK" if within else "DEFERRED MODULE IMPORTED" if leaked else "OVER BUDGET"
+        print(f"{entry}: {total_ms:.1f} ms (budget {budget_ms:.0f} ms) {status}")
+        for name, cum in sorted(children.items(), key=lambda kv: -kv[1])[:top]:
+            print(f"  {cum / 1000:>8.1f} ms  {name}")
+        if leaked:
+            print(f"  imported at startup but should be deferred: {', '.join(leaked)}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+import multiprocessing as mp
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+QUERIES = [
+    "dust accumulation cleaning schedule",
+    "bird droppings hotspot risk",
+    "electrical damage isolation procedure",
+    "physical damage cracked glass replacement",
+    "snow covered panel power loss",
+    "decision thresholds maintenance SOP",
+]
+
+
+def _peak_rss_mb() -> float:
+    try:
+        import resource
+    except ImportError:  # Windows
+        return float("nan")
+    # ru_maxrss is KiB on Linux, bytes on macOS.
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+
+
+# backend -> (store class in rag_module.vectorstores, extra constructor kwargs)
+BACKENDS = {
+    "faiss": ("FaissVectorStore", {}),
+    "chroma": ("ChromaVectorStore", {}),
+    "sparse": ("SparseVectorStore", {}),
+    "numpy-float16": ("NumpyVectorStore", {"dtype": "float16"}),
+    "numpy-int8": ("NumpyVectorStore", {"dtype": "int8"}),
+}
+
+
+def _store_class(backend: str):
+    import rag_module.vectorstores as vectorstores
+
+    # Only this backend's class: chromadb and faiss are imported on first access.
+    return getattr(vectorstores, BACKENDS[backend][0])
+
+
+def _make_store(backend: str, persist_dir: str):
+    return _store_class(backend)(persist_dir=persist_dir, **BACKENDS[backend][1])
+
+
+def _build(backend: str, persist_dir: str, scale: int) -> None:
+    from rag_module.ingest import ingest_knowledge
+
+    texts, sources = [], []
+    for folder in (PROJECT_ROOT / "knowledge", PROJECT_ROOT / "backend" / "knowledge_base"):
+        for path in sorted(folder.glob("*.txt")):
+            for i in range(scale):
+                texts.append(path.read_text(encoding="utf-8"))
+                sources.append(f"{path.name}#{i}")
+    ingest_knowledge(_make_store(backend, persist_dir), knowledge_texts=texts, sources=sources)
+
+
+def _serve(backend: str, persist_dir: str, repeats: int, queue) -> None:
+    _store_class(backend)  # keep import cost (chromadb, faiss) out of the open/RSS numbers
+
+    baseline = _peak_rss_mb()
+    t0 = time.perf_counter()
+    store = _make_store(backend, persist_dir)
+    open_ms = (time.perf_counter() - t0) * 1000
+
+    latencies = []
+    for _ in range(repeats):
+        for q in QUERIES:
+            t0 = time.perf_counter()
+            store.similarity_search(q, k=5)
+            latencies.append((time.perf_counter() - t0) * 1000)
+    latencies.sort()
+    queue.put(
+        {
+            "open_ms": open_ms,
+            "p50_ms": latencies[len(latencies) // 2],
+            "p95_ms": latencies[int(len(latencies) * 0.95)],
+            "rss_mb": _peak_rss_mb() - baseline,
+        }
+    )
+
+
+# The goal for the default (int8) NumPy store: lower p50 latency and serve RSS than
+# each baseline. float16 is reported above but not gated.
+GOAL_CANDIDATES = ("numpy-int8",)
+GOAL_BASELINES = ("faiss", "sparse")
+
+
+def _check_goal(results) -> bool:
+    """Print PASS/FAIL for every candidate/baseline/metric pair that was measured."""
+
+    ok = True
+    print()
+    for candidate in GOAL_CANDIDATES:
+        for baseline in GOAL_BASELINES:
+            if candidate not in results or baseline not in results:
+                continue
+            for metric, unit in (("p50_ms", "ms"), ("rss_mb", "MB")):
+                ours, theirs = results[candidate][metric], results[baseline][metric]
+                passed = ours < theirs
+                ok = ok and passed
+                verdict = "PASS" if passed else "FAIL"
+                print(f"{verdict}  {candidate} {metric} {ours:.3f} {unit} vs {baseline} {theirs:.3f} {unit}")
+    return ok
+
+
+def main() -> None:
+    scale = int(os.getenv("BENCH_SCALE", "20"))
+    repeats = int(os.getenv("BENCH_REPEATS", "200"))
+    backends = (os.getenv("BENCH_BACKENDS") or "faiss,chroma,sparse,numpy-float16,numpy-int8").split(",")
+
+    ctx = mp.get_context("spawn")
+    results = {}
+    print(f"{'backend':<15}{'open ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'serve RSS MB':>14}")
+    for backend in backends:
+        with tempfile.TemporaryDirectory() as persist_dir:
+            # Build in one process and serve from a fresh one, as a restarted worker would.
+            builder = ctx.Process(target=_build, args=(backend, persist_dir, scale))
+            builder.start()
+            builder.join()
+            if builder.exitcode != 0:
+                print(f"{backend:<15}  skipped (backend not available)")
+                continue
+
+            queue = ctx.Queue()
+            server = ctx.Process(target=_serve, args=(backend, persist_dir, repeats, queue))
+            server.start()
+            server.join()
+            if server.exitcode != 0:
+                print(f"{backend:<15}  failed")
+                continue
+            r = results[backend] = queue.get()
+            print(f"{backend:<15}{r['open_ms']:>10.1f}{r['p50_ms']:>10.3f}{r['p95_ms']:>10.3f}{r['rss_mb']:>14.1f}")
+
+    if not _check_goal(results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
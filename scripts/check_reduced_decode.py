@@ -0,0 +1,91 @@
+import os
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from backend.onnx_infer import INPUT_SIZE, _reduce_for_input, predict_rgb_arrays
+
+# Parity and cost of the reduced-scale decode (JPEG draft / reduce) against a full
+# decode + resize, over the stored captures.
+
+
+def _decode(path: Path, *, reduced: bool):
+    """(224x224x3 uint8, decode+resize ms, decoded buffer KiB) for one file."""
+
+    t0 = time.perf_counter()
+    img = Image.open(path)
+    if reduced:
+        img = _reduce_for_input(img)
+    img = img.convert("RGB")
+    # The decoded bitmap is the peak allocation per image (PIL's own allocator, invisible to tracemalloc).
+    decoded_kib = img.width * img.height * len(img.getbands()) / 1024
+    rgb = np.asarray(img.resize((INPUT_SIZE, INPUT_SIZE), Image.Resampling.BICUBIC))
+    return rgb, (time.perf_counter() - t0) * 1000, decoded_kib
+
+
+def main() -> None:
+    captures = Path(os.getenv("CAPTURES_DIR") or PROJECT_ROOT / "captures")
+    limit = int(os.getenv("CHECK_LIMIT", "0"))
+    model_path = os.getenv("MODEL_PATH") or str(PROJECT_ROOT / "models" / "last.onnx")
+
+    paths = sorted(p for p in captures.iterdir() if p.suffix.lower() in (".jpg", ".jpeg", ".png"))
+    if limit:
+        paths = paths[:limit]
+    if not paths:
+        sys.exit(f"No captures found in {captures}")
+
+    full, reduced = [], []
+    stats = {"full": [[], []], "reduced": [[], []]}
+    skipped = 0
+    failures = []
+    for path in paths:
+        try:
+            decoded = {"full": _decode(path, reduced=False)}
+        except (OSError, ValueError):
+            # e.g. an error page saved under a .jpg name by a failed camera fetch
+            skipped += 1
+            continue
+        try:
+            decoded["reduced"] = _decode(path, reduced=True)
+        except Exception as e:
+            # The file decodes fully, so this is a bug in the reduced path.
+            failures.append((path, e))
+            continue
+        for name, (rgb, ms, kib) in decoded.items():
+            (full if name == "full" else reduced).append(rgb)
+            stats[name][0].append(ms)
+            stats[name][1].append(kib)
+    for path, e in failures:
+        print(f"FAIL {path.name}: reduced decode raised {type(e).__name__}: {e}")
+    if not full:
+        sys.exit(f"No decodable captures in {captures}" if not failures else 1)
+
+    print(f"{len(full)} images from {captures} ({skipped} unreadable skipped, {len(failures)} failed)")
+    print(f"{'decode':<10}{'p50 ms':>10}{'mean ms':>10}{'peak KiB/img':>14}")
+    for name, (times, kib) in stats.items():
+        print(f"{name:<10}{np.median(times):>10.3f}{np.mean(times):>10.3f}{np.max(kib):>14.1f}")
+
+    diffs = [np.abs(a.astype(np.int16) - b.astype(np.int16)) for a, b in zip(full, reduced)]
+    print(f"pixel diff: mean {np.mean([d.mean() for d in diffs]):.3f}, max {max(int(d.max()) for d in diffs)} (0-255)")
+
+    if not Path(model_path).exists():
+        print(f"Model not found at {model_path}; skipping prediction parity")
+        sys.exit(1 if failures else 0)
+    preds_full = predict_rgb_arrays(model_path=model_path, rgbs=full)
+    preds_reduced = predict_rgb_arrays(model_path=model_path, rgbs=reduced)
+    agree = sum(a[0] == b[0] for a, b in zip(preds_full, preds_reduced))
+    conf_diff = max(abs(a[1] - b[1]) for a, b in zip(preds_full, preds_reduced))
+    print(f"top-1 agreement: {agree}/{len(full)} ({agree / len(full):.1%}), max confidence diff {conf_diff:.4f}")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
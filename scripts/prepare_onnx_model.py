@@ -0,0 +1,149 @@
+import argparse
+import json
+import shutil
+import sys
+from pathlib import Path
+
+import numpy as np
+import onnx
+from onnx import TensorProto, helper, numpy_helper
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from backend.onnx_infer import INPUT_SIZE, PreprocessSettings, settings_from_env
+
+# Name of the raw-pixel input added in front of the original graph.
+PIXELS_INPUT = "pixels"
+
+
+def fold_preprocessing(model: onnx.ModelProto, settings: PreprocessSettings) -> onnx.ModelProto:
+    """Prepend Cast -> Mul(scale) -> Add(offset) -> Transpose(NHWC->NCHW) to a float NCHW classifier.
+
+    The returned model takes `pixels`, an N x H x W x 3 uint8 tensor (the resized RGB
+    image as PIL/numpy hand it over), and computes `(x / 255 - mean) / std` itself.
+    """
+
+    graph = model.graph
+    initializer_names = {init.name for init in graph.initializer}
+    inputs = [i for i in graph.input if i.name not in initializer_names]
+    if len(inputs) != 1:
+        raise ValueError(f"Expected a single image input, got: {[i.name for i in inputs]}")
+    image_input = inputs[0]
+
+    tensor_type = image_input.type.tensor_type
+    if tensor_type.elem_type == TensorProto.UINT8:
+        raise ValueError("Model already takes uint8 pixels; nothing to do")
+    if tensor_type.elem_type != TensorProto.FLOAT:
+        raise ValueError(f"Expected a float32 input, got elem_type {tensor_type.elem_type}")
+    dims = list(tensor_type.shape.dim)
+    if len(dims) != 4 or dims[1].dim_value not in (0, 3):
+        raise ValueError(f"Expected an N x 3 x H x W input, got: {dims}")
+
+    batch = dims[0].dim_param or dims[0].dim_value or "N"
+    height = dims[2].dim_value or INPUT_SIZE
+    width = dims[3].dim_value or INPUT_SIZE
+
+    scale = numpy_helper.from_array(settings.scale.astype(np.float32), "preprocess_scale")
+    offset = numpy_helper.from_array(settings.offset.astype(np.float32), "preprocess_offset")
+    nodes = [
+        helper.make_node("Cast", [PIXELS_INPUT], ["preprocess_float"], to=TensorProto.FLOAT),
+        # scale/offset have shape [3] and broadcast over the trailing channel axis of NHWC.
+        helper.make_node("Mul", ["preprocess_float", scale.name], ["preprocess_scaled"]),
+        helper.make_node("Add", ["preprocess_scaled", offset.name], ["preprocess_normalized"]),
+        helper.make_node("Transpose", ["preprocess_normalized"], [image_input.name], perm=[0, 3, 1, 2]),
+    ]
+
+    prepared = onnx.ModelProto()
+    prepared.CopyFrom(model)
+    g = prepared.graph
+    original_nodes = list(g.node)
+    del g.node[:]
+    g.node.extend(nodes + original_nodes)
+    g.initializer.extend([scale, offset])
+
+    kept_inputs = [i for i in g.input if i.name != image_input.name]
+    del g.input[:]
+    g.input.append(helper.make_tensor_value_info(PIXELS_INPUT, TensorProto.UINT8, [batch, height, width, 3]))
+    g.input.extend(kept_inputs)
+
+    helper.set_model_props(
+        prepared,
+        {
+            **{p.key: p.value for p in model.metadata_props},
+            "preprocessing": json.dumps(
+                {
+                    "input": "NHWC uint8",
+                    "normalize": settings.normalize,
+                    "mean": settings.mean.tolist(),
+                    "std": settings.std.tolist(),
+                }
+            ),
+        },
+    )
+    onnx.checker.check_model(prepared)
+    return prepared
+
+
+def _max_output_diff(original_path: Path, prepared_path: Path, settings: PreprocessSettings) -> float:
+    import onnxruntime as ort
+
+    original = ort.InferenceSession(str(original_path), providers=["CPUExecutionProvider"])
+    prepared = ort.InferenceSession(str(prepared_path), providers=["CPUExecutionProvider"])
+    # Fixed-batch exports only accept their own batch size.
+    batch = original.get_inputs()[0].shape[0]
+    batch = batch if isinstance(batch, int) and batch > 0 else 2
+
+    rng = np.random.default_rng(0)
+    pixels = rng.integers(0, 256, size=(batch, INPUT_SIZE, INPUT_SIZE, 3), dtype=np.uint8)
+    x = (pixels.astype(np.float32) / 255.0 - (settings.mean if settings.normalize else 0.0)) / (
+        settings.std if settings.normalize else 1.0
+    )
+    x = np.ascontiguousarray(x.transpose(0, 3, 1, 2), dtype=np.float32)
+
+    expected = original.run(None, {original.get_inputs()[0].name: x})[0]
+    actual = prepared.run(None, {PIXELS_INPUT: pixels})[0]
+    return float(np.max(np.abs(expected - actual)))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Fold pixel scaling, mean/std normalization and the NHWC->NCHW transpose into an ONNX classifier."
+    )
+    parser.add_argument("model", nargs="?", default=str(PROJECT_ROOT / "models" / "last.onnx"))
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--output", help="Where to write the prepared model (default: <name>.prepared.onnx next to MODEL)")
+    target.add_argument(
+        "--in-place",
+        action="store_true",
+        help="Overwrite MODEL with the prepared model, keeping the original as <name>.float.onnx",
+    )
+    args = parser.parse_args()
+
+    model_path = Path(args.model)
+    # Same ONNX_NORMALIZE / ONNX_MEAN / ONNX_STD the runtime would apply to a float model.
+    settings = settings_from_env()
+    try:
+        prepared = fold_preprocessing(onnx.load(str(model_path)), settings)
+    except ValueError as e:
+        sys.exit(f"{model_path}: {e}")
+
+    if args.in_place:
+        output_path, original_path = model_path, model_path.with_suffix(".float.onnx")
+        shutil.copy2(model_path, original_path)
+    else:
+        output_path = Path(args.output) if args.output else model_path.with_suffix(".prepared.onnx")
+        original_path = model_path
+    onnx.save(prepared, str(output_path))
+    print(f"Wrote {output_path} (input: {PIXELS_INPUT}, NHWC uint8); original model: {original_path}")
+
+    try:
+        diff = _max_output_diff(original_path, output_path, settings)
+    except ImportError:
+        return
+    print(f"Max output difference vs float preprocessing: {diff:.2e}")
+
+
+if __name__ == "__main__":
+    main()
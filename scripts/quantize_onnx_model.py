@@ -0,0 +1,187 @@
+import argparse
+import json
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+import onnxruntime as ort
+from onnxruntime.quantization import (
+    CalibrationDataReader,
+    QuantFormat,
+    QuantType,
+    quantize_dynamic,
+    quantize_static,
+)
+from onnxruntime.quantization.shape_inference import quant_pre_process
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from backend.onnx_infer import INPUT_SIZE, _normalize_into, load_input_rgb, predict_rgb_arrays, variant_path
+
+
+def _load_captures(captures: Path) -> List[np.ndarray]:
+    """Model-input RGB arrays for every decodable image in `captures` (sorted by name)."""
+
+    rgbs = []
+    for path in sorted(p for p in captures.iterdir() if p.suffix.lower() in (".jpg", ".jpeg", ".png")):
+        try:
+            rgbs.append(load_input_rgb(path))
+        except ValueError:
+            # e.g. an error page saved under a .jpg name by a failed camera fetch
+            continue
+    return rgbs
+
+
+class CapturesCalibrationReader(CalibrationDataReader):
+    """Feeds capture images to `quantize_static`, preprocessed exactly as at inference time."""
+
+    def __init__(self, model_path: str, rgbs: List[np.ndarray]):
+        sess = ort.InferenceSession(model_path, providers=["CPUExecutionProvider"])
+        inp = sess.get_inputs()[0]
+        self.input_name = inp.name
+        self.takes_uint8 = inp.type == "tensor(uint8)"
+        batch = inp.shape[0] if inp.shape else None
+        # Fixed-batch exports only accept their own batch size; trailing images are dropped.
+        self.batch_size = batch if isinstance(batch, int) and batch > 0 else 1
+        self.rgbs = rgbs
+        self._batches: Optional[Iterator[Dict[str, np.ndarray]]] = None
+
+    def _iter_batches(self) -> Iterator[Dict[str, np.ndarray]]:
+        for start in range(0, len(self.rgbs) - self.batch_size + 1, self.batch_size):
+            chunk = self.rgbs[start : start + self.batch_size]
+            if self.takes_uint8:
+                x = np.stack(chunk)
+            else:
+                x = np.empty((len(chunk), 3, INPUT_SIZE, INPUT_SIZE), dtype="float32")
+                for i, rgb in enumerate(chunk):
+                    _normalize_into(rgb, x[i])
+            yield {self.input_name: x}
+
+    def get_next(self) -> Optional[Dict[str, np.ndarray]]:
+        if self._batches is None:
+            self._batches = self._iter_batches()
+        return next(self._batches, None)
+
+    def rewind(self) -> None:
+        self._batches = None
+
+
+def quantize(model_path: Path, output_path: Path, *, mode: str, calibration: List[np.ndarray]) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        # Shape inference + graph cleanup first, as onnxruntime recommends before quantizing.
+        # ONNX's own shape inference covers a fixed-size CNN; the symbolic pass needs sympy.
+        prepared = Path(tmp) / "preprocessed.onnx"
+        try:
+            quant_pre_process(str(model_path), str(prepared), skip_symbolic_shape=True)
+        except Exception as e:
+            print(f"Pre-processing skipped ({e}); quantizing the model as is")
+            prepared = model_path
+
+        if mode == "dynamic":
+            # Weights are quantized offline, activations per batch at run time; no calibration data.
+            quantize_dynamic(str(prepared), str(output_path), weight_type=QuantType.QUInt8)
+        else:
+            quantize_static(
+                str(prepared),
+                str(output_path),
+                CapturesCalibrationReader(str(prepared), calibration),
+                quant_format=QuantFormat.QDQ,
+                per_channel=True,
+                activation_type=QuantType.QUInt8,
+                weight_type=QuantType.QInt8,
+            )
+
+
+def _latencies_ms(model_path: str, variant: str, rgbs: List[np.ndarray], repeats: int) -> List[float]:
+    """Single-image predict latencies through the serving path (session pool, IO binding, postprocess)."""
+
+    predict_rgb_arrays(model_path=model_path, rgbs=rgbs[:1], variant=variant)  # warm up the session
+    times = []
+    for _ in range(repeats):
+        for rgb in rgbs:
+            t0 = time.perf_counter()
+            predict_rgb_arrays(model_path=model_path, rgbs=[rgb], variant=variant)
+            times.append((time.perf_counter() - t0) * 1000)
+    return times
+
+
+def compare(model_path: Path, rgbs: List[np.ndarray], *, repeats: int) -> Dict[str, object]:
+    """Top-1 agreement and latency of the int8 variant against fp32 on `rgbs`."""
+
+    preds = {v: predict_rgb_arrays(model_path=str(model_path), rgbs=rgbs, variant=v) for v in ("fp32", "int8")}
+    agree = sum(a[0] == b[0] for a, b in zip(preds["fp32"], preds["int8"]))
+    conf_diff = [abs(a[1] - b[1]) for a, b in zip(preds["fp32"], preds["int8"])]
+
+    report: Dict[str, object] = {
+        "images": len(rgbs),
+        "top1_agreement": agree / len(rgbs),
+        "top1_disagreements": len(rgbs) - agree,
+        "confidence_abs_diff_mean": float(np.mean(conf_diff)),
+        "confidence_abs_diff_max": float(np.max(conf_diff)),
+    }
+    for variant in ("fp32", "int8"):
+        times = _latencies_ms(str(model_path), variant, rgbs, repeats)
+        report[variant] = {
+            "path": variant_path(model_path, variant),
+            "size_bytes": Path(variant_path(model_path, variant)).stat().st_size,
+            "latency_ms_p50": float(np.percentile(times, 50)),
+            "latency_ms_p95": float(np.percentile(times, 95)),
+            "latency_ms_mean": float(np.mean(times)),
+        }
+    report["speedup_p50"] = report["fp32"]["latency_ms_p50"] / report["int8"]["latency_ms_p50"]
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Quantize the defect classifier to INT8 (models/last.int8.onnx) and compare it with fp32."
+    )
+    parser.add_argument("model", nargs="?", default=str(PROJECT_ROOT / "models" / "last.onnx"))
+    parser.add_argument(
+        "--mode",
+        choices=("static", "dynamic"),
+        default="static",
+        help="static: QDQ with activation ranges calibrated on captures (default); dynamic: activation ranges computed at run time, no calibration",
+    )
+    parser.add_argument("--captures", default=str(PROJECT_ROOT / "captures"))
+    parser.add_argument("--calibration-size", type=int, default=100, help="Captures sampled for calibration")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeats", type=int, default=3, help="Latency passes over the evaluation images")
+    parser.add_argument("--report", help="Where to write the JSON report (default: <int8 model>.report.json)")
+    args = parser.parse_args()
+
+    model_path = Path(args.model)
+    if not model_path.exists():
+        sys.exit(f"Model not found: {model_path}")
+    output_path = Path(variant_path(model_path, "int8"))
+
+    rgbs = _load_captures(Path(args.captures))
+    if not rgbs:
+        sys.exit(f"No decodable captures in {args.captures}")
+    calibration = random.Random(args.seed).sample(rgbs, min(args.calibration_size, len(rgbs)))
+
+    t0 = time.perf_counter()
+    quantize(model_path, output_path, mode=args.mode, calibration=calibration)
+    print(f"Wrote {output_path} ({args.mode}, {time.perf_counter() - t0:.1f}s)")
+
+    report = {"mode": args.mode, "calibration_images": len(calibration) if args.mode == "static" else 0}
+    report.update(compare(model_path, rgbs, repeats=args.repeats))
+    report_path = Path(args.report) if args.report else output_path.with_suffix(".report.json")
+    report_path.write_text(json.dumps(report, indent=2), encoding="utf-8")
+
+    print(f"top-1 agreement: {report['top1_agreement']:.1%} over {report['images']} captures")
+    print(f"{'variant':<8}{'size KiB':>10}{'p50 ms':>10}{'p95 ms':>10}")
+    for variant in ("fp32", "int8"):
+        r = report[variant]
+        print(f"{variant:<8}{r['size_bytes'] / 1024:>10.1f}{r['latency_ms_p50']:>10.3f}{r['latency_ms_p95']:>10.3f}")
+    print(f"Report: {report_path}. Serve it with ONNX_MODEL_VARIANT=int8.")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,15 +5,18 @@ Runs on port 8000 with CORS enabled for React frontend on port 3000
 
 import os
 import sys
+import asyncio
 import logging
+import threading
 from io import BytesIO
-from typing import Optional
+from typing import List, Optional
 from pathlib import Path
 from dotenv import load_dotenv
 
 import cv2
 import numpy as np
 from fastapi import FastAPI, UploadFile, File, Form, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 import json
@@ -36,19 +39,22 @@ sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
 
 # Import ML components
 try:
-    from backend.onnx_infer import predict_image_bytes
+    from backend.onnx_infer import predict_image_bytes, predict_images_bytes
+    from backend.microbatch import InferenceBatcher
     logger.info("✓ Imported ONNX inference module")
 except ImportError as e:
     logger.warning(f"✗ Could not import onnx_infer: {e}")
     predict_image_bytes = None
+    predict_images_bytes = None
+    InferenceBatcher = None
 
 try:
-    from rag_module.query import query_rag, build_query_from_ml_output
-    from rag_module.vectorstores.faiss_store import FAISSStore
+    from rag_module.query import build_query_from_ml_output, format_retrieved_context
+    from rag_module.vectorstores import FaissVectorStore
     logger.info("✓ Imported RAG modules")
 except ImportError as e:
     logger.warning(f"✗ Could not import RAG modules: {e}")
-    query_rag = None
+    FaissVectorStore = None
 
 try:
     import google.generativeai as genai
@@ -97,6 +103,9 @@ logger.info(f"Model path: {ONNX_MODEL_PATH}")
 logger.info(f"FAISS path: {FAISS_PATH}")
 logger.info(f"Model exists: {os.path.exists(ONNX_MODEL_PATH)}")
 
+# Concurrent /analyze requests share batched ONNX runs (MICROBATCH_* settings)
+inference_batcher = InferenceBatcher(ONNX_MODEL_PATH) if InferenceBatcher else None
+
 
 def resize_image(image_bytes: bytes, max_width: int = 640, max_height: int = 640) -> bytes:
     """
@@ -151,6 +160,77 @@ async def health_check():
     }
 
 
+# One FAISS store shared by every request: opening it is a full load and may compact
+# through shared files, so concurrent requests must not each open their own.
+_rag_store = None
+_rag_store_lock = threading.Lock()
+
+
+def _get_rag_store():
+    """The shared FAISS store, opened on first use (blocking)"""
+    global _rag_store
+    with _rag_store_lock:
+        if _rag_store is None:
+            _rag_store = FaissVectorStore(persist_dir=FAISS_PATH)
+        return _rag_store
+
+
+def _rag_contexts(model_outputs: List[dict]) -> List[str]:
+    """
+    Knowledge base context per prediction, or placeholders if RAG is unavailable
+    
+    All queries go through one batched search on the shared store.
+    Blocking: call it through run_in_threadpool from async endpoints.
+    """
+    rag_contexts = ["Knowledge base not available"] * len(model_outputs)
+    if FaissVectorStore and os.path.exists(FAISS_PATH):
+        logger.info(f"Querying RAG for {len(model_outputs)} prediction(s)...")
+        try:
+            store = _get_rag_store()
+            queries = [build_query_from_ml_output(model_output) for model_output in model_outputs]
+            rag_contexts = [format_retrieved_context(chunks) for chunks in store.similarity_search_batch(queries, k=5)]
+            logger.info("[RAG] Context retrieved successfully")
+        except Exception as e:
+            logger.warning(f"[RAG] Query failed: {e}")
+    return rag_contexts
+
+
+def _gemini_analysis(panel_id: str, fault: str, confidence: float, top_predictions: list, rag_context: str) -> str:
+    """Gemini write-up for one prediction, or a placeholder if Gemini is unavailable (blocking, up to 30 s)"""
+    gemini_analysis = "Analysis unavailable"
+    if genai and GEMINI_API_KEY:
+        logger.info("Generating Gemini analysis...")
+        try:
+            model = genai.GenerativeModel('gemini-pro')
+            prompt = f"""You are a solar panel expert analyzing defect detection results.
+
+Panel ID: {panel_id}
+Detected Defect: {fault}
+Confidence: {confidence*100:.2f}%
+
+Top Predictions:
+{json.dumps(top_predictions, indent=2)}
+
+Knowledge Base Context:
+{rag_context}
+
+Based on this information, provide a brief analysis including:
+1. What defect was detected and confidence level
+2. Potential impact on panel performance
+3. Recommended maintenance action
+4. Urgency level (Low/Medium/High)"""
+            
+            response = model.generate_content(prompt, timeout=30)
+            gemini_analysis = response.text
+            logger.info("[Gemini] Analysis generated successfully")
+        except Exception as e:
+            logger.warning(f"[Gemini] Analysis failed: {e}")
+            gemini_analysis = f"Error generating analysis: {str(e)}"
+    else:
+        logger.warning("[Gemini] Not configured or unavailable")
+    return gemini_analysis
+
+
 async def _analyze_image_impl(
     image: UploadFile = File(...),
     panel_id: str = Form("Unknown")
@@ -189,17 +269,13 @@ async def _analyze_image_impl(
         logger.info(f"Resized image size: {len(image_bytes)} bytes")
         
         # ML Inference
-        if not predict_image_bytes:
+        if not inference_batcher:
             logger.error("ML model not available")
             raise HTTPException(status_code=503, detail="ML model service unavailable")
         
         logger.info("Running ML inference...")
         try:
-            fault, confidence, top_predictions = predict_image_bytes(
-                model_path=ONNX_MODEL_PATH,
-                image_bytes=image_bytes,
-                top_k=3
-            )
+            fault, confidence, top_predictions = await inference_batcher.predict(image_bytes, top_k=3)
             logger.info(f"[ML] Detected: {fault}, Confidence: {confidence:.4f}")
         except Exception as e:
             logger.error(f"[ML] Inference failed: {e}")
@@ -213,49 +289,11 @@ async def _analyze_image_impl(
             'top_predictions': top_predictions
         }
         
-        # RAG Query
-        rag_context = "Knowledge base not available"
-        if query_rag and os.path.exists(FAISS_PATH):
-            logger.info("Querying RAG...")
-            try:
-                store = FAISSStore(index_path=FAISS_PATH)
-                rag_context = query_rag(store, model_output=model_output, k=5)
-                logger.info("[RAG] Context retrieved successfully")
-            except Exception as e:
-                logger.warning(f"[RAG] Query failed: {e}")
-        
-        # Gemini Analysis
-        gemini_analysis = "Analysis unavailable"
-        if genai and GEMINI_API_KEY:
-            logger.info("Generating Gemini analysis...")
-            try:
-                model = genai.GenerativeModel('gemini-pro')
-                prompt = f"""You are a solar panel expert analyzing defect detection results.
-
-Panel ID: {panel_id}
-Detected Defect: {fault}
-Confidence: {confidence*100:.2f}%
-
-Top Predictions:
-{json.dumps(top_predictions, indent=2)}
-
-Knowledge Base Context:
-{rag_context}
-
-Based on this information, provide a brief analysis including:
-1. What defect was detected and confidence level
-2. Potential impact on panel performance
-3. Recommended maintenance action
-4. Urgency level (Low/Medium/High)"""
-                
-                response = model.generate_content(prompt, timeout=30)
-                gemini_analysis = response.text
-                logger.info("[Gemini] Analysis generated successfully")
-            except Exception as e:
-                logger.warning(f"[Gemini] Analysis failed: {e}")
-                gemini_analysis = f"Error generating analysis: {str(e)}"
-        else:
-            logger.warning("[Gemini] Not configured or unavailable")
+        # Retrieval and Gemini block; run them off the event loop
+        rag_context = (await run_in_threadpool(_rag_contexts, [model_output]))[0]
+        gemini_analysis = await run_in_threadpool(
+            _gemini_analysis, panel_id, fault, confidence, top_predictions, rag_context
+        )
         
         # Return results
         result = {
@@ -281,6 +319,14 @@ Based on this information, provide a brief analysis including:
         raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
 
 
+@app.get("/inference-stats")
+async def inference_stats():
+    """Micro-batcher counters and histograms (batch size, queue depth at dispatch, latency)"""
+    if not inference_batcher:
+        raise HTTPException(status_code=503, detail="ML model service unavailable")
+    return inference_batcher.stats()
+
+
 @app.get("/")
 async def root():
     """Root endpoint with API info"""
@@ -288,7 +334,9 @@ async def root():
         "service": "Solar Panel Image Analysis",
         "endpoints": {
             "health": "GET /health",
-            "analyze": "POST /analyze-image"
+            "analyze": "POST /analyze-image",
+            "analyze_batch": "POST /analyze-batch",
+            "inference_stats": "GET /inference-stats"
         },
         "status": "running on port 8000"
     }
@@ -312,6 +360,115 @@ async def analyze_image(
     return await _analyze_image_impl(image, panel_id)
 
 
+@app.post("/analyze-batch")
+async def analyze_batch(
+    images: List[UploadFile] = File(...),
+    panel_ids: Optional[str] = Form(None),
+    include_gemini: bool = Form(False)
+):
+    """
+    Analyze several panel images (e.g. a full row) with one batched ML inference call
+    
+    Args:
+        images: Image files, one per panel
+        panel_ids: Comma-separated panel identifiers in the same order (default: image filenames)
+        include_gemini: Also generate a Gemini analysis per image (one API call each)
+    
+    Returns:
+        JSON with one result per image, in upload order
+    """
+    logger.info(f"[ANALYZE-BATCH] Received {len(images)} images")
+    
+    try:
+        if not images:
+            raise HTTPException(status_code=400, detail="No image files provided")
+        
+        ids = [p.strip() for p in panel_ids.split(',')] if panel_ids else [img.filename or "Unknown" for img in images]
+        if len(ids) != len(images):
+            raise HTTPException(
+                status_code=400,
+                detail=f"Got {len(ids)} panel_ids for {len(images)} images"
+            )
+        
+        batch_bytes = []
+        for img, panel_id in zip(images, ids):
+            image_bytes = await img.read()
+            if not image_bytes:
+                raise HTTPException(status_code=400, detail=f"Image file for panel {panel_id} is empty")
+            batch_bytes.append(await run_in_threadpool(resize_image, image_bytes, max_width=640, max_height=640))
+        
+        if not predict_images_bytes:
+            logger.error("ML model not available")
+            raise HTTPException(status_code=503, detail="ML model service unavailable")
+        
+        # Every blocking stage below (inference, retrieval, Gemini) runs on the threadpool,
+        # so other requests keep being served while a batch is in progress
+        logger.info(f"Running batched ML inference on {len(batch_bytes)} images...")
+        try:
+            predictions = await run_in_threadpool(
+                predict_images_bytes,
+                model_path=ONNX_MODEL_PATH,
+                images=batch_bytes,
+                top_k=3
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except Exception as e:
+            logger.error(f"[ML] Batched inference failed: {e}")
+            raise HTTPException(status_code=500, detail=f"ML inference failed: {str(e)}")
+        
+        model_outputs = []
+        for panel_id, (fault, confidence, top_predictions) in zip(ids, predictions):
+            logger.info(f"[ML] {panel_id}: {fault}, Confidence: {confidence:.4f}")
+            model_outputs.append({
+                'panel_id': panel_id,
+                'primary_defect': fault,
+                'confidence': float(confidence),
+                'top_predictions': top_predictions
+            })
+        
+        # One store open and one batched search for the whole batch
+        rag_contexts = await run_in_threadpool(_rag_contexts, model_outputs)
+        
+        results = []
+        for model_output, rag_context in zip(model_outputs, rag_contexts):
+            results.append({
+                'panel_id': model_output['panel_id'],
+                'ml_result': {
+                    'fault_type': model_output['primary_defect'],
+                    'confidence': model_output['confidence'],
+                    'top_predictions': model_output['top_predictions']
+                },
+                'rag_context': rag_context[:500],  # Truncate for response size
+            })
+        
+        if include_gemini:
+            # Gemini calls for the batch run concurrently, one thread each
+            analyses = await asyncio.gather(*(
+                run_in_threadpool(
+                    _gemini_analysis,
+                    mo['panel_id'], mo['primary_defect'], mo['confidence'], mo['top_predictions'], rag_context
+                )
+                for mo, rag_context in zip(model_outputs, rag_contexts)
+            ))
+            for result, gemini_analysis in zip(results, analyses):
+                result['gemini_analysis'] = gemini_analysis
+        
+        logger.info(f"[ANALYZE-BATCH] Analysis complete for {len(results)} panels")
+        return JSONResponse(status_code=200, content={
+            'success': True,
+            'count': len(results),
+            'results': results,
+            'timestamp': __import__('datetime').datetime.now().isoformat()
+        })
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"[ANALYZE-BATCH] Unexpected error: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
+
+
 if __name__ == "__main__":
     import uvicorn
     
@@ -0,0 +1,28 @@
+import uuid
+
+import pytest
+
+pytest.importorskip("chromadb")
+
+from rag_module.vectorstores import ChromaVectorStore
+
+
+def test_first_write_per_source_drops_legacy_uuid_rows(tmp_path):
+    store = ChromaVectorStore(persist_dir=str(tmp_path))
+    texts = ["Rinse dusty panels.", "Brush off snow.", "Unrelated manual."]
+    metadatas = [{"source": "a.txt"}, {"source": "a.txt"}, {"source": "b.txt"}]
+    # Rows as written before ids were content hashes.
+    store._collection.add(
+        ids=[str(uuid.uuid4()) for _ in texts],
+        documents=texts,
+        metadatas=metadatas,
+        embeddings=store.embedding_model.embed_texts(texts).tolist(),
+    )
+
+    store.add_texts(texts[:2], metadatas=metadatas[:2])
+    assert store.count() == 3
+    store.add_texts(texts[:2], metadatas=metadatas[:2])
+    assert store.count() == 3
+
+    # b.txt was not re-ingested, so its legacy row stays.
+    assert len(store._collection.get(where={"source": "b.txt"}, include=[])["ids"]) == 1
@@ -0,0 +1,32 @@
+import pytest
+
+from rag_module.chunking import chunk_spans, chunk_text, clean_pages, iter_chunks
+from rag_module.ingest import iter_document_chunks
+
+PAGES = [
+    "Dust reduces output.   \n\n\nRinse with water.\n",
+    "",
+    "  Snow: brush it off.\n" + "Long procedure line. " * 40 + "\n",
+    "Bird-drop: spot clean.\n\n",
+]
+
+
+@pytest.mark.parametrize("chunk_size, chunk_overlap", [(50, 10), (120, 30), (1200, 200)])
+def test_streaming_chunks_match_the_whole_text_chunker(chunk_size, chunk_overlap):
+    streamed = list(iter_chunks(iter(PAGES), chunk_size=chunk_size, chunk_overlap=chunk_overlap))
+    cleaned, _offsets = clean_pages(PAGES)
+
+    spans = chunk_spans(cleaned, chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    assert [(start, end) for start, end, _ in streamed] == spans
+    assert [text for _, _, text in streamed] == chunk_text("".join(PAGES), chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+
+
+def test_chunks_carry_their_pages():
+    _cleaned, offsets = clean_pages(PAGES)
+    chunks = list(iter_document_chunks(iter(PAGES), source="sop.pdf", chunk_size=60, chunk_overlap=10, page_offsets=offsets))
+
+    assert chunks[0].metadata["page_start"] == 1
+    assert chunks[-1].metadata["page_end"] == 4
+    bird = next(ch for ch in chunks if "Bird-drop" in ch.text)
+    assert bird.metadata["page_end"] == 4
+    assert [ch.metadata["chunk_index"] for ch in chunks] == list(range(len(chunks)))
@@ -0,0 +1,75 @@
+import numpy as np
+
+from rag_module.embedding_cache import CachedEmbeddingModel
+from rag_module.embeddings import EmbeddingModel
+
+
+class CountingModel(EmbeddingModel):
+    def __init__(self, dim=64, version="hashed-bow-v1"):
+        super().__init__(dim=dim)
+        self.version = version
+        self.embedded = []
+
+    def embed_texts(self, texts):
+        self.embedded.extend(texts)
+        return super().embed_texts(texts)
+
+
+def test_memory_then_disk_hits_match_fresh_vectors(tmp_path):
+    inner = CountingModel()
+    cache = CachedEmbeddingModel(inner, cache_dir=str(tmp_path))
+    texts = ["dust on glass", "snow load", "dust on glass"]
+
+    first = cache.embed_texts(texts)
+    assert inner.embedded == ["dust on glass", "snow load"]
+    assert np.allclose(first, EmbeddingModel(dim=64).embed_texts(texts))
+
+    assert np.array_equal(cache.embed_texts(["snow load"]), first[1:2])
+    assert cache.stats()["hits"] == 1 and len(inner.embedded) == 2
+
+    reopened_inner = CountingModel()
+    reopened = CachedEmbeddingModel(reopened_inner, cache_dir=str(tmp_path))
+    assert np.array_equal(reopened.embed_texts(texts), first)
+    assert reopened_inner.embedded == []
+    assert reopened.stats()["disk_hits"] == 2
+
+
+def test_version_or_dim_change_invalidates_entries(tmp_path):
+    CachedEmbeddingModel(CountingModel(), cache_dir=str(tmp_path)).embed_texts(["dust on glass"])
+
+    bumped = CountingModel(version="hashed-bow-v2")
+    CachedEmbeddingModel(bumped, cache_dir=str(tmp_path)).embed_texts(["dust on glass"])
+    assert bumped.embedded == ["dust on glass"]
+
+    wider = CountingModel(dim=128)
+    vec = CachedEmbeddingModel(wider, cache_dir=str(tmp_path)).embed_texts(["dust on glass"])
+    assert wider.embedded == ["dust on glass"] and vec.shape == (1, 128)
+
+
+def test_memory_layer_is_bounded():
+    inner = CountingModel()
+    cache = CachedEmbeddingModel(inner, max_memory_items=2)
+    cache.embed_texts(["a", "b", "c"])
+    assert cache.stats()["memory_items"] == 2
+    cache.embed_texts(["a"])
+    assert inner.embedded == ["a", "b", "c", "a"]
+
+
+def test_queries_are_not_persisted(tmp_path):
+    cache = CachedEmbeddingModel(CountingModel(), cache_dir=str(tmp_path))
+    query = "primary_defect: Dusty\nconfidence: 0.8731\npanel_id: SP-001"
+    vec = cache.embed_queries([query])
+    assert np.array_equal(cache.embed_queries([query]), vec)
+    cache.close()
+
+    reopened_inner = CountingModel()
+    reopened = CachedEmbeddingModel(reopened_inner, cache_dir=str(tmp_path))
+    reopened.embed_queries([query])
+    assert reopened_inner.embedded == [query]
+    reopened.close()
+
+
+def test_inherited_helpers_work_and_version_is_keyed():
+    cache = CachedEmbeddingModel(CountingModel(dim=32, version="custom-v3"))
+    assert cache.version == "custom-v3"
+    assert cache._buckets_for(["dust"]).tolist() == EmbeddingModel(dim=32)._buckets_for(["dust"]).tolist()
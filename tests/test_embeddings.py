@@ -0,0 +1,58 @@
+import re
+
+import numpy as np
+
+from rag_module.embeddings import EmbeddingModel, _hash_token
+
+
+def _legacy_embed(texts, dim):
+    """The original per-character loop; the vectorized engine must match it bit for bit."""
+
+    mat = np.zeros((len(texts), dim), dtype="float32")
+    for i, t in enumerate(texts):
+        if not t:
+            continue
+        for tok in re.findall(r"[a-z0-9_\-/]+", t.lower()):
+            h = 0
+            for ch in tok:
+                h = (h * 131 + ord(ch)) & 0xFFFFFFFF
+            mat[i, h % dim] += 1.0
+
+    norms = np.linalg.norm(mat, axis=1, keepdims=True)
+    norms[norms == 0.0] = 1.0
+    mat = mat / norms
+    return mat.astype("float32")
+
+
+TEXTS = [
+    "Dust on the glass lowers output; rinse with deionized water.",
+    "",
+    "Bird-drop / guano: spot clean. SOP_12 step 3, 3, 3.",
+    "ÜNICODE ignored — only ascii tokens count",
+    "a",
+]
+
+
+def test_buckets_match_scalar_hash():
+    model = EmbeddingModel(dim=64)
+    tokens = ["dust", "snow", "bird-drop", "a/b_c"]
+    expected = [_hash_token(t) % 64 for t in tokens]
+    assert model._buckets_for(tokens).tolist() == expected
+
+
+def test_vectors_are_identical_to_the_legacy_loop():
+    for dim in (64, 384):
+        assert np.array_equal(EmbeddingModel(dim=dim).embed_texts(TEXTS), _legacy_embed(TEXTS, dim))
+
+
+def test_memo_reset_keeps_earlier_hits_resolvable():
+    model = EmbeddingModel(dim=32)
+    model.max_memo_tokens = 4
+    model.embed_texts(["dust snow"])
+
+    # "dust" and "snow" are memo hits, the three new tokens overflow the memo.
+    texts = ["dust snow bird crack glass"]
+    vecs = model.embed_texts(texts)
+
+    assert np.array_equal(vecs, _legacy_embed(texts, 32))
+    assert set(model._bucket_memo) == {"dust", "snow", "bird", "crack", "glass"}
@@ -0,0 +1,58 @@
+import os
+
+from rag_module.vectorstores import FaissVectorStore
+
+
+def _add(store, start, n):
+    store.add_texts(
+        [f"chunk {i} about panel {i}" for i in range(start, start + n)],
+        metadatas=[{"source": "a.txt", "chunk_index": i} for i in range(start, start + n)],
+    )
+
+
+def test_log_replay_drops_a_torn_tail(tmp_path):
+    store = FaissVectorStore(persist_dir=str(tmp_path))
+    _add(store, 0, 3)  # snapshot
+    _add(store, 3, 2)  # index.log record
+    log_path = tmp_path / "index.log"
+    good_len = os.path.getsize(log_path)
+
+    # A crash mid-append leaves a partial record behind.
+    _add(store, 5, 2)
+    with open(log_path, "r+b") as f:
+        f.truncate(good_len + 20)
+
+    reopened = FaissVectorStore(persist_dir=str(tmp_path))
+    assert os.path.getsize(log_path) == good_len
+    # docs.jsonl is authoritative: the docs whose vectors were lost are dropped too.
+    assert reopened.count() == 5
+    assert reopened.similarity_search("chunk 4 about panel 4", k=1)[0].metadata["chunk_index"] == 4
+
+    _add(reopened, 7, 1)
+    assert FaissVectorStore(persist_dir=str(tmp_path)).count() == 6
+
+
+def test_torn_docs_line_is_dropped(tmp_path):
+    store = FaissVectorStore(persist_dir=str(tmp_path))
+    _add(store, 0, 3)
+    with open(tmp_path / "docs.jsonl", "ab") as f:
+        f.write(b'{"id": 3, "text": "half')
+
+    for lazy in (False, True):
+        reopened = FaissVectorStore(persist_dir=str(tmp_path), lazy=lazy)
+        assert reopened.count() == 3
+        assert [ch.metadata["chunk_index"] for ch in reopened.similarity_search("chunk 1 about panel 1", k=1)] == [1]
+
+
+def test_lazy_delete_stays_lazy_and_reloads(tmp_path):
+    store = FaissVectorStore(persist_dir=str(tmp_path))
+    _add(store, 0, 4)
+
+    lazy = FaissVectorStore(persist_dir=str(tmp_path), lazy=True)
+    assert lazy.delete(where={"chunk_index": {"$in": [1, 2]}}) == 2
+    assert type(lazy._docs).__name__ == "_LazyDocs"
+    assert [doc["metadata"]["chunk_index"] for doc in lazy._docs] == [0, 3]
+
+    _add(lazy, 4, 1)
+    reopened = FaissVectorStore(persist_dir=str(tmp_path), lazy=True)
+    assert sorted(doc["metadata"]["chunk_index"] for doc in reopened._docs) == [0, 3, 4]
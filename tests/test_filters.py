@@ -0,0 +1,88 @@
+import pytest
+
+from rag_module.vectorstores import FaissVectorStore, NumpyVectorStore
+from rag_module.vectorstores.filters import matches_where, to_chroma_where
+from rag_module.vectorstores.sparse_store import SparseVectorStore
+
+META = {"source": "sop.pdf", "page_start": 4}
+
+
+@pytest.mark.parametrize(
+    "where, expected",
+    [
+        ({"source": "sop.pdf"}, True),
+        ({"source": "sop.pdf", "page_start": 5}, False),
+        ({"page_start": {"$gte": 3, "$lt": 5}}, True),
+        ({"page_start": {"$in": [1, 2]}}, False),
+        ({"source": {"$nin": ["a.txt"]}}, True),
+        # A missing key only satisfies $ne / $nin.
+        ({"defects": {"$ne": "Dusty"}}, True),
+        ({"defects": {"$nin": ["Dusty"]}}, True),
+        ({"defects": {"$eq": "Dusty"}}, False),
+        # Ordering across types never matches instead of raising.
+        ({"source": {"$gt": 3}}, False),
+        ({"$or": [{"source": "a.txt"}, {"page_start": 4}]}, True),
+        ({"$and": [{"source": "sop.pdf"}, {"page_start": {"$lt": 4}}]}, False),
+    ],
+)
+def test_matches_where(where, expected):
+    assert matches_where(META, where) is expected
+
+
+def test_unknown_operator_is_rejected():
+    with pytest.raises(ValueError):
+        matches_where(META, {"page_start": {"$regex": "4"}})
+
+
+def test_to_chroma_where_folds_into_explicit_and():
+    assert to_chroma_where({"source": "sop.pdf"}) == {"source": "sop.pdf"}
+    assert to_chroma_where({"source": "sop.pdf", "page_start": {"$gte": 3, "$lt": 5}}) == {
+        "$and": [{"source": "sop.pdf"}, {"page_start": {"$gte": 3}}, {"page_start": {"$lt": 5}}]
+    }
+
+
+@pytest.mark.parametrize("make_store", [FaissVectorStore, NumpyVectorStore, SparseVectorStore])
+def test_filter_applies_before_ranking(tmp_path, make_store):
+    store = make_store(persist_dir=str(tmp_path))
+    texts = [f"dust cleaning procedure step {i}" for i in range(6)] + ["unrelated inverter wiring diagram"]
+    store.add_texts(texts, metadatas=[{"source": "sop.pdf", "chunk_index": i} for i in range(6)] + [{"source": "inv.pdf"}])
+
+    # The only inv.pdf chunk scores lowest, yet a filtered k=1 search still returns it.
+    hits = store.similarity_search("dust cleaning procedure", k=1, where={"source": "inv.pdf"})
+    assert [ch.metadata["source"] for ch in hits] == ["inv.pdf"]
+
+    hits = store.similarity_search_batch(
+        ["dust cleaning procedure"], k=10, where={"$and": [{"source": "sop.pdf"}, {"chunk_index": {"$gte": 4}}]}
+    )[0]
+    assert sorted(ch.metadata["chunk_index"] for ch in hits) == [4, 5]
+
+    assert store.similarity_search("dust", k=3, where={"source": "missing.pdf"}) == []
+
+
+UNHASHABLE_METADATAS = [
+    {"chunk_index": 0, "tags": ["dust", "sop"]},
+    {"chunk_index": 1, "tags": ["snow"]},
+    {"chunk_index": 2, "tags": {"kind": "sop"}},
+    {"chunk_index": 3, "tags": "sop"},
+    {"chunk_index": 4},
+]
+
+
+@pytest.mark.parametrize("make_store", [FaissVectorStore, NumpyVectorStore, SparseVectorStore])
+@pytest.mark.parametrize(
+    "where",
+    [
+        {"tags": ["dust", "sop"]},
+        {"tags": {"$ne": ["snow"]}},
+        {"tags": {"$nin": [["snow"], "sop"]}},
+        {"tags": {"$in": [{"kind": "sop"}, "sop"]}},
+        {"$or": [{"tags": ["snow"]}, {"chunk_index": 4}]},
+    ],
+)
+def test_unhashable_metadata_values_filter_like_matches_where(tmp_path, make_store, where):
+    store = make_store(persist_dir=str(tmp_path))
+    store.add_texts([f"panel cleaning note {i}" for i in range(5)], metadatas=UNHASHABLE_METADATAS)
+
+    hits = store.similarity_search("panel cleaning note", k=10, where=where)
+    expected = {m["chunk_index"] for m in UNHASHABLE_METADATAS if matches_where(m, where)}
+    assert {ch.metadata["chunk_index"] for ch in hits} == expected
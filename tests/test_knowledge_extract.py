@@ -0,0 +1,79 @@
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+from backend import knowledge_extract
+from backend.knowledge_extract import ExtractedPages, ExtractedTextCache
+
+KNOWLEDGE_BASE = Path(__file__).resolve().parents[1] / "backend" / "knowledge_base"
+
+
+def _failing_pdf_libs(monkeypatch):
+    def fail(*args, **kwargs):
+        raise ValueError("broken xref")
+
+    monkeypatch.setattr(knowledge_extract, "HAS_PDFPLUMBER", True)
+    monkeypatch.setattr(knowledge_extract, "HAS_PYPDF", True)
+    monkeypatch.setattr(knowledge_extract, "pdfplumber", SimpleNamespace(open=fail))
+    monkeypatch.setattr(knowledge_extract, "PyPDF2", SimpleNamespace(PdfReader=fail))
+
+
+def test_failed_range_keeps_page_numbers(tmp_path, monkeypatch):
+    _failing_pdf_libs(monkeypatch)
+    pdf = tmp_path / "manual.pdf"
+    pdf.write_bytes(b"%PDF-1.4 truncated")
+
+    pages, _seconds, complete = knowledge_extract._extract_pdf_page_range(str(pdf), 16, 20)
+    assert pages == ["", "", "", ""]
+    assert not complete
+
+    ok = lambda: (["page 1\n", "page 2\n"], 0.0, True)
+    failed = lambda: (["", ""], 0.0, False)
+    extracted = ExtractedPages(pdf, [ok, failed, ok])
+    assert list(extracted) == ["page 1\n", "page 2\n", "", "", "page 1\n", "page 2\n"]
+    assert not extracted.complete
+
+
+def test_incomplete_text_is_not_cached(tmp_path):
+    cache = ExtractedTextCache(str(tmp_path), extractor_id="test/v1")
+
+    pieces = cache.write_through("abc", iter(["a", "b"]), page_offsets=[0, 1], complete=lambda: False)
+    assert "".join(pieces) == "ab"
+    assert not cache.has("abc")
+    assert list(tmp_path.iterdir()) == []
+
+    pieces = cache.write_through("abc", iter(["a", "b"]), page_offsets=[0, 1], complete=lambda: True)
+    assert "".join(pieces) == "ab"
+    assert cache.get("abc")["page_offsets"] == [0, 1]
+    assert "".join(cache.iter_text("abc")) == "ab"
+
+
+def test_page_count_does_not_build_pdfplumber_pages(monkeypatch):
+    pytest.importorskip("PyPDF2")
+
+    def fail(*args, **kwargs):
+        raise AssertionError("pdfplumber should not be opened to count pages")
+
+    monkeypatch.setattr(knowledge_extract, "pdfplumber", SimpleNamespace(open=fail))
+    assert knowledge_extract._pdf_page_count(KNOWLEDGE_BASE / "2022122719-1.pdf") == 85
+
+
+def test_pooled_extraction_matches_a_serial_run(tmp_path):
+    PyPDF2 = pytest.importorskip("PyPDF2")
+    pytest.importorskip("pdfplumber")
+    paths = []
+    for name, n_pages in (("a.pdf", knowledge_extract.PAGES_PER_TASK + 4), ("b.pdf", 3)):
+        writer = PyPDF2.PdfWriter()
+        for _ in range(n_pages):
+            writer.add_blank_page(width=200, height=200)
+        with open(tmp_path / name, "wb") as f:
+            writer.write(f)
+        paths.append(tmp_path / name)
+
+    def extract(workers):
+        return [(path, list(pages)) for path, pages in knowledge_extract.iter_knowledge_pages(paths, max_workers=workers)]
+
+    serial = extract(1)
+    assert [len(pages) for _path, pages in serial] == [knowledge_extract.PAGES_PER_TASK + 4, 3]
+    assert extract(2) == serial
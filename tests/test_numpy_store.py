@@ -0,0 +1,64 @@
+import os
+
+import numpy as np
+
+from rag_module.vectorstores import NumpyVectorStore
+
+
+def _store(tmp_path):
+    store = NumpyVectorStore(persist_dir=str(tmp_path))
+    store.add_texts(
+        [f"chunk {i} about panel {i}" for i in range(4)],
+        metadatas=[{"source": "a.txt", "chunk_index": i} for i in range(4)],
+    )
+    return store
+
+
+def test_load_finishes_an_interrupted_delete(tmp_path, monkeypatch):
+    store = _store(tmp_path)
+    # Crash after the marker is written but before any rename.
+    monkeypatch.setattr(store, "_finish_rewrite", lambda: None)
+    store.delete(where={"chunk_index": {"$in": [1, 2]}})
+    assert os.path.exists(tmp_path / "rewrite.pending")
+
+    reopened = NumpyVectorStore(persist_dir=str(tmp_path))
+    assert not os.path.exists(tmp_path / "rewrite.pending")
+    assert not any(name.endswith((".tmp", ".tmp.npy")) for name in os.listdir(tmp_path))
+    assert reopened.count() == 2
+    hits = reopened.similarity_search("chunk 3 about panel 3", k=2)
+    assert [ch.metadata["chunk_index"] for ch in hits][0] == 3
+    assert {ch.metadata["chunk_index"] for ch in hits} == {0, 3}
+
+
+def test_load_discards_a_rewrite_without_its_marker(tmp_path, monkeypatch):
+    store = _store(tmp_path)
+    monkeypatch.setattr(store, "_finish_rewrite", lambda: None)
+    store.delete(where={"chunk_index": 0})
+    # The crash happened before the marker existed: the old files stay authoritative.
+    os.remove(tmp_path / "rewrite.pending")
+
+    reopened = NumpyVectorStore(persist_dir=str(tmp_path))
+    assert reopened.count() == 4
+    assert not any(name.endswith((".tmp", ".tmp.npy")) for name in os.listdir(tmp_path))
+
+
+def test_growth_and_delete_reopen_the_matrices(tmp_path):
+    store = _store(tmp_path)
+    store.add_texts([f"extra {i}" for i in range(10)], metadatas=[{"chunk_index": 10 + i} for i in range(10)])
+    assert store.delete(where={"chunk_index": {"$lt": 10}}) == 4
+    assert store.count() == 10
+    assert store.similarity_search("extra 5", k=1)[0].metadata["chunk_index"] == 15
+
+
+def test_sparse_query_columns_score_like_the_full_product(tmp_path):
+    store = _store(tmp_path)
+    queries = store.embedding_model.embed_queries(["panel 2", "chunk about panel 1"])
+    rows = np.array([3, 1, 2])
+
+    store.sparse_query_fraction = 1.0
+    sparse = store._scores(queries), store._scores(queries, rows)
+    store.sparse_query_fraction = 0.0
+    full = store._scores(queries), store._scores(queries, rows)
+
+    np.testing.assert_allclose(sparse[0], full[0], rtol=1e-6)
+    np.testing.assert_allclose(sparse[1], full[1], rtol=1e-6)
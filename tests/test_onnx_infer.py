@@ -0,0 +1,20 @@
+from io import BytesIO
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from backend.onnx_infer import INPUT_SIZE, load_input_rgb
+
+
+@pytest.mark.parametrize("mode", ["P", "1", "I;16", "RGBA"])
+def test_reduced_decode_handles_non_rgb_modes(mode):
+    buf = BytesIO()
+    Image.new("RGB", (4 * INPUT_SIZE, 2 * INPUT_SIZE), (200, 40, 40)).convert(mode).save(buf, format="PNG")
+
+    rgb = load_input_rgb(buf.getvalue(), reduced=True)
+
+    assert rgb.shape == (INPUT_SIZE, INPUT_SIZE, 3) and rgb.dtype == np.uint8
+    full = load_input_rgb(buf.getvalue(), reduced=False)
+    # Dithered modes differ per pixel; the average colour must still match.
+    assert np.allclose(rgb.mean(axis=(0, 1)), full.mean(axis=(0, 1)), atol=2)
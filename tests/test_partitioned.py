@@ -0,0 +1,68 @@
+from rag_module.query import search_scope
+from rag_module.vectorstores import NumpyVectorStore
+from rag_module.vectorstores.partitioned import GENERAL, UNTAGGED, PartitionedVectorStore
+
+LABELS = ["Dusty", "Snow-Covered", "Bird-drop"]
+
+
+def _store(tmp_path, **kwargs):
+    return PartitionedVectorStore(
+        persist_dir=str(tmp_path),
+        make_partition=lambda name: NumpyVectorStore(persist_dir=str(tmp_path / name)),
+        labels=LABELS,
+        **kwargs,
+    )
+
+
+def test_untagged_chunk_is_retrieved_for_a_known_label(tmp_path):
+    store = _store(tmp_path)
+    store.add_texts(
+        [
+            "Dust on the glass lowers output; rinse the panel with deionized water.",
+            "Snow load: clear the modules with a soft brush, never scrape the frost.",
+            "DOC-LOG-020 documentation requirements: record the panel ID, date and technician.",
+        ],
+        metadatas=[{"source": "sop.txt", "chunk_index": i} for i in range(3)],
+    )
+    assert store.partitions[UNTAGGED].count() == 1
+
+    scope = store.partitions_for_label("Dusty")
+    assert set(scope) == {"Dusty", GENERAL}
+    assert search_scope(store, "Dusty") == {"partitions": scope}
+
+    hits = store.similarity_search("DOC-LOG-020 documentation requirements", k=3, partitions=scope)
+    assert any("DOC-LOG-020" in ch.text for ch in hits)
+    assert not any("Snow load" in ch.text for ch in hits)
+
+
+def test_unknown_label_searches_every_partition(tmp_path):
+    store = _store(tmp_path)
+    assert store.partitions_for_label("Unknown") is None
+
+
+def test_untagged_is_skipped_when_the_label_scope_fills_k(tmp_path):
+    store = _store(tmp_path)
+    store.add_texts(
+        [
+            "Dust on the glass lowers output.",
+            "Dust storms: rinse the panel with deionized water.",
+            "Inverter manual: DOC-LOG-020 documentation requirements.",
+        ],
+        metadatas=[{"source": "sop.txt", "chunk_index": i} for i in range(3)],
+    )
+    scope = store.partitions_for_label("Dusty")
+
+    hits = store.similarity_search("DOC-LOG-020 documentation requirements", k=2, partitions=scope)
+    assert len(hits) == 2 and not any("DOC-LOG-020" in ch.text for ch in hits)
+
+    always = _store(tmp_path, untagged_search="always")
+    assert set(always.partitions_for_label("Dusty")) == {"Dusty", GENERAL, UNTAGGED}
+
+
+def test_search_merges_a_chunk_stored_in_two_partitions(tmp_path):
+    store = _store(tmp_path)
+    store.add_texts(["Dust and snow both block light."], metadatas=[{"source": "a.txt", "chunk_index": 0}])
+
+    assert store.count() == 2
+    hits = store.similarity_search("dust snow", k=5)
+    assert len(hits) == 1
@@ -0,0 +1,53 @@
+from rag_module.query import query_rag
+from rag_module.vectorstores import NumpyVectorStore
+
+
+class CountingStore(NumpyVectorStore):
+    """Records which search entry points query_rag goes through."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.calls = []
+
+    def similarity_search(self, query, *, k, where=None):
+        self.calls.append("single")
+        return super().similarity_search(query, k=k, where=where)
+
+    def similarity_search_batch(self, queries, *, k, where=None):
+        self.calls.append(("batch", len(queries)))
+        return super().similarity_search_batch(queries, k=k, where=where)
+
+
+def _store(tmp_path):
+    store = CountingStore(persist_dir=str(tmp_path))
+    store.add_texts(
+        ["Dusty panels: clean every two weeks.", "Bird-drop hotspots: inspect and clean.", "Snow-Covered: wait."],
+        metadatas=[{"source": name} for name in ("dusty.txt", "bird.txt", "snow.txt")],
+    )
+    return store
+
+
+def test_top_predictions_are_retrieved_in_one_batch_by_default(tmp_path):
+    store = _store(tmp_path)
+    model_output = {
+        "primary_defect": "Dusty",
+        "confidence": 0.61,
+        "top_predictions": [{"label": "Dusty", "score": 0.61}, {"label": "Bird-drop", "score": 0.3}],
+    }
+
+    context = query_rag(store, model_output=model_output, k=2)
+
+    assert store.calls == [("batch", 2)]
+    assert "dusty.txt" in context and "bird.txt" in context
+
+
+def test_a_single_label_keeps_the_single_query_path(tmp_path):
+    store = _store(tmp_path)
+    query_rag(store, model_output={"primary_defect": "Dusty", "confidence": 0.9}, k=2)
+    query_rag(
+        store,
+        model_output={"primary_defect": "Dusty", "top_predictions": [{"label": "Bird-drop", "score": 0.3}]},
+        k=2,
+        per_prediction=False,
+    )
+    assert store.calls == ["single", "single"]
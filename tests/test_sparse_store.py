@@ -0,0 +1,59 @@
+import os
+
+from rag_module.vectorstores.sparse_store import SparseVectorStore
+
+
+def _add(store, start, n):
+    store.add_texts(
+        [f"chunk {i} about panel {i}" for i in range(start, start + n)],
+        metadatas=[{"chunk_index": i} for i in range(start, start + n)],
+    )
+
+
+def _indexes(store, query, k=1):
+    return [ch.metadata["chunk_index"] for ch in store.similarity_search(query, k=k)]
+
+
+def test_appends_go_to_the_log_and_replay(tmp_path):
+    store = SparseVectorStore(persist_dir=str(tmp_path))
+    _add(store, 0, 2)
+    snapshot = os.path.getmtime(tmp_path / "sparse.npz"), os.path.getsize(tmp_path / "sparse.npz")
+    _add(store, 2, 2)
+    _add(store, 4, 2)
+
+    assert (os.path.getmtime(tmp_path / "sparse.npz"), os.path.getsize(tmp_path / "sparse.npz")) == snapshot
+    assert os.path.getsize(tmp_path / "sparse.log") > 0
+
+    reopened = SparseVectorStore(persist_dir=str(tmp_path))
+    assert reopened.count() == 6
+    assert _indexes(reopened, "chunk 5 about panel 5") == [5]
+
+
+def test_torn_log_record_is_dropped(tmp_path):
+    store = SparseVectorStore(persist_dir=str(tmp_path))
+    _add(store, 0, 2)
+    _add(store, 2, 1)
+    good_len = os.path.getsize(tmp_path / "sparse.log")
+    _add(store, 3, 1)
+    with open(tmp_path / "sparse.log", "r+b") as f:
+        f.truncate(good_len + 10)
+
+    reopened = SparseVectorStore(persist_dir=str(tmp_path))
+    assert reopened.count() == 3
+    reopened.add_texts(["replacement chunk"], metadatas=[{"chunk_index": 30}])
+    again = SparseVectorStore(persist_dir=str(tmp_path))
+    assert again.count() == 4
+    assert _indexes(again, "replacement chunk") == [30]
+
+
+def test_compaction_and_delete_keep_rows_aligned(tmp_path):
+    store = SparseVectorStore(persist_dir=str(tmp_path), compact_every=3)
+    for start in range(0, 8, 2):
+        _add(store, start, 2)
+    assert store.delete(where={"chunk_index": {"$in": [0, 1]}}) == 2
+    _add(store, 8, 1)
+
+    reopened = SparseVectorStore(persist_dir=str(tmp_path), compact_every=3)
+    assert reopened.count() == 7
+    assert _indexes(reopened, "chunk 8 about panel 8") == [8]
+    assert _indexes(reopened, "chunk 2 about panel 2") == [2]